@@ -0,0 +1,176 @@
+#!/bin/env python3
+
+# Modules
+import re
+import os
+import sys
+import logging
+import datetime
+import argparse
+import numpy
+from pprint import pprint
+
+# Custom Modules
+sys.path.append(os.path.expanduser('~') + "/lazytrader")
+import common_class
+import report_class
+import backtest_class
+import sample_log_class
+
+# "0.05", "0.01,0.02,0.05" or "start:stop:step" (stop included) to a list of numbers
+def parse_grid(values, cast=float):
+  data = []
+  for value in values:
+    for each in value.split(","):
+      if ":" in each:
+        start, stop, step = [float(part) for part in each.split(":")]
+        data.extend(cast(round(cur, 2)) for cur in numpy.arange(start, stop + (step / 2), step))
+      elif each:
+        data.append(cast(each))
+  return list(dict.fromkeys(data))
+
+# {symbol: (times, prices)} from a stock_screener_tester.py sample log, every screener merged
+def load_samples(filename):
+  data = {}
+  sample_log = sample_log_class.SAMPLE_LOG(filename)
+  for screener_name, symbols in sample_log.data.items():
+    for symbol, samples in symbols.items():
+      prices = data.setdefault(symbol.upper(), {})
+      for epoch, sample in samples.items():
+        prices[epoch] = sample[1]
+  sample_log.close()
+
+  for symbol, prices in data.items():
+    tick_time = numpy.array(sorted(prices), dtype=numpy.int64)
+    data[symbol] = (tick_time, numpy.array([prices[each] for each in tick_time], dtype=numpy.float64))
+  return data
+
+if __name__ == "__main__":
+  # Variables
+  log_level = logging.ERROR
+  #log_level = logging.INFO
+  symbol_list = []
+  days_back = 30
+  top = 10
+  cur_date = datetime.datetime.now()
+
+  # Report Variables
+  report_file = None
+  samples = None
+
+  # Config Variables
+  filename = None
+  class_path = os.path.expanduser('~') + "/lazytrader"
+  user_config = os.path.expanduser('~') + "/lazytrader/user_config.json"
+
+  # Create the parser
+  parser = argparse.ArgumentParser()
+
+  # Add an argument
+  parser.add_argument('-v', '--verbose', action='store_true', help="Verbose Logging")
+  parser.add_argument('-d', '--debug', action='store_true', help="Debug Logging")
+  parser.add_argument('-u', '--user_config', help="User JSON Config File")
+  parser.add_argument('-D', '--days', help="Days Back in Time")
+  parser.add_argument('-s', '--symbol', action='append', help="Stock Symbol(s), default is the configured stocks")
+  parser.add_argument('-p', '--profit', action='append', help="Profit amount(s), list or start:stop:step")
+  parser.add_argument('-c', '--cancel', action='append', help="Cancel order in minutes, list or start:stop:step")
+  parser.add_argument('-q', '--qty', type=int, help="Shares per transaction")
+  parser.add_argument('-t', '--top', type=int, help="Best combinations shown per symbol")
+  parser.add_argument('-o', '--output', help="Write the report to a .html, .csv or .json file")
+  parser.add_argument('-S', '--samples', help="Replay a stock_screener_tester.py sample log instead of 1 minute bars")
+
+  # Parse the argument
+  args = parser.parse_args()
+
+  if args.verbose:
+    log_level = logging.INFO
+  if args.debug:
+    log_level = logging.DEBUG
+  if args.user_config:
+    user_config = args.user_config
+  if args.days:
+    days_back = args.days
+  if args.top:
+    top = args.top
+  if args.output:
+    report_file = args.output
+
+  # Initalize Logging
+  logging.basicConfig(level=log_level)
+
+  # Initalize common class
+  common_class = common_class.COMMON()
+  report = report_class.REPORT(max_rows=0)
+
+  # Initalize user config data
+  file_data = common_class.get_user_data(user_config)
+  logging.debug("User Config Data from: %s" % user_config)
+  logging.debug(file_data)
+
+  # Initalize Broker from User Config
+  for key in list(file_data.keys()):
+    # Initalize Class
+    try:
+      module = __import__("%s_class" % key.lower())
+    except ModuleNotFoundError:
+      continue
+    for each in dir(module):
+      if re.search(key, each.lower()):
+        broker = getattr(module, each.upper())
+        broker = broker(file_data)
+
+  stocks = file_data[broker.broker].get("stocks", {})
+  symbol_list = args.symbol or list(stocks.keys())
+
+  # Recorded quote samples, every symbol in the log unless symbols are given
+  if args.samples:
+    if not os.path.exists(args.samples):
+      logging.error("Sample log %s does not exist" % args.samples)
+      sys.exit(1)
+    samples = load_samples(args.samples)
+    symbol_list = args.symbol or sorted(samples.keys())
+
+  # Age after which the broker ignores a position and buys again, and the daily spend limit
+  max_order_age = getattr(broker, "max_order_age", None) or getattr(broker, "max_trans_in_sec", None)
+  spend_per_day = broker.spend_per_day
+  logging.info("Positions older than %s seconds are ignored, spending %s per day" % (max_order_age, spend_per_day))
+
+  rows = []
+  for symbol in symbol_list:
+    # The configured settings are the grid when none is given
+    stock = stocks.get(symbol.upper(), {})
+    profit_list = parse_grid(args.profit) if args.profit else [stock.get("profit", 0.05)]
+    cancel_list = parse_grid(args.cancel, cast=int) if args.cancel else [file_data[broker.broker]["cancel_order_in_minutes"]]
+    qty = args.qty or stock.get("qty", 1)
+
+    if samples is not None:
+      if symbol.upper() not in samples:
+        logging.error("No samples found for %s" % symbol)
+        continue
+      tick_time, price = samples[symbol.upper()]
+      backtest = backtest_class.BACKTEST.from_ticks(tick_time, price, qty=qty, max_order_age=max_order_age, spend_per_day=spend_per_day)
+    else:
+      try:
+        bars = broker.get_bars(symbol, days_back)
+      except ValueError as e:
+        # Incomplete bars would give wrong results, skip the symbol
+        logging.error("Skipping %s: %s" % (symbol, e))
+        continue
+      if not len(bars["time"]):
+        logging.error("No bars found for %s" % symbol)
+        continue
+      backtest = backtest_class.BACKTEST(bars, qty=qty, max_order_age=max_order_age, spend_per_day=spend_per_day)
+    results = sorted(backtest.run(profit_list, cancel_list), key=lambda each: each["total_profit"], reverse=True)
+
+    print(symbol)
+    pprint(results[:top])
+    print("----------------------------------------------")
+    for each in results[:top]:
+      rows.append([symbol, each["profit"], each["cancel_order_in_minutes"], each["qty"], each["orders"], each["fills"], each["cancels"], each["trades"], each["aged"], each["total_profit"], each["avg_trans_sec"], each["time_in_market"], each["avg_capital"], each["open_at_end"]])
+
+  if report_file:
+    title = "Backtest - %s days back from %s" % (days_back, cur_date.strftime("%Y-%m-%d"))
+    if args.samples:
+      title = "Backtest - samples from %s" % args.samples
+    report.add_table(title, ["Symbol", "Profit", "Cancel Minutes", "Qty", "Orders", "Fills", "Cancels", "Trades", "Aged", "Total Profit", "Avg Trans Sec", "Time In Market", "Avg Capital", "Open At End"], rows, group_size=1)
+    report.save(report_file)
@@ -0,0 +1,233 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import time
+import numpy
+import logging
+from pprint import pprint
+
+# Custom Modules
+sys.path.append(os.path.expanduser('~') + "/lazytrader")
+
+#
+# Offline replay of the place_orders / cancel_orders strategy over 1 minute bars
+#
+# Each order cycle places a buy limit at the bar close (the bid) with a GTC
+# sell limit at buy + profit. An unfilled buy is cancelled after
+# cancel_order_in_minutes or at the end of its day (DAY order), and the
+# next buy goes in on the following bar. While a position is open no new
+# buy is placed, unless it is older than max_order_age: like the brokers,
+# the position is then ignored and buying starts again while its sell stays
+# open. With spend_per_day a buy is only placed while the filled buys of
+# the day leave room for it, the whole limit goes to the one symbol.
+#
+# The "when does it fill" questions are answered for every bar at once with
+# sparse tables of range min(low) / max(high): a descent over the 2^k
+# levels finds the first bar at or below (or above) a price in log(n)
+# numpy steps. Only the chain of orders from the first bar is sequential,
+# and it is walked for every profit/cancel combination in lockstep.
+#
+class BACKTEST:
+  # Variables
+  day_gap = 4 * 3600
+  epsilon = 1e-9
+
+  def __init__(self, bars, qty=1, max_order_age=None, spend_per_day=None):
+    self.time = numpy.asarray(bars["time"], dtype=numpy.int64)
+    self.low = numpy.asarray(bars["low"], dtype=numpy.float64)
+    self.high = numpy.asarray(bars["high"], dtype=numpy.float64)
+    self.buy = numpy.round(numpy.asarray(bars["close"], dtype=numpy.float64), 2)
+    self.qty = int(qty)
+    self.n = len(self.time)
+    self.max_order_age = None
+    if max_order_age:
+      self.max_order_age = int(max_order_age)
+    self.spend_per_day = None
+    if spend_per_day:
+      self.spend_per_day = float(spend_per_day)
+
+    # Sparse tables over the bars, padded so every 2^k block can be read
+    self.levels = 1
+    while (1 << self.levels) <= self.n:
+      self.levels += 1
+    self.min_table = self.sparse_table(self.low, numpy.minimum, numpy.inf)
+    self.max_table = self.sparse_table(self.high, numpy.maximum, -numpy.inf)
+
+    # Last bar of each bar's trading day, a long gap between bars starts a new day
+    self.day_id = numpy.zeros(self.n, dtype=numpy.int64)
+    if self.n > 1:
+      self.day_id[1:] = numpy.cumsum(numpy.diff(self.time) > self.day_gap)
+    self.day_end = numpy.searchsorted(self.day_id, self.day_id, side="right") - 1
+
+    # First bar where a position filled at each bar is ignored for being too old, n when never
+    if self.max_order_age:
+      self.age_bar = numpy.searchsorted(self.time, self.time + self.max_order_age, side="left")
+    else:
+      self.age_bar = numpy.full(self.n, self.n, dtype=numpy.int64)
+
+    # First bar after each order bar where the buy fills, n when never
+    self.buy_fill = self.first_at_or_below(numpy.arange(1, self.n + 1), self.buy)
+
+  # Build from a price series (recorded ticks or quote samples)
+  @classmethod
+  def from_ticks(cls, tick_time, price, qty=1, max_order_age=None, spend_per_day=None):
+    price = numpy.asarray(price, dtype=numpy.float64)
+    return cls({"time": tick_time, "low": price, "high": price, "close": price}, qty=qty, max_order_age=max_order_age, spend_per_day=spend_per_day)
+
+  def sparse_table(self, values, combine, pad):
+    table = [numpy.concatenate([values, numpy.full(1 << self.levels, pad)])]
+    for level in range(1, self.levels):
+      prev = table[-1]
+      step = 1 << (level - 1)
+      cur = prev.copy()
+      cur[:-step] = combine(prev[:-step], prev[step:])
+      table.append(cur)
+    return table
+
+  # First index at or after start with low <= price, n when none
+  def first_at_or_below(self, start, price):
+    pos = numpy.array(start, dtype=numpy.int64)
+    limit = len(self.min_table[0]) - 1
+    for level in range(self.levels - 1, -1, -1):
+      block = self.min_table[level][numpy.minimum(pos, limit)]
+      pos = numpy.where(block > price + self.epsilon, pos + (1 << level), pos)
+    return numpy.minimum(pos, self.n)
+
+  # First index at or after start with high >= price, n when none
+  def first_at_or_above(self, start, price):
+    pos = numpy.array(start, dtype=numpy.int64)
+    limit = len(self.max_table[0]) - 1
+    for level in range(self.levels - 1, -1, -1):
+      block = self.max_table[level][numpy.minimum(pos, limit)]
+      pos = numpy.where(block < price - self.epsilon, pos + (1 << level), pos)
+    return numpy.minimum(pos, self.n)
+
+  # Bar where the sell fills for an order placed at every bar, n when never
+  def sell_fill(self, profit):
+    sell_price = self.buy + round(float(profit), 2)
+    sell = self.first_at_or_above(numpy.minimum(self.buy_fill + 1, self.n), sell_price)
+    return numpy.where(self.buy_fill < self.n, sell, self.n)
+
+  # Last bar the buy placed at every bar stays open
+  def cancel_bar(self, cancel_minutes):
+    deadline = numpy.searchsorted(self.time, self.time + (int(cancel_minutes) * 60), side="right") - 1
+    return numpy.minimum(deadline, self.day_end)
+
+  # Replay every profit / cancel combination, one result dictionary per combination
+  def run(self, profit_list, cancel_list):
+    profit_list = [round(float(each), 2) for each in profit_list]
+    cancel_list = [int(each) for each in cancel_list]
+    combos = [(profit, cancel) for profit in profit_list for cancel in cancel_list]
+    if self.n == 0 or not combos:
+      return [self.result(profit, cancel) for profit, cancel in combos]
+    start_time = time.monotonic()
+
+    # Next event tables, the last column is the "finished" sentinel
+    n = self.n
+    sentinel = numpy.array([n], dtype=numpy.int64)
+    sell_table = numpy.stack([numpy.concatenate([self.sell_fill(profit), sentinel]) for profit in profit_list])
+    cancel_table = numpy.stack([numpy.concatenate([self.cancel_bar(cancel), sentinel]) for cancel in cancel_list])
+    buy_fill = numpy.concatenate([self.buy_fill, sentinel])
+    age_bar = numpy.concatenate([self.age_bar, sentinel])
+    next_day = numpy.concatenate([self.day_end + 1, sentinel])
+    day_id = numpy.concatenate([self.day_id, [-1]])
+    bar_time = numpy.concatenate([self.time, self.time[-1:]])
+    buy = numpy.concatenate([self.buy, [0.0]])
+
+    profit_id = numpy.repeat(numpy.arange(len(profit_list)), len(cancel_list))
+    cancel_id = numpy.tile(numpy.arange(len(cancel_list)), len(profit_list))
+    m = len(combos)
+    orders = numpy.zeros(m, dtype=numpy.int64)
+    fills = numpy.zeros(m, dtype=numpy.int64)
+    trades = numpy.zeros(m, dtype=numpy.int64)
+    hold = numpy.zeros(m, dtype=numpy.float64)
+    capital = numpy.zeros(m, dtype=numpy.float64)
+    open_end = numpy.zeros(m, dtype=bool)
+    aged = numpy.zeros(m, dtype=numpy.int64)
+    spent = numpy.zeros(m, dtype=numpy.float64)
+    spent_day = numpy.full(m, -1, dtype=numpy.int64)
+
+    # Walk the order chain of every combination together, dropping finished ones
+    active = numpy.arange(m)
+    pos = numpy.zeros(m, dtype=numpy.int64)
+    steps = 0
+    while len(active):
+      steps += 1
+
+      # Out of money for the day, wait for the next day
+      cost = buy[pos] * self.qty
+      day_spent = numpy.where(spent_day[active] == day_id[pos], spent[active], 0)
+      if self.spend_per_day:
+        can_buy = (self.spend_per_day - day_spent) > cost
+      else:
+        can_buy = numpy.ones(len(active), dtype=bool)
+
+      fill = buy_fill[pos]
+      deadline = cancel_table[cancel_id[active], pos]
+      sell = sell_table[profit_id[active], pos]
+      filled = can_buy & (fill <= deadline)
+      closed = filled & (sell < n)
+
+      orders[active] += can_buy
+      fills[active] += filled
+      trades[active] += closed
+      held = numpy.where(closed, bar_time[sell] - bar_time[fill], 0)
+      hold[active] += held
+      capital[active] += held * buy[pos] * self.qty
+      open_end[active] |= filled & (sell >= n)
+
+      # A filled buy spends for the day it was placed, a cancelled one gives the money back
+      spent[active] = numpy.where(filled, day_spent + cost, day_spent)
+      spent_day[active] = day_id[pos]
+
+      # The next buy waits for the sell, or for the position to be too old to count
+      after_sell = numpy.minimum(sell + 1, age_bar[fill])
+      aged[active] += filled & (age_bar[fill] < n) & (age_bar[fill] < sell + 1)
+      pos = numpy.where(can_buy, numpy.where(filled, after_sell, deadline + 1), next_day[pos])
+      keep = pos < n
+      active = active[keep]
+      pos = pos[keep]
+    logging.debug("Backtest of %s combinations over %s bars in %s steps, %s seconds" % (m, n, steps, round(time.monotonic() - start_time, 3)))
+
+    data = []
+    for position, (profit, cancel) in enumerate(combos):
+      data.append(self.result(profit, cancel, orders[position], fills[position], trades[position], hold[position], capital[position], open_end[position], aged[position]))
+    return data
+
+  def result(self, profit, cancel, orders=0, fills=0, trades=0, hold=0, capital=0, open_end=False, aged=0):
+    span = 0
+    if self.n > 1:
+      span = float(self.time[-1] - self.time[0])
+    data = {
+      "profit": profit,
+      "cancel_order_in_minutes": cancel,
+      "qty": self.qty,
+      "orders": int(orders),
+      "fills": int(fills),
+      "cancels": int(orders - fills),
+      "trades": int(trades),
+      "aged": int(aged),
+      "total_profit": round(int(trades) * profit * self.qty, 2),
+      "avg_trans_sec": round(float(hold) / int(trades), 2) if trades else 0,
+      "time_in_market": round(float(hold) / span, 4) if span else 0,
+      "avg_capital": round(float(capital) / span, 2) if span else 0,
+      "open_at_end": bool(open_end)
+    }
+    return data
+
+if __name__ == "__main__":
+  # Enable logging
+  logging.basicConfig(level=logging.DEBUG)
+
+  # A year of random walk minute bars
+  rng = numpy.random.default_rng(1)
+  days = 252
+  bar_time = (numpy.arange(days)[:, None] * 86400 + numpy.arange(390)[None, :] * 60).ravel() + 1609857000
+  close = 100 + numpy.cumsum(rng.normal(0, 0.02, len(bar_time)))
+  bars = {"time": bar_time, "close": close, "low": close - rng.random(len(bar_time)) * 0.03, "high": close + rng.random(len(bar_time)) * 0.03}
+
+  backtest = BACKTEST(bars, max_order_age=35999, spend_per_day=1000)
+  results = backtest.run(numpy.arange(0.01, 0.51, 0.01), range(1, 61))
+  pprint(sorted(results, key=lambda each: each["total_profit"])[-3:])
@@ -0,0 +1,116 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import time
+import numpy
+import logging
+import datetime
+import threading
+import concurrent.futures
+from pprint import pprint
+
+# Custom Modules
+#sys.path.append(os.path.expanduser('~') + "/lazytrader")
+sys.path.append(os.path.expanduser('~') + "/lazytrader-unreleased")
+
+#
+# Historical bar download split into broker sized windows
+#
+# The broker supplies fetch_window(symbol, start_date, end_date), returning
+# rows of (epoch, open, high, low, close, volume) for one window. Windows
+# are fetched concurrently, spaced at least min_interval seconds apart,
+# then stitched into time ordered numpy arrays without duplicate bars.
+#
+class BAR_FETCHER:
+  # Variables
+  window_days = 30
+  workers = 4
+  min_interval = 0.25
+  columns = ["time", "open", "high", "low", "close", "volume"]
+
+  def __init__(self, fetch_window, window_days=None, workers=None, min_interval=None):
+    self.fetch_window = fetch_window
+    if window_days:
+      self.window_days = int(window_days)
+    if workers:
+      self.workers = int(workers)
+    if min_interval is not None:
+      self.min_interval = float(min_interval)
+
+    # Rate Limit Variables
+    self.lock = threading.Lock()
+    self.next_start = 0
+
+  # Split the inclusive date range into windows of window_days
+  def windows(self, start_date, end_date):
+    data = []
+    cur_start = start_date
+    while cur_start <= end_date:
+      cur_end = min(end_date, cur_start + datetime.timedelta(days=self.window_days - 1))
+      data.append((cur_start, cur_end))
+      cur_start = cur_end + datetime.timedelta(days=1)
+    return data
+
+  # Space request starts at least min_interval seconds apart across all threads
+  def throttle(self):
+    with self.lock:
+      cur_time = time.monotonic()
+      wait = self.next_start - cur_time
+      self.next_start = max(cur_time, self.next_start) + self.min_interval
+    if wait > 0:
+      time.sleep(wait)
+
+  def fetch_one(self, symbol, window):
+    self.throttle()
+    start_time = time.monotonic()
+    try:
+      rows = self.fetch_window(symbol, window[0], window[1])
+    except Exception as e:
+      logging.error("Bars for %s from %s to %s failed: %s" % (symbol, window[0], window[1], e))
+      return None
+    logging.debug("Bars for %s from %s to %s: %s rows in %s seconds" % (symbol, window[0], window[1], len(rows), round(time.monotonic() - start_time, 2)))
+    return rows
+
+  # Fetch the windows concurrently, returns (bars, failed windows)
+  def fetch_windows(self, symbol, windows):
+    failed = []
+    parts = []
+    if not windows:
+      return (self.stitch(parts), failed)
+
+    use_workers = min(self.workers, len(windows))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=use_workers) as executor:
+      results = executor.map(lambda window: self.fetch_one(symbol, window), windows)
+      for window, rows in zip(windows, results):
+        if rows is None:
+          failed.append(window)
+          continue
+        parts.append(rows)
+    return (self.stitch(parts), failed)
+
+  # Fetch every bar between two dates (inclusive), returns (bars, failed windows)
+  def fetch(self, symbol, start_date, end_date):
+    bars, failed = self.fetch_windows(symbol, self.windows(start_date, end_date))
+    if failed:
+      logging.error("%s bar windows for %s failed, results are incomplete" % (len(failed), symbol))
+    return (bars, failed)
+
+  # Order the bars by time and drop bars repeated at window edges
+  def stitch(self, parts):
+    rows = [row for part in parts for row in part]
+    if not rows:
+      data = numpy.empty((0, len(self.columns)), dtype=numpy.float64)
+    else:
+      data = numpy.array(rows, dtype=numpy.float64)
+      data = data[numpy.argsort(data[:, 0], kind="stable")]
+      keep = numpy.ones(len(data), dtype=bool)
+      keep[1:] = data[1:, 0] != data[:-1, 0]
+      data = data[keep]
+
+    bars = {}
+    for position, column in enumerate(self.columns):
+      bars[column] = numpy.ascontiguousarray(data[:, position])
+    bars["time"] = bars["time"].astype(numpy.int64)
+    return bars
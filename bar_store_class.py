@@ -0,0 +1,202 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import fcntl
+import numpy
+import logging
+import datetime
+from pprint import pprint
+
+# Custom Modules
+#sys.path.append(os.path.expanduser('~') + "/lazytrader")
+sys.path.append(os.path.expanduser('~') + "/lazytrader-unreleased")
+
+import clock_class
+import common_class
+import market_session_class
+
+#
+# On disk store of 1 minute bars, one directory per symbol
+#
+#   <root>/<SYMBOL>/bars.bin    fixed size bar records, appended one day at a time
+#   <root>/<SYMBOL>/index.json  {"days": {"YYYY-MM-DD": [first record, record count]}}
+#
+# Finished days never change, so they are fetched once through the broker
+# BAR_FETCHER and afterwards read back with numpy.memmap. Today is always
+# fetched live and never stored. A day without bars is only stored when the
+# local session table says the market was closed, any other empty day (out
+# of the broker history, a failed request) is asked for again next time.
+#
+# When a window fails the days that did arrive are still stored, then get()
+# raises ValueError so a caller never works on incomplete bars.
+#
+class BAR_STORE:
+  # Variables
+  timezone = "America/New_York"
+  dtype = numpy.dtype([("time", "<i8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"), ("close", "<f8"), ("volume", "<f8")])
+
+  def __init__(self, root, fetcher, timezone=None):
+    self.root = root
+    self.fetcher = fetcher
+    if timezone:
+      self.timezone = timezone
+    self.use_tz = clock_class.get_timezone(self.timezone)
+    self.common = common_class.COMMON()
+    self.session = market_session_class.MARKET_SESSION(self.timezone)
+
+  def symbol_dir(self, symbol):
+    return os.path.join(self.root, symbol.upper())
+
+  def read_index(self, symbol):
+    try:
+      return self.common.read_json(file=os.path.join(self.symbol_dir(symbol), "index.json"))
+    except FileNotFoundError:
+      return {"days": {}}
+
+  # Current date in the market timezone
+  def today(self):
+    return datetime.datetime.now(self.use_tz).date()
+
+  # Determine the market was closed on a day, from the local holiday table
+  def is_closed(self, cur_day):
+    self.session.add_local_month(cur_day.year, cur_day.month)
+    return not self.session.get_session(cur_day)
+
+  # Epoch of midnight (market timezone) for a date
+  def day_start(self, cur_day):
+    midnight = self.use_tz.localize(datetime.datetime(cur_day.year, cur_day.month, cur_day.day))
+    return int(midnight.timestamp())
+
+  # Get the bars between two dates (inclusive), only fetching days not stored yet
+  def get(self, symbol, start_date, end_date):
+    failed = []
+    today = self.today()
+    stored_end = min(end_date, today - datetime.timedelta(days=1))
+
+    index = self.read_index(symbol)
+    missing = self.missing_windows(index, start_date, stored_end)
+    if missing:
+      logging.info("Fetching %s bar windows for %s" % (len(missing), symbol))
+      index, failed = self.update(symbol, missing)
+
+    parts = [self.read(symbol, index, start_date, stored_end)]
+    if end_date >= today and today.weekday() < 5:
+      bars, today_failed = self.fetcher.fetch(symbol, today, today)
+      parts.append(bars)
+      failed += today_failed
+
+    if failed:
+      raise ValueError("%s bar windows for %s failed: %s" % (len(failed), symbol, ", ".join("%s to %s" % window for window in failed)))
+    return self.join(parts)
+
+  # Group the days we do not have into fetch windows, weekends never break a group
+  def missing_windows(self, index, start_date, end_date):
+    windows = []
+    run = None
+    cur_day = start_date
+    while cur_day <= end_date:
+      if cur_day.weekday() < 5:
+        if cur_day.strftime("%Y-%m-%d") in index["days"]:
+          if run:
+            windows += self.fetcher.windows(run[0], run[1])
+            run = None
+        elif run:
+          run[1] = cur_day
+        else:
+          run = [cur_day, cur_day]
+      cur_day += datetime.timedelta(days=1)
+    if run:
+      windows += self.fetcher.windows(run[0], run[1])
+    return windows
+
+  # Fetch the missing windows and append every finished day to the store, returns (index, failed windows)
+  def update(self, symbol, windows):
+    symbol_dir = self.symbol_dir(symbol)
+    os.makedirs(symbol_dir, exist_ok=True)
+    bars, failed = self.fetcher.fetch_windows(symbol, windows)
+
+    with open(os.path.join(symbol_dir, "bars.bin"), "ab") as h:
+      # One writer per symbol at a time
+      fcntl.flock(h.fileno(), fcntl.LOCK_EX)
+      index = self.read_index(symbol)
+      offset = h.seek(0, os.SEEK_END) // self.dtype.itemsize
+
+      for window in windows:
+        if window in failed:
+          continue
+        cur_day = window[0]
+        while cur_day <= window[1]:
+          day = cur_day.strftime("%Y-%m-%d")
+          next_day = cur_day + datetime.timedelta(days=1)
+          if day not in index["days"]:
+            first = numpy.searchsorted(bars["time"], self.day_start(cur_day))
+            last = numpy.searchsorted(bars["time"], self.day_start(next_day))
+            if last == first and not self.is_closed(cur_day):
+              logging.debug("No bars for %s on %s, not storing the day" % (symbol, day))
+              cur_day = next_day
+              continue
+            records = numpy.empty(last - first, dtype=self.dtype)
+            for column in self.dtype.names:
+              records[column] = bars[column][first:last]
+            h.write(records.tobytes())
+            index["days"][day] = [offset, int(last - first)]
+            offset += int(last - first)
+          cur_day = next_day
+
+      h.flush()
+      os.fsync(h.fileno())
+      self.common.write_json(index, file=os.path.join(symbol_dir, "index.json"), atomic=True)
+    return (index, failed)
+
+  # Memory map the stored records for the requested days
+  def read(self, symbol, index, start_date, end_date):
+    spans = []
+    cur_day = start_date
+    while cur_day <= end_date:
+      try:
+        first, count = index["days"][cur_day.strftime("%Y-%m-%d")]
+        if count:
+          spans.append((first, count))
+      except KeyError:
+        pass
+      cur_day += datetime.timedelta(days=1)
+    if not spans:
+      return self.columns(numpy.empty(0, dtype=self.dtype))
+
+    records = numpy.memmap(os.path.join(self.symbol_dir(symbol), "bars.bin"), dtype=self.dtype, mode="r")
+
+    # Spans are in day order, days stored back to back are read as one zero copy slice
+    parts = []
+    run_first, run_count = spans[0]
+    for first, count in spans[1:]:
+      if first == run_first + run_count:
+        run_count += count
+        continue
+      parts.append(records[run_first:run_first + run_count])
+      run_first, run_count = first, count
+    parts.append(records[run_first:run_first + run_count])
+
+    if len(parts) == 1:
+      return self.columns(parts[0])
+    return self.columns(numpy.concatenate(parts))
+
+  # Structured records to the {column: array} layout BAR_FETCHER returns
+  def columns(self, records):
+    data = {}
+    for column in self.dtype.names:
+      data[column] = records[column]
+    return data
+
+  def join(self, parts):
+    parts = [each for each in parts if len(each["time"])]
+    if not parts:
+      return self.columns(numpy.empty(0, dtype=self.dtype))
+    if len(parts) == 1:
+      return parts[0]
+
+    data = {}
+    for column in self.dtype.names:
+      data[column] = numpy.concatenate([each[column] for each in parts])
+    return data
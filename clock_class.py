@@ -0,0 +1,119 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import pytz
+import calendar
+import datetime
+import functools
+import contextlib
+from pprint import pprint
+
+# Custom Modules
+#sys.path.append(os.path.expanduser('~') + "/lazytrader")
+sys.path.append(os.path.expanduser('~') + "/lazytrader-unreleased")
+
+# Timezone objects are built once per name
+@functools.lru_cache(maxsize=None)
+def get_timezone(timezone):
+  return pytz.timezone(timezone)
+
+# Broker timestamps repeat across calls, parse each distinct string once
+@functools.lru_cache(maxsize=8192)
+def parse_date(specific_date):
+  use_date = specific_date.strip().replace(" ", "T", 1).replace(" ", "")
+  offset = 0
+
+  # "Z" and "+HH:MM" suffixes become a naive UTC time
+  if use_date.endswith("Z"):
+    use_date = use_date[:-1]
+  elif len(use_date) > 19 and use_date[-5] in "+-" and use_date[-4:].isdigit():
+    offset = (int(use_date[-4:-2]) * 60) + int(use_date[-2:])
+    if use_date[-5] == "-":
+      offset = -offset
+    use_date = use_date[:-5]
+  elif len(use_date) > 19 and use_date[-6] in "+-" and use_date[-3] == ":":
+    offset = (int(use_date[-5:-3]) * 60) + int(use_date[-2:])
+    if use_date[-6] == "-":
+      offset = -offset
+    use_date = use_date[:-6]
+
+  # Fractional seconds are not used anywhere
+  if "." in use_date:
+    use_date = use_date[:use_date.index(".")]
+
+  cur_date = datetime.datetime.fromisoformat(use_date)
+  if offset:
+    cur_date = cur_date - datetime.timedelta(minutes=offset)
+  return cur_date
+
+#
+# Shared clock for the broker classes
+#
+# During a cycle every caller sees the same "now", so a cycle over
+# hundreds of orders asks the system clock and converts timezones once.
+#
+class CLOCK:
+  def __init__(self):
+    self.cycle_depth = 0
+    self.cycle_id = 0
+    self.cycle_time = None
+    self.cycle_now = {}
+
+  # Current naive time in the timezone, frozen while a cycle is running
+  def now(self, timezone="UTC"):
+    if self.cycle_depth:
+      try:
+        return self.cycle_now[timezone]
+      except KeyError:
+        cur_date = self.cycle_time.astimezone(get_timezone(timezone)).replace(tzinfo=None)
+        self.cycle_now[timezone] = cur_date
+        return cur_date
+    cur_date = datetime.datetime.now(get_timezone(timezone))
+    return cur_date.replace(tzinfo=None, microsecond=0)
+
+  # Parse a broker timestamp (or pass a datetime through)
+  def parse(self, specific_date):
+    if type(specific_date) == datetime.datetime:
+      return specific_date
+    return parse_date(specific_date)
+
+  # Seconds since the epoch for a broker timestamp
+  def epoch(self, specific_date):
+    return calendar.timegm(self.parse(specific_date).timetuple())
+
+  def start_cycle(self):
+    if self.cycle_depth == 0:
+      self.cycle_id += 1
+      self.cycle_time = datetime.datetime.now(pytz.utc).replace(microsecond=0)
+      self.cycle_now = {}
+    self.cycle_depth += 1
+
+  # Id of the running cycle, None outside of one
+  def current_cycle(self):
+    if self.cycle_depth:
+      return self.cycle_id
+    return None
+
+  def end_cycle(self):
+    self.cycle_depth = max(0, self.cycle_depth - 1)
+
+  # with broker.clock.cycle(): ...
+  @contextlib.contextmanager
+  def cycle(self):
+    self.start_cycle()
+    try:
+      yield self
+    finally:
+      self.end_cycle()
+
+if __name__ == "__main__":
+  clock = CLOCK()
+  print(clock.now())
+  print(clock.now("America/New_York"))
+  print(clock.parse("2021-01-05T14:30:00Z"))
+  print(clock.parse("2019-05-06T21:06:11.617Z"))
+  print(clock.parse("2021-01-05 09:30"))
+  print(clock.parse("2021-01-05 14:30:00 +0000"))
+  print(clock.parse("2021-01-05T09:30:00-05:00"))
@@ -1,18 +1,31 @@
 # Modules
 import re
 import os
+import sys
 import json
 import logging
+import threading
 import smtplib
 from pprint import pprint
 from email.message import EmailMessage
 from email.headerregistry import Address
-from email.utils import make_msgid
 
 class COMMON:
   # Config Variables
   user_config = None
 
+  # State File Variables
+  atomic_writes = True
+  fsync_batch = False
+
+  def __init__(self):
+    # {file: ((inode, mtime, size), data)} for read_json(cached=True)
+    self.json_cache = {}
+
+    # Files written while fsync_batch is on, synced by sync()
+    self.pending_sync = set()
+    self.lock = threading.Lock()
+
   # Get JSON Config
   def get_user_data(self, file=None, broker=None):
     if file:
@@ -35,18 +48,88 @@ class COMMON:
     return avail_class
 
   # General read a json file
-  def read_json(self, file=None):
+  #   cached=True returns the object parsed earlier while the file is unchanged, do not modify it
+  def read_json(self, file=None, cached=False):
+    if cached:
+      stat = os.stat(file)
+      key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+      with self.lock:
+        entry = self.json_cache.get(file)
+      if entry and entry[0] == key:
+        return entry[1]
+
     with open(file, "r") as h:
       try:
         data = json.load(h)
       except json.decoder.JSONDecodeError:
         data = {}
+
+    if cached:
+      with self.lock:
+        self.json_cache[file] = (key, data)
     return data
 
   # General write a json file
-  def write_json(self, data, file=None):
-    with open(file, "w+") as h:
+  #   Written to a temp file and renamed, readers see the old or the new file, never half
+  #   With fsync_batch on, the fsync is left for one sync() call covering every write
+  #   The new file keeps the mode of the one it replaces, or gets mode when given
+  def write_json(self, data, file=None, atomic=None, fsync=True, mode=None):
+    if atomic is None:
+      atomic = self.atomic_writes
+    if not atomic:
+      with open(file, "w+") as h:
+        h.write(json.dumps(data))
+      if mode is not None:
+        os.chmod(file, mode)
+      return
+
+    use_mode = mode
+    if use_mode is None:
+      try:
+        use_mode = os.stat(file).st_mode & 0o7777
+      except FileNotFoundError:
+        pass
+
+    # Never visible with looser permissions than the final file
+    temp_file = "%s.%s.%s.tmp" % (file, os.getpid(), threading.get_ident())
+    fd = os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600 if use_mode is not None else 0o666)
+    if use_mode is not None:
+      os.fchmod(fd, use_mode)
+    with os.fdopen(fd, "w") as h:
       h.write(json.dumps(data))
+      h.flush()
+      if fsync and not self.fsync_batch:
+        os.fsync(h.fileno())
+    os.replace(temp_file, file)
+
+    if fsync and self.fsync_batch:
+      with self.lock:
+        self.pending_sync.add(file)
+
+  # Flush the writes batched by fsync_batch, the files and then their directories
+  def sync(self):
+    with self.lock:
+      pending = self.pending_sync
+      self.pending_sync = set()
+
+    directories = set()
+    for file in pending:
+      try:
+        fd = os.open(file, os.O_RDONLY)
+      except FileNotFoundError:
+        continue
+      try:
+        os.fsync(fd)
+      finally:
+        os.close(fd)
+      directories.add(os.path.dirname(os.path.abspath(file)))
+
+    for directory in directories:
+      fd = os.open(directory, os.O_RDONLY)
+      try:
+        os.fsync(fd)
+      finally:
+        os.close(fd)
 
   # Send Email
   def send_email(self, msg, email, subject, email_bypass=False):
@@ -76,8 +159,8 @@ class COMMON:
     # This converts the message into a multipart/alternative
     # container, with the original text message as the first part 
     # and the new html message as the second part.
-    asparagus_cid = make_msgid()
-    msg.add_alternative(use_msg.format(asparagus_cid=asparagus_cid[1:-1]), subtype='html')
+    # The body is not passed through str.format, report values may contain braces
+    msg.add_alternative(use_msg, subtype='html')
 
     # Send Email
     if email:
@@ -8,18 +8,36 @@ import json
 import logging
 import datetime
 import argparse
+import concurrent.futures
 from pprint import pprint
 
 # Custom Modules
 sys.path.append(os.path.expanduser('~') + "/lazytrader")
 import common_class
 
+# Fetch and bin one symbol, a failing symbol is logged and skipped
+def get_gap(broker, symbol, days_back):
+  try:
+    return broker.get_price_gap(symbol, days_back=days_back)
+  except Exception as e:
+    logging.error("Price gap for %s failed: %s" % (symbol, e))
+    return None
+
+def print_gap(symbol, results):
+  print(symbol)
+  print("Price: Transaction Count")
+  pprint(results.to_dict())
+  print("Percentile: Price")
+  pprint(results.percentiles())
+  print("----------------------------------------------")
+
 if __name__ == "__main__":
   # Variables 
   log_level = logging.ERROR
   #log_level = logging.INFO
   symbol_list = []
   days_back = 0
+  jobs = 1
   cur_date = datetime.datetime.now()
 
   # Config Variables
@@ -35,6 +53,7 @@ if __name__ == "__main__":
   parser.add_argument('-d', '--debug', action='store_true', help="Debug Logging")
   parser.add_argument('-D', '--days', required=True, help="Days Back in Time")
   parser.add_argument('-s', '--symbol', required=True, action='append', help="Stock Symbol(s)")
+  parser.add_argument('-j', '--jobs', type=int, default=1, help="Symbols Processed at the Same Time")
 
   # Parse the argument
   args = parser.parse_args()
@@ -47,6 +66,8 @@ if __name__ == "__main__":
     days_back = args.days
   if args.symbol:
     symbol_list = args.symbol
+  if args.jobs:
+    jobs = max(1, args.jobs)
 
   # Initalize Logging
   logging.basicConfig(level=log_level)
@@ -71,10 +92,15 @@ if __name__ == "__main__":
         broker = getattr(module, each.upper())
         broker = broker(file_data)
 
-  for symbol in symbol_list:
-    results = broker.get_stock_price_gap(symbol, days_back=days_back)
-    print(symbol)
-    print("Price: Transaction Count")
-    pprint(results)
-    print("----------------------------------------------")
-
+  # Fetch and bin in threads, the binning is one bincount so it stays in process
+  # Print in the order given
+  failed = 0
+  with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as gap_pool:
+    gap_list = gap_pool.map(lambda symbol: get_gap(broker, symbol, days_back), symbol_list)
+    for symbol, results in zip(symbol_list, gap_list):
+      if results is None:
+        failed += 1
+        continue
+      print_gap(symbol, results)
+  if failed:
+    sys.exit(1)
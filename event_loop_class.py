@@ -0,0 +1,311 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import asyncio
+import logging
+import functools
+import concurrent.futures
+from pprint import pprint
+
+# Custom Modules
+#sys.path.append(os.path.expanduser('~') + "/lazytrader")
+sys.path.append(os.path.expanduser('~') + "/lazytrader-unreleased")
+
+import quote_bus_class
+
+#
+# Event driven replacement for the trader.py sleep loop
+#
+# Work is triggered by quote updates, order cancel deadlines and market
+# open/close changes instead of a fixed sleep_timer. The broker classes
+# are blocking and not thread safe, so every order call is handed to one
+# single worker thread and the event loop itself never waits on HTTP.
+# The market open/close checks only touch the calendar and run on their
+# own thread, so a slow status call never holds up an order.
+#
+# Full cycles (place and cancel for every symbol) are kept at least
+# min_cycle apart, by default the old sleep_timer. A new quote only runs
+# place_orders for the symbols that changed, each symbol at most once per
+# symbol_cycle, so the reaction to a quote is not held to the sleep_timer.
+#
+class EVENT_LOOP:
+  # Variables
+  broker = None
+  file_data = None
+  delay_market_open = 0
+  sleep_timer = 30
+  cancel_order_in_minutes = 10
+
+  # Event Variables
+  quote_poll = 0.05
+  min_cycle = None
+  symbol_cycle = 5
+
+  def __init__(self, broker, file_data):
+    self.broker = broker
+    self.file_data = file_data
+
+    # Set Variables
+    self.delay_market_open = file_data["delay_market_open"]
+    self.sleep_timer = file_data["sleep_timer"]
+    self.cancel_order_in_minutes = file_data[broker.broker]["cancel_order_in_minutes"]
+
+    # Optional event loop tuning
+    settings = file_data.get("asyncio", {})
+    self.quote_poll = float(settings.get("quote_poll", self.quote_poll))
+    self.symbol_cycle = float(settings.get("symbol_cycle", self.symbol_cycle))
+    self.min_cycle = float(settings.get("min_cycle") or self.min_cycle or self.sleep_timer)
+    if self.min_cycle < self.sleep_timer:
+      # Every cycle is a full round of broker calls, do not go past the old load
+      logging.warning("min_cycle of %s seconds is below the sleep_timer, using %s" % (self.min_cycle, self.sleep_timer))
+      self.min_cycle = float(self.sleep_timer)
+
+    # State Variables
+    self.market_is_open = False
+    self.market_counter = 0
+    self.last_cycle = 0
+    self.reasons = set()
+    self.symbols = set()
+    self.symbol_time = {}
+    self.deadlines = []
+    self.wake = None
+    self.wake_handle = None
+    self.loop = None
+    self.executor = None
+    self.market_executor = None
+
+  # Start the event loop, blocks forever
+  def run(self):
+    asyncio.run(self.main())
+
+  async def main(self):
+    self.loop = asyncio.get_running_loop()
+    self.wake = asyncio.Event()
+    self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    self.market_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    logging.info("Starting asyncio trader, full order cycles at least %s seconds apart, %s seconds per symbol on new quotes" % (self.min_cycle, self.symbol_cycle))
+
+    try:
+      await asyncio.gather(
+        self.market_watch(),
+        self.quote_watch(),
+        self.timer_watch(),
+        self.order_worker()
+      )
+    finally:
+      self.executor.shutdown(wait=False)
+      self.market_executor.shutdown(wait=False)
+
+  # Run a blocking broker call on the broker thread, one call at a time
+  async def call(self, func, *args, **kwargs):
+    return await self.loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+  # Run a market open/close check on the market thread
+  async def call_market(self, func, *args, **kwargs):
+    return await self.loop.run_in_executor(self.market_executor, functools.partial(func, *args, **kwargs))
+
+  # Ask the order worker to run a full cycle
+  def trigger(self, reason):
+    self.reasons.add(reason)
+    self.wake.set()
+
+  # Ask the order worker to place orders for symbols with a new quote
+  def trigger_symbols(self, symbols):
+    self.symbols.update(symbols)
+    self.wake.set()
+
+  # Wake the order worker after delay seconds, keeping only the earliest wake up
+  def wake_later(self, delay):
+    when = self.loop.time() + delay
+    if self.wake_handle and not self.wake_handle.cancelled() and self.wake_handle.when() <= when:
+      return
+    if self.wake_handle:
+      self.wake_handle.cancel()
+    self.wake_handle = self.loop.call_at(when, self.wake.set)
+
+  # Track the market open and close events
+  async def market_watch(self):
+    while True:
+      try:
+        is_open = await self.call_market(self.broker.market_open, self.delay_market_open)
+      except Exception as e:
+        logging.error("Connection to server failed: %s" % e)
+        is_open = self.market_is_open
+
+      if is_open and not self.market_is_open:
+        logging.info("Market is open")
+        self.market_is_open = True
+        self.trigger("market open")
+      elif not is_open and self.market_is_open:
+        logging.info("Market is closed")
+        self.market_is_open = False
+        self.market_counter = 0
+        self.broker.current_spend = 0
+        self.clear_deadlines()
+
+      await asyncio.sleep(await self.market_wait())
+
+  # Sleep until the next open or close when the broker knows the calendar
+  async def market_wait(self):
+    try:
+      if self.market_is_open:
+        wait_time = await self.call_market(self.broker.seconds_until_close)
+        return max(1, min(self.sleep_timer, wait_time))
+      wait_time = await self.call_market(self.broker.seconds_until_open, self.delay_market_open)
+      return max(1, wait_time)
+    except Exception:
+      return self.sleep_timer
+
+  # Symbols whose quote was written since the last check
+  def changed_symbols(self, quote_bus, updated):
+    symbols = []
+    for symbol in self.broker.stock_list:
+      values = quote_bus.read(symbol)
+      if values is None:
+        continue
+      if updated.get(symbol) != values[3]:
+        updated[symbol] = values[3]
+        symbols.append(symbol)
+    return symbols
+
+  # Wake the order worker with the symbols the stream wrote a new quote for
+  async def quote_watch(self):
+    broker_bus = getattr(self.broker, "quote_bus", None)
+    if broker_bus is None:
+      logging.info("Broker %s has no quote stream, using the sleep timer" % self.broker.broker)
+      return
+
+    # Own mapping of the bus, the broker thread reads through the broker one
+    quote_bus = quote_bus_class.QUOTE_BUS(broker_bus.filename)
+    updated = {}
+    last_generation = quote_bus.generation()
+    self.changed_symbols(quote_bus, updated)
+    while True:
+      cur_generation = quote_bus.generation()
+      if cur_generation != last_generation:
+        last_generation = cur_generation
+        symbols = self.changed_symbols(quote_bus, updated)
+        if symbols and self.market_is_open:
+          self.trigger_symbols(symbols)
+      await asyncio.sleep(self.quote_poll)
+
+  # Fallback cycle for brokers without pushed quotes
+  async def timer_watch(self):
+    while True:
+      await asyncio.sleep(self.sleep_timer)
+      if self.market_is_open:
+        self.trigger("timer")
+
+  # Schedule a wake up for when the orders just placed can be canceled
+  def add_deadline(self):
+    when = self.loop.time() + (self.cancel_order_in_minutes * 60) + 1
+
+    # One wake up per sleep_timer window is enough
+    if self.deadlines and self.deadlines[-1].when() > (when - self.sleep_timer):
+      return
+    self.deadlines.append(self.loop.call_at(when, self.trigger, "deadline"))
+
+  def clear_deadlines(self):
+    for each in self.deadlines:
+      each.cancel()
+    self.deadlines = []
+
+  # Runs on the broker thread, one "now" for every order in the cycle
+  def order_cycle(self):
+    with self.broker.clock.cycle():
+      # Place Buy Order
+      self.broker.place_orders()
+
+      # Cancel Old Orders
+      self.broker.cancel_orders()
+
+  # Runs on the broker thread, only places orders for the given symbols
+  def symbol_order_cycle(self, symbols):
+    with self.broker.clock.cycle():
+      self.broker.place_orders(symbols)
+
+  # Symbols with a new quote that have not had a cycle within symbol_cycle
+  def due_symbols(self, cur_time):
+    symbols = []
+    for symbol in self.symbols:
+      if cur_time - self.symbol_time.get(symbol, -self.symbol_cycle) >= self.symbol_cycle:
+        symbols.append(symbol)
+    return sorted(symbols)
+
+  # Seconds until the next pending symbol may have a cycle, None when nothing is pending
+  def next_symbol_wait(self, cur_time):
+    if not self.symbols:
+      return None
+    return min(self.symbol_time.get(symbol, -self.symbol_cycle) + self.symbol_cycle for symbol in self.symbols) - cur_time
+
+  # Single worker, triggers that arrive during a cycle collapse into the next one
+  #   A full cycle covers every symbol, so pending quote symbols are dropped by it
+  async def order_worker(self):
+    while True:
+      await self.wake.wait()
+      self.wake.clear()
+
+      if not self.market_is_open:
+        self.reasons.clear()
+        self.symbols.clear()
+        continue
+
+      cur_time = self.loop.time()
+      if self.reasons:
+        # Do not run full cycles closer together than min_cycle
+        wait = (self.last_cycle + self.min_cycle) - cur_time
+        if wait <= 0:
+          await self.full_cycle()
+          continue
+        self.wake_later(wait)
+
+      symbols = self.due_symbols(cur_time)
+      if symbols:
+        await self.symbol_cycle_run(symbols)
+        cur_time = self.loop.time()
+
+      wait = self.next_symbol_wait(cur_time)
+      if wait is not None:
+        self.wake_later(max(0, wait))
+
+  async def full_cycle(self):
+    reasons = ", ".join(sorted(self.reasons))
+    self.reasons.clear()
+    self.symbols.clear()
+    self.last_cycle = self.loop.time()
+    for symbol in self.broker.stock_list:
+      self.symbol_time[symbol] = self.last_cycle
+    logging.debug("Order cycle %s triggered by: %s" % (self.market_counter, reasons))
+
+    try:
+      await self.call(self.order_cycle)
+    except Exception as e:
+      logging.error("Order cycle failed: %s" % e)
+      return
+
+    self.placed_orders()
+    logging.debug("Order cycle finished in %s seconds" % round(self.loop.time() - self.last_cycle, 3))
+
+  async def symbol_cycle_run(self, symbols):
+    start_time = self.loop.time()
+    self.symbols.difference_update(symbols)
+    for symbol in symbols:
+      self.symbol_time[symbol] = start_time
+    logging.debug("Order cycle %s for new quotes: %s" % (self.market_counter, ", ".join(symbols)))
+
+    try:
+      await self.call(self.symbol_order_cycle, symbols)
+    except Exception as e:
+      logging.error("Order cycle for %s failed: %s" % (", ".join(symbols), e))
+      return
+
+    self.placed_orders()
+    logging.debug("Order cycle for %s finished in %s seconds" % (", ".join(symbols), round(self.loop.time() - start_time, 3)))
+
+  # Orders may have gone out, wake up when they can be canceled
+  def placed_orders(self):
+    self.deadlines = [each for each in self.deadlines if each.when() > self.loop.time()]
+    self.add_deadline()
+    self.market_counter += 1
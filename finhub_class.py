@@ -6,13 +6,15 @@ import sys
 import json
 import logging
 import datetime
-import requests
 from pprint import pprint
 
 # Custom Modules
 #sys.path.append(os.path.expanduser('~') + "/lazytrader")
 sys.path.append(os.path.expanduser('~') + "/lazytrader-unreleased")
 
+import transport_class
+import market_session_class
+
 class FINHUB:
   # Variables
   file_data = None
@@ -21,6 +23,14 @@ class FINHUB:
   finhub_api = None
   base_url = "https://finnhub.io/api/v1"
 
+  # Market Status Variables
+  status_time = None
+  status_retry = 60
+  status_retry_max = 900
+  status_delay = 15
+  status_confirm = 30
+  status_shift = 60
+
   def __init__(self, file_data=None):
     if file_data:
       self.file_data = file_data
@@ -30,33 +40,141 @@ class FINHUB:
       self.finhub_api = self.file_data["finhub_api_key"]
     except TypeError:
       logging.error("Unable to locate Finhub.io API Key in config")
+    if self.file_data and self.file_data.get("finhub_base_url"):
+      self.base_url = self.file_data["finhub_base_url"].rstrip("/")
+
+    # Pooled connections with timeouts
+    self.transport = transport_class.TRANSPORT(self.file_data)
+
+    # Local holiday and session table, corrected by the Finnhub status
+    self.session = market_session_class.MARKET_SESSION()
+
+    # Status Variables
+    self.failures = 0
+    self.next_check = None
+    self.disagree = None
+
+  # The API key goes in a header, never in a url that could be logged
+  def token_headers(self):
+    return {"X-Finnhub-Token": "%s" % self.finhub_api}
 
   # Determine the stock market is open
-  def market_open(self):
-    url = "%s/stock/market-status" % self.base_url
-    url += "?exchange=US"
-    url += "&token=%s" % self.finhub_api
-    res = requests.get(url)
-    
-    if res.status_code == 200:
-      res = res.json()
+  def market_open(self, delay=0):
+    cur_date = self.load_session()
+    return self.session.is_open(delay, cur_date)
+
+  # Seconds until trading may start, 0 when the market is open
+  def seconds_until_open(self, delay=0):
+    cur_date = self.load_session()
+    return self.session.seconds_until_open(delay, cur_date)
+
+  # Seconds until the market closes, None when it is closed
+  def seconds_until_close(self):
+    cur_date = self.load_session()
+    return self.session.seconds_until_close(cur_date)
+
+  # Make sure the session table is current, only asking Finnhub near a transition
+  def load_session(self):
+    cur_date = self.session.now()
+    self.session.add_local_month(cur_date.year, cur_date.month)
+    year, month = self.session.next_month(cur_date)
+    self.session.add_local_month(year, month)
 
-    if res["isOpen"]:
+    if self.needs_status(cur_date):
+      self.get_market_status(cur_date)
+    return cur_date
+
+  # Ask again once per day and once after every open or close, or when a retry is due
+  def needs_status(self, cur_date):
+    if self.next_check:
+      return cur_date >= self.next_check
+    if not self.status_time:
+      return True
+    if self.status_time.date() != cur_date.date():
       return True
-    else:
+
+    session = self.session.get_session(cur_date)
+    if not session:
       return False
+    for transition in session:
+      # Give Finnhub a few seconds to flip its status
+      use_transition = transition + datetime.timedelta(seconds=self.status_delay)
+      if self.status_time < use_transition <= cur_date:
+        return True
+    return False
+
+  # Get the market status from Finnhub and correct today's session with it
+  #   A disagreement with the local table only counts once a second answer agrees with it,
+  #   and then only the nearest open or close is moved
+  def get_market_status(self, cur_date):
+    url = "%s/stock/market-status" % self.base_url
+    payload = {"exchange": "US"}
+    try:
+      res = self.transport.get(url, params=payload, headers=self.token_headers())
+      if res.status_code != 200:
+        raise ValueError("status code %s" % res.status_code)
+      res = res.json()
+      is_open = res["isOpen"] and res.get("session") in [None, "regular"]
+    except Exception as e:
+      # Use the local table and try again with backoff
+      wait = min(self.status_retry_max, self.status_retry * (2 ** self.failures))
+      self.failures += 1
+      self.next_check = cur_date + datetime.timedelta(seconds=wait)
+      logging.warning("Finnhub market status failed, using the local session table, retrying in %s seconds: %s" % (wait, e))
+      return None
+
+    self.failures = 0
+    self.next_check = None
+    self.status_time = cur_date
+    local_open = self.session.is_open(0, cur_date)
+    logging.debug("Finnhub market status: open %s, session %s, local table open %s" % (is_open, res.get("session"), local_open))
+
+    today = cur_date.strftime("%Y-%m-%d")
+    if is_open == local_open:
+      self.disagree = None
+      return is_open
+
+    # Ask once more before changing the table
+    if self.disagree != (today, is_open):
+      self.disagree = (today, is_open)
+      self.next_check = cur_date + datetime.timedelta(seconds=self.status_confirm)
+      logging.info("Finnhub reports the market %s, checking again in %s seconds" % ("open" if is_open else "closed", self.status_confirm))
+      return is_open
+    self.disagree = None
+
+    # Finnhub knows about late opens, early closes and missing table entries
+    session = self.session.get_session(cur_date)
+    shift = datetime.timedelta(seconds=self.status_shift)
+    if local_open and not is_open:
+      start_date, end_date = session
+      if (cur_date - start_date) <= (end_date - cur_date):
+        # Not open yet, move the open along and ask again then
+        start_date = min(end_date, cur_date + shift)
+        logging.warning("Finnhub reports the market still closed, moving the %s open to %s" % (today, start_date.strftime("%H:%M:%S")))
+      else:
+        end_date = cur_date
+        logging.warning("Finnhub reports the market closed early, moving the %s close to %s" % (today, end_date.strftime("%H:%M:%S")))
+      self.session.set_session(start_date, end_date)
+    elif is_open and not session:
+      logging.warning("Finnhub reports the market open, opening %s" % today)
+      self.session.add_day(today, self.session.regular_start, self.session.regular_end)
+    elif is_open and cur_date < session[0]:
+      logging.warning("Finnhub reports the market open early, moving the %s open to %s" % (today, cur_date.strftime("%H:%M:%S")))
+      self.session.set_session(cur_date, session[1])
+    elif is_open:
+      # Past the close, keep going a little and ask again then
+      logging.warning("Finnhub reports the market still open, moving the %s close to %s" % (today, (cur_date + shift).strftime("%H:%M:%S")))
+      self.session.set_session(session[0], cur_date + shift)
+    return is_open
 
   # Get the news for a stock
   def get_news(self, symbol):
     cur_date = datetime.datetime.now()
     cur_date = cur_date.strftime("%Y-%m-%d")
     url = "%s/company-news" % self.base_url
-    url += "?symbol=%s" % symbol
-    url += "&from=%s" % cur_date
-    url += "&to=%s" % cur_date
-    url += "&token=%s" % self.finhub_api
-    print(url)
-    res = requests.get(url)
+    payload = {"symbol": symbol, "from": cur_date, "to": cur_date}
+    logging.debug("URL: %s, Parameters: %s" % (url, payload))
+    res = self.transport.get(url, params=payload, headers=self.token_headers())
 
     if res.status_code == 200:
       res = res.json()
@@ -4,54 +4,220 @@
 import re
 import os
 import sys
+import time
 import json
 import pytz
 import logging
 import datetime
 import requests
+import threading
+import concurrent.futures
 from pprint import pprint
 
 # Custom Modules
 #sys.path.append(os.path.expanduser('~') + "/lazytrader")
 sys.path.append(os.path.expanduser('~') + "/lazytrader-unreleased")
 
+#
+# FinViz screener symbols
+#
+# Results are cached per screener parameters for ttl seconds. After that
+# the first page is asked for again with its ETag / Last-Modified, and a
+# 304 keeps the cached symbols without downloading or parsing anything.
+#
+# A screener with more results than one page has its remaining pages
+# ("r=" start row) fetched concurrently, at most page_workers at a time
+# and with page requests started at least min_interval seconds apart.
+#
 class FINVIZ:
   # Variables
   url = "https://finviz.com/screener.ashx"
   headers = {
     "User-Agent": "curl/7.74.0"
   }
+  timeout = (3.05, 30)
 
-  def get_symbols(self, param=None):
+  # Cache Variables
+  ttl = 300
+
+  # Page Variables
+  page_workers = 3
+  min_interval = 1.0
+  max_pages = 50
+
+  def __init__(self, ttl=None, page_workers=None, min_interval=None):
+    if ttl is not None:
+      self.ttl = ttl
+    if page_workers:
+      self.page_workers = int(page_workers)
+    if min_interval is not None:
+      self.min_interval = float(min_interval)
+    self.session = requests.Session()
+    self.cache = {}
+    self.lock = threading.Lock()
+
+    # Rate Limit Variables
+    self.next_start = 0
+
+    # [(start row, seconds, symbols)] for the last download of each screener
+    self.page_times = {}
+
+  # Cache key for string or dictionary parameters
+  def cache_key(self, param):
+    if type(param) is dict:
+      return tuple(sorted(param.items()))
+    return param
+
+  # Same parameters starting at a later row
+  def page_param(self, param, start_row):
+    if start_row <= 1:
+      return param
+    if type(param) is dict:
+      use_param = dict(param)
+      use_param["r"] = start_row
+      return use_param
+    return "%s&r=%s" % (param, start_row)
+
+  # Symbols from the "<!-- TS ... TE -->" block, without splitting the rest of the page
+  def parse_symbols(self, text):
     # Variables
     data = []
-    stock_array = []
 
+    start = text.find("<!-- TS")
+    if start < 0:
+      return data
+    end = text.find("TE -->", start)
+    if end < 0:
+      end = len(text)
+
+    for line in text[start + 7:end].splitlines():
+      stock = line.split("|", 1)[0].strip()
+      if stock:
+        data.append(stock)
+    return data
+
+  # Total number of results shown on the page ("Total: 123" or "123 Total"), None when missing
+  def parse_total(self, text):
+    found = re.search(r"Total:\s*(?:</b>)?\s*(\d+)", text) or re.search(r"(\d+)\s*Total", text)
+    if found:
+      return int(found.group(1))
+    return None
+
+  # Space page requests at least min_interval seconds apart across all threads
+  def throttle(self):
+    with self.lock:
+      cur_time = time.monotonic()
+      wait = self.next_start - cur_time
+      self.next_start = max(cur_time, self.next_start) + self.min_interval
+    if wait > 0:
+      time.sleep(wait)
+
+  # Get one page, returns (response or None, seconds)
+  def fetch_page(self, param, start_row=1, headers=None):
+    self.throttle()
+    start_time = time.monotonic()
+    use_param = self.page_param(param, start_row)
+    logging.debug("URL: %s" % self.url)
+    logging.debug("Parameters: %s" % (use_param,))
+    try:
+      res = self.session.get(self.url, params=use_param, headers=headers or self.headers, timeout=self.timeout)
+    except requests.exceptions.RequestException as e:
+      logging.error("FinViz request for row %s failed: %s" % (start_row, e))
+      return (None, time.monotonic() - start_time)
+    return (res, time.monotonic() - start_time)
+
+  # Symbols of the pages after the first in page order, returns (symbols, failed)
+  def fetch_pages(self, param, start_rows, page_times):
+    data = []
+    failed = False
+
+    def get_page(start_row):
+      res, seconds = self.fetch_page(param, start_row)
+      if res is None or res.status_code != 200:
+        if res is not None:
+          logging.error("FinViz returned the status code of %s for row %s" % (res.status_code, start_row))
+        return (start_row, seconds, None)
+      return (start_row, seconds, self.parse_symbols(res.text))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.page_workers, len(start_rows))) as executor:
+      for start_row, seconds, symbols in executor.map(get_page, start_rows):
+        page_times.append((start_row, round(seconds, 3), len(symbols or [])))
+        if symbols is None:
+          failed = True
+          continue
+        data.extend(symbols)
+    return (data, failed)
+
+  def get_symbols(self, param=None):
     if not param:
       return param
 
+    key = self.cache_key(param)
+    with self.lock:
+      entry = self.cache.get(key)
+    if entry and time.monotonic() < entry["expires"]:
+      logging.debug("Using cached FinViz symbols for %s" % (param,))
+      return list(entry["symbols"])
+
+    # Revalidate what we have instead of downloading it again
+    headers = dict(self.headers)
+    if entry and entry["etag"]:
+      headers["If-None-Match"] = entry["etag"]
+    if entry and entry["last_modified"]:
+      headers["If-Modified-Since"] = entry["last_modified"]
+
     # Get results from FinViz
-    cur_session = requests.Session()
     logging.info("Sending request to FinViz stock screener")
-    logging.debug("URL: %s" % self.url)
-    logging.debug("Headers: %s" % self.headers)
-    logging.debug("Parameters: %s" % param)
-    res = cur_session.get(self.url, params=param, headers=self.headers)
-
-    # Parse results
-    for line in re.split("[<>]", res.text):
-      if re.search("-- TS", line):
-        stock_array = re.split("\n", line)
-    
-    for each_stock in stock_array:
-      stock = re.search("^(\w+)|", each_stock)
-      stock = stock.group(0).strip()
-      if len(stock) == 0:
-        continue
-      data.append(stock)
-    logging.info("Found %s number of stocks" % len(stock))
+    logging.debug("Headers: %s" % headers)
+    res, seconds = self.fetch_page(param, headers=headers)
+    page_times = [(1, round(seconds, 3), 0)]
+    if res is None or (res.status_code not in [200, 304]) or (res.status_code == 304 and not entry):
+      if res is not None:
+        logging.error("FinViz returned the status code of %s" % res.status_code)
+      if entry:
+        return list(entry["symbols"])
+      return []
+
+    etag = res.headers.get("ETag")
+    last_modified = res.headers.get("Last-Modified")
+    if res.status_code == 304:
+      logging.debug("FinViz results unchanged for %s" % (param,))
+      data = entry["symbols"]
+      etag = etag or entry["etag"]
+      last_modified = last_modified or entry["last_modified"]
+    else:
+      data = self.parse_symbols(res.text)
+      page_times[0] = (1, round(seconds, 3), len(data))
+
+      # The rest of the pages, all at once
+      total = self.parse_total(res.text)
+      page_size = len(data)
+      if total and page_size and total > page_size:
+        last_row = min(total, page_size * self.max_pages)
+        if total > last_row:
+          logging.error("FinViz screener has %s results, only reading the first %s" % (total, last_row))
+        more, failed = self.fetch_pages(param, list(range(page_size + 1, last_row + 1, page_size)), page_times)
+        data = data + more
+        if failed:
+          # Incomplete, do not let a 304 keep it past the ttl
+          etag = None
+          last_modified = None
+
+      # Pages can shift while being read, keep the first of any repeats
+      data = list(dict.fromkeys(data))
+
+    with self.lock:
+      self.cache[key] = {
+        "symbols": data,
+        "expires": time.monotonic() + self.ttl,
+        "etag": etag,
+        "last_modified": last_modified
+      }
+      self.page_times[key] = page_times
+    logging.info("Found %s number of stocks" % len(data))
+    logging.debug("FinViz pages (start row, seconds, symbols): %s" % page_times)
     logging.debug("Parsed FinViz stock data: %s" % data)
-    return data
+    return list(data)
 
 if __name__ == "__main__":
   # Variables
@@ -0,0 +1,199 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import pytz
+import sqlite3
+import logging
+import datetime
+from pprint import pprint
+
+# Custom Modules
+#sys.path.append(os.path.expanduser('~') + "/lazytrader")
+sys.path.append(os.path.expanduser('~') + "/lazytrader-unreleased")
+
+#
+# Local SQLite ledger of closed trades
+#
+# Closed trades never change, so each one is downloaded once. A sync only
+# asks the broker for the days since the last successful sync (plus a few
+# days of overlap for trades that settle late, skipped by the primary key)
+# and the reports are SQL aggregates.
+#
+# Brokers provide iter_closed_trades(days_back, raise_on_failure) yielding
+# dictionaries with trade_id, symbol, open_time, close_time (UTC
+# "YYYY-MM-DD HH:MM:SS"), qty, buy_amount, sell_amount and fees, page by
+# page. A broker with a history limit sets ledger_max_days, a sync never
+# asks for more than that.
+#
+# Report figures are GROUP BY queries on the close_time index. The by hour
+# and by weekday figures are grouped by UTC hour in SQL; every UTC hour is
+# one hour of one day in the market timezone, so only the groups are
+# converted in Python.
+#
+class LEDGER:
+  # Variables
+  filename = os.path.expanduser('~') + "/lazytrader-unreleased/ledger.db"
+  initial_days = 365
+  overlap_days = 3
+  batch_size = 500
+  timezone = "America/New_York"
+  columns = ["trade_id", "symbol", "open_time", "close_time", "qty", "buy_amount", "sell_amount", "fees"]
+
+  def __init__(self, filename=None):
+    if filename:
+      self.filename = filename
+    self.use_tz = pytz.timezone(self.timezone)
+    self.db = sqlite3.connect(self.filename)
+    self.create()
+
+  def create(self):
+    with self.db:
+      self.db.execute("""CREATE TABLE IF NOT EXISTS trades (
+        broker TEXT NOT NULL,
+        trade_id TEXT NOT NULL,
+        symbol TEXT NOT NULL,
+        open_time TEXT NOT NULL,
+        close_time TEXT NOT NULL,
+        qty REAL NOT NULL,
+        buy_amount REAL NOT NULL,
+        sell_amount REAL NOT NULL,
+        fees REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (broker, trade_id))""")
+      self.db.execute("CREATE INDEX IF NOT EXISTS trades_close ON trades (broker, close_time)")
+      self.db.execute("CREATE INDEX IF NOT EXISTS trades_symbol ON trades (broker, symbol, close_time)")
+      self.db.execute("""CREATE TABLE IF NOT EXISTS syncs (
+        broker TEXT PRIMARY KEY,
+        sync_time TEXT NOT NULL)""")
+
+  def close(self):
+    self.db.close()
+
+  # Start (UTC) of the last sync that finished, None before the first one
+  def last_sync(self, broker_name):
+    row = self.db.execute("SELECT sync_time FROM syncs WHERE broker = ?", (broker_name,)).fetchone()
+    if not row:
+      return None
+    return row[0]
+
+  # Store a batch of trades, returns the number of new trades
+  def insert(self, rows):
+    with self.db:
+      before = self.db.total_changes
+      self.db.executemany("INSERT OR IGNORE INTO trades (broker, %s) VALUES (?, %s)" % (", ".join(self.columns), ", ".join(["?"] * len(self.columns))), rows)
+      return self.db.total_changes - before
+
+  # Pull the trades closed since the last sync, returns the number of new trades
+  #   The sync time only moves forward once the broker returned every page
+  def sync(self, broker, days_back=None):
+    cur_date = datetime.datetime.now(datetime.timezone.utc)
+    last_sync = self.last_sync(broker.broker)
+    if last_sync:
+      last_date = datetime.datetime.strptime(last_sync[:10], "%Y-%m-%d").date()
+      fetch_days = (cur_date.date() - last_date).days + self.overlap_days
+    else:
+      fetch_days = max(int(days_back or 0), self.initial_days)
+
+    # Never ask past the broker history
+    max_days = getattr(broker, "ledger_max_days", None)
+    if max_days and fetch_days > max_days:
+      logging.warning("%s only keeps %s days of history, ledger sync asked for %s days" % (broker.broker, max_days, fetch_days))
+      fetch_days = max_days
+    logging.info("Ledger sync for %s, %s days back" % (broker.broker, fetch_days))
+
+    # Store the trades as they arrive, one batch at a time
+    rows = []
+    added = 0
+    total = 0
+    try:
+      for trade in broker.iter_closed_trades(days_back=fetch_days, raise_on_failure=True):
+        rows.append([broker.broker] + [trade[key] for key in self.columns])
+        if len(rows) >= self.batch_size:
+          added += self.insert(rows)
+          total += len(rows)
+          rows = []
+    except Exception as e:
+      added += self.insert(rows)
+      logging.error("Ledger sync for %s failed after %s trades, retrying from the last sync next time: %s" % (broker.broker, total + len(rows), e))
+      return added
+    added += self.insert(rows)
+    total += len(rows)
+
+    with self.db:
+      self.db.execute("INSERT OR REPLACE INTO syncs (broker, sync_time) VALUES (?, ?)", (broker.broker, cur_date.strftime("%Y-%m-%d %H:%M:%S")))
+    logging.info("Ledger added %s of %s trades for %s" % (added, total, broker.broker))
+    return added
+
+  # First close time included when looking days_back days, 0 is today (UTC)
+  def since(self, days_back):
+    start_date = datetime.datetime.now(datetime.timezone.utc).date() - datetime.timedelta(days=int(days_back))
+    return start_date.strftime("%Y-%m-%d 00:00:00")
+
+  # WHERE clause for the trades closed from since up to (not including) until
+  def window(self, broker_name, since, until=None):
+    query = "broker = ? AND close_time >= ?"
+    params = [broker_name, since]
+    if until:
+      query += " AND close_time < ?"
+      params.append(until)
+    return (query, params)
+
+  # {symbol: {"success_counter", "profit", "fees", "total_trans_sec"}} for the trades closed in the window
+  def symbol_totals(self, broker_name, since, until=None):
+    data = {}
+    where, params = self.window(broker_name, since, until)
+    query = """SELECT symbol, COUNT(*), SUM(sell_amount - buy_amount), SUM(fees),
+      SUM((julianday(close_time) - julianday(open_time)) * 86400)
+      FROM trades WHERE %s GROUP BY symbol ORDER BY symbol""" % where
+    for symbol, count, profit, fees, trans_sec in self.db.execute(query, params):
+      data[symbol] = {"success_counter": count, "profit": profit, "fees": fees, "total_trans_sec": trans_sec}
+    return data
+
+  # {(hour, weekday): {"count", "profit"}} by close time in the market timezone
+  def hour_totals(self, broker_name, since, until=None):
+    data = {}
+    where, params = self.window(broker_name, since, until)
+    query = """SELECT strftime('%%Y-%%m-%%d %%H:00:00', close_time), COUNT(*), SUM(sell_amount - buy_amount)
+      FROM trades WHERE %s GROUP BY 1""" % where
+    for utc_hour, count, profit in self.db.execute(query, params):
+      local_time = pytz.utc.localize(datetime.datetime.strptime(utc_hour, "%Y-%m-%d %H:%M:%S")).astimezone(self.use_tz)
+      key = (local_time.strftime("%H:00"), local_time.strftime("%A"))
+      if key not in data:
+        data[key] = {"count": 0, "profit": 0}
+      data[key]["count"] += count
+      data[key]["profit"] += profit
+    return data
+
+  # {symbol: {...}, "Summary": {...}} for the trades closed in the window
+  def summary(self, broker_name, days_back=0):
+    data = {"Summary": {"Total_Profit": 0}}
+    for symbol, totals in self.symbol_totals(broker_name, self.since(days_back)).items():
+      data[symbol] = {}
+      data[symbol]["success_counter"] = totals["success_counter"]
+      data[symbol]["profit"] = round(totals["profit"], 2)
+      data[symbol]["fees"] = round(totals["fees"], 2)
+      data[symbol]["avg_trans_per_sec"] = round(totals["total_trans_sec"] / totals["success_counter"], 2)
+      data["Summary"]["Total_Profit"] += totals["profit"]
+    data["Summary"]["Total_Profit"] = round(data["Summary"]["Total_Profit"], 2)
+    return data
+
+  # Trades closed in the window, oldest first
+  def trades(self, broker_name, days_back=0, symbol=None):
+    query = "SELECT %s FROM trades WHERE broker = ? AND close_time >= ?" % ", ".join(self.columns)
+    params = [broker_name, self.since(days_back)]
+    if symbol:
+      query += " AND symbol = ?"
+      params.append(symbol.upper())
+    query += " ORDER BY close_time"
+    for row in self.db.execute(query, params):
+      yield dict(zip(self.columns, row))
+
+if __name__ == "__main__":
+  # Enable logging
+  logging.basicConfig(level=logging.DEBUG)
+
+  ledger = LEDGER(":memory:")
+  cur_date = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d")
+  ledger.db.execute("INSERT INTO trades VALUES ('test', '1', 'AAPL', ?, ?, 1, 128.10, 128.20, 0)", (cur_date + " 14:30:00", cur_date + " 14:35:00"))
+  pprint(ledger.summary("test"))
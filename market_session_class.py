@@ -0,0 +1,201 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import pytz
+import logging
+import datetime
+from pprint import pprint
+
+# Custom Modules
+#sys.path.append(os.path.expanduser('~') + "/lazytrader")
+sys.path.append(os.path.expanduser('~') + "/lazytrader-unreleased")
+
+#
+# In memory market calendar
+#
+# Holds the regular session for each loaded day and answers "is the market
+# open" and "how long until the next open/close" without asking a broker.
+# The brokers fill it from their own calendar source.
+#
+class MARKET_SESSION:
+  # Variables
+  timezone = "America/New_York"
+
+  # Local Table Variables
+  regular_start = "09:30"
+  regular_end = "16:00"
+  early_end = "13:00"
+
+  def __init__(self, timezone=None):
+    if timezone:
+      self.timezone = timezone
+    self.use_tz = pytz.timezone(self.timezone)
+
+    # Session Variables
+    self.days = {}
+    self.months = set()
+
+  # Current time in the market timezone
+  def now(self):
+    return datetime.datetime.now(self.use_tz)
+
+  # Add a day, start and end as "HH:MM", a day without times is closed
+  def add_day(self, date, start=None, end=None):
+    if not start or not end:
+      self.days[date] = None
+      return
+
+    start_date = datetime.datetime.strptime("%s %s" % (date, start), "%Y-%m-%d %H:%M")
+    end_date = datetime.datetime.strptime("%s %s" % (date, end), "%Y-%m-%d %H:%M")
+    self.days[date] = (self.use_tz.localize(start_date), self.use_tz.localize(end_date))
+
+  # Replace the session of the day of start_date with aware start and end times
+  def set_session(self, start_date, end_date):
+    self.days[start_date.strftime("%Y-%m-%d")] = (start_date, end_date)
+
+  def add_month(self, year, month):
+    self.months.add((int(year), int(month)))
+
+  def has_month(self, year, month):
+    return (int(year), int(month)) in self.months
+
+  # Regular session (start, end) for a day, None when closed or unknown
+  def get_session(self, cur_date):
+    return self.days.get(cur_date.strftime("%Y-%m-%d"))
+
+  # Determine if the market is open, ignoring the first delay seconds
+  def is_open(self, delay=0, cur_date=None):
+    if not cur_date:
+      cur_date = self.now()
+
+    session = self.get_session(cur_date)
+    if not session:
+      return False
+    start_date, end_date = session
+    return (start_date + datetime.timedelta(seconds=delay)) <= cur_date <= end_date
+
+  # Seconds until trading may start (0 when open), None when the calendar is not loaded far enough
+  def seconds_until_open(self, delay=0, cur_date=None):
+    if not cur_date:
+      cur_date = self.now()
+
+    use_delay = datetime.timedelta(seconds=delay)
+    for day in sorted(self.days):
+      if day < cur_date.strftime("%Y-%m-%d") or not self.days[day]:
+        continue
+      start_date, end_date = self.days[day]
+      if cur_date > end_date:
+        continue
+      return max(0, ((start_date + use_delay) - cur_date).total_seconds())
+    return None
+
+  # Seconds until the current session closes, None when the market is closed
+  def seconds_until_close(self, cur_date=None):
+    if not cur_date:
+      cur_date = self.now()
+
+    session = self.get_session(cur_date)
+    if not session or cur_date < session[0] or cur_date > session[1]:
+      return None
+    return (session[1] - cur_date).total_seconds()
+
+  # Easter Sunday for a year (Anonymous Gregorian algorithm)
+  def easter(self, year):
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = ((19 * a) + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + (2 * e) + (2 * i) - h - k) % 7
+    m = (a + (11 * h) + (22 * l)) // 451
+    month, day = divmod(h + l - (7 * m) + 114, 31)
+    return datetime.date(year, month, day + 1)
+
+  # The nth weekday (Monday = 0) of a month, a negative nth counts from the end
+  def nth_weekday(self, year, month, weekday, nth):
+    if nth > 0:
+      first = datetime.date(year, month, 1)
+      shift = (weekday - first.weekday()) % 7
+      return first + datetime.timedelta(days=shift + (7 * (nth - 1)))
+    if month == 12:
+      last = datetime.date(year, 12, 31)
+    else:
+      last = datetime.date(year, month + 1, 1) - datetime.timedelta(days=1)
+    shift = (last.weekday() - weekday) % 7
+    return last - datetime.timedelta(days=shift + (7 * (-nth - 1)))
+
+  # Saturday holidays move to Friday, Sunday holidays to Monday
+  def observed(self, holiday):
+    if holiday.weekday() == 5:
+      return holiday - datetime.timedelta(days=1)
+    if holiday.weekday() == 6:
+      return holiday + datetime.timedelta(days=1)
+    return holiday
+
+  # NYSE holidays and early closes for a year, date -> None (closed) or close time
+  def local_holidays(self, year):
+    data = {}
+
+    # New Years Day is not moved back into the previous year
+    new_year = datetime.date(year, 1, 1)
+    if new_year.weekday() != 5:
+      data[self.observed(new_year)] = None
+
+    data[self.nth_weekday(year, 1, 0, 3)] = None
+    data[self.nth_weekday(year, 2, 0, 3)] = None
+    data[self.easter(year) - datetime.timedelta(days=2)] = None
+    data[self.nth_weekday(year, 5, 0, -1)] = None
+    if year >= 2022:
+      data[self.observed(datetime.date(year, 6, 19))] = None
+    data[self.observed(datetime.date(year, 7, 4))] = None
+    data[self.nth_weekday(year, 9, 0, 1)] = None
+    thanksgiving = self.nth_weekday(year, 11, 3, 4)
+    data[thanksgiving] = None
+    data[self.observed(datetime.date(year, 12, 25))] = None
+
+    # Early closes, only when the day is a normal trading day
+    early_list = [datetime.date(year, 7, 3), thanksgiving + datetime.timedelta(days=1), datetime.date(year, 12, 24)]
+    for each in early_list:
+      if each.weekday() < 5 and each not in data:
+        data[each] = self.early_end
+    return data
+
+  # Fill a month from the local holiday and session table
+  def add_local_month(self, year, month):
+    if self.has_month(year, month):
+      return
+
+    holidays = self.local_holidays(year)
+    cur_day = datetime.date(year, month, 1)
+    while cur_day.month == month:
+      date = cur_day.strftime("%Y-%m-%d")
+      if cur_day.weekday() >= 5:
+        self.add_day(date)
+      elif cur_day in holidays:
+        self.add_day(date, self.regular_start, holidays[cur_day])
+      else:
+        self.add_day(date, self.regular_start, self.regular_end)
+      cur_day += datetime.timedelta(days=1)
+    self.add_month(year, month)
+
+  # First day of the month after cur_date
+  def next_month(self, cur_date):
+    if cur_date.month == 12:
+      return (cur_date.year + 1, 1)
+    return (cur_date.year, cur_date.month + 1)
+
+if __name__ == "__main__":
+  # Enable logging
+  logging.basicConfig(level=logging.DEBUG)
+
+  # Regular session for today
+  session = MARKET_SESSION()
+  today = session.now().strftime("%Y-%m-%d")
+  session.add_day(today, "09:30", "16:00")
+  print("Open: %s" % session.is_open())
+  print("Seconds until open: %s" % session.seconds_until_open())
+  print("Seconds until close: %s" % session.seconds_until_close())
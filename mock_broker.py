@@ -0,0 +1,68 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import logging
+import argparse
+from pprint import pprint
+
+# Custom Modules
+sys.path.append(os.path.expanduser('~') + "/lazytrader")
+import common_class
+import mock_server_class
+
+if __name__ == "__main__":
+  # Variables
+  log_level = logging.ERROR
+  #log_level = logging.INFO
+  log_format = "%(asctime)s: %(levelname)s: %(message)s - [%(filename)s: %(lineno)d]"
+
+  # Config Variables
+  user_config = os.path.expanduser('~') + "/lazytrader/user_config.json"
+
+  # Create the parser
+  parser = argparse.ArgumentParser()
+
+  # Add an argument
+  parser.add_argument('-v', '--verbose', action='store_true', help="Verbose Logging")
+  parser.add_argument('-d', '--debug', action='store_true', help="Debug Logging")
+  parser.add_argument('-u', '--user_config', help="User JSON Config File")
+  parser.add_argument('-H', '--host', help="Address to listen on")
+  parser.add_argument('-p', '--port', type=int, help="Port to listen on")
+  parser.add_argument('-f', '--fill_model', choices=mock_server_class.MOCK_SERVER.fill_models, help="How orders fill")
+
+  # Parse the argument
+  args = parser.parse_args()
+
+  if args.verbose:
+    log_level = logging.INFO
+  if args.debug:
+    log_level = logging.DEBUG
+  if args.user_config:
+    user_config = args.user_config
+
+  # Initalize Logging
+  logging.basicConfig(level=log_level, format=log_format)
+
+  # Initalize common class
+  common_class = common_class.COMMON()
+
+  # Initalize user config data, the mock runs with its defaults without one
+  try:
+    file_data = common_class.get_user_data(user_config)
+  except FileNotFoundError:
+    file_data = {}
+  logging.debug("User Config Data from: %s" % user_config)
+
+  # Command line settings win over the config
+  settings = file_data.setdefault("mock_broker", {})
+  if args.host:
+    settings["host"] = args.host
+  if args.port:
+    settings["port"] = args.port
+  if args.fill_model:
+    settings["fill_model"] = args.fill_model
+
+  mock_server = mock_server_class.MOCK_SERVER(file_data)
+  mock_server.run()
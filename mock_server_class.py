@@ -0,0 +1,649 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import json
+import time
+import uuid
+import math
+import pytz
+import random
+import logging
+import datetime
+import calendar
+import threading
+from pprint import pprint
+from flask import Flask, Response, request, jsonify, redirect, stream_with_context
+
+# Custom Modules
+#sys.path.append(os.path.expanduser('~') + "/lazytrader")
+sys.path.append(os.path.expanduser('~') + "/lazytrader-unreleased")
+
+#
+# Local mock of the Tradier, TradeStation and Finnhub endpoints the bot uses
+#
+# Every symbol follows its own random walk, quotes are the walk +/- half the
+# spread. Orders are kept in memory and filled by the fill_model:
+#   price   the buy fills once the ask reaches its limit, the sell once the bid does
+#   instant the buy fills right away, the sell still waits for the bid
+#   never   nothing fills, every buy waits to be cancelled
+# Every request waits latency (+ up to latency_jitter) seconds and fails with
+# error_status for an error_rate share of requests, except the /mock
+# counters. A buy that open buys and cash can not cover is rejected, like
+# the brokers do. Settings come from the optional "mock_broker" section of
+# user_config.json.
+#
+# Tradier lives under /v1, TradeStation under /v3 with its sign in under
+# /oauth and /authorize, and the Finnhub market status under /api/v1, so
+# one server can stand in for all of them (see the base_url settings).
+#
+class MOCK_SERVER:
+  # Variables
+  host = "127.0.0.1"
+  port = 5000
+  use_tz = pytz.timezone("America/New_York")
+
+  # Fault Variables
+  latency = 0
+  latency_jitter = 0
+  error_rate = 0
+  error_status = 503
+
+  # Market Variables
+  fill_model = "price"
+  fill_models = ["price", "instant", "never"]
+  start_price = 100
+  spread = 0.02
+  volatility = 0.01
+  cash = 100000
+  seed = 1
+  market_hours = ["09:30", "16:00"]
+
+  # Response Variables
+  page_size = 500
+  stream_interval = 1
+  heartbeat_interval = 5
+  token_expires_in = 1200
+
+  def __init__(self, file_data=None):
+    # Variables
+    settings = {}
+    if file_data:
+      settings = file_data.get("mock_broker", {})
+
+    # Set Variables
+    self.host = settings.get("host", self.host)
+    self.port = int(settings.get("port", self.port))
+    self.latency = float(settings.get("latency", self.latency))
+    self.latency_jitter = float(settings.get("latency_jitter", self.latency_jitter))
+    self.error_rate = float(settings.get("error_rate", self.error_rate))
+    self.error_status = int(settings.get("error_status", self.error_status))
+    self.fill_model = settings.get("fill_model", self.fill_model)
+    self.start_price = float(settings.get("start_price", self.start_price))
+    self.prices = dict((symbol.upper(), float(price)) for symbol, price in settings.get("prices", {}).items())
+    self.spread = float(settings.get("spread", self.spread))
+    self.volatility = float(settings.get("volatility", self.volatility))
+    self.cash = float(settings.get("cash", self.cash))
+    self.seed = settings.get("seed", self.seed)
+    self.market_hours = settings.get("market_hours", self.market_hours)
+    self.page_size = int(settings.get("page_size", self.page_size))
+    self.stream_interval = float(settings.get("stream_interval", self.stream_interval))
+    if self.fill_model not in self.fill_models:
+      raise ValueError("Unknown fill_model %s, use one of %s" % (self.fill_model, ", ".join(self.fill_models)))
+
+    # State Variables
+    self.random = random.Random(self.seed)
+    self.walks = {}
+    self.orders = []
+    self.order_ids = {}
+    self.next_id = 1000
+    self.counters = {"requests": 0, "errors": 0, "orders": 0, "fills": 0, "cancels": 0, "rejects": 0}
+    self.lock = threading.RLock()
+
+    self.app = Flask(__name__)
+    self.routes()
+
+  # Start serving, blocks until stopped
+  def run(self):
+    logging.info("Mock broker on http://%s:%s, fill model %s, latency %s, error rate %s" % (self.host, self.port, self.fill_model, self.latency, self.error_rate))
+    self.app.run(host=self.host, port=self.port, threaded=True)
+
+  def routes(self):
+    self.app.before_request(self.fault)
+
+    # Tradier
+    self.app.add_url_rule("/v1/markets/quotes", view_func=self.tradier_quotes)
+    self.app.add_url_rule("/v1/markets/calendar", view_func=self.tradier_calendar)
+    self.app.add_url_rule("/v1/markets/timesales", view_func=self.tradier_timesales)
+    self.app.add_url_rule("/v1/accounts/<account_id>/orders", view_func=self.tradier_orders, methods=["GET", "POST"])
+    self.app.add_url_rule("/v1/accounts/<account_id>/orders/<order_id>", view_func=self.tradier_cancel, methods=["DELETE"])
+    self.app.add_url_rule("/v1/accounts/<account_id>/positions", view_func=self.tradier_positions)
+    self.app.add_url_rule("/v1/accounts/<account_id>/balances", view_func=self.tradier_balances)
+    self.app.add_url_rule("/v1/accounts/<account_id>/gainloss", view_func=self.tradier_gainloss)
+
+    # TradeStation
+    self.app.add_url_rule("/authorize", view_func=self.ts_authorize)
+    self.app.add_url_rule("/oauth/token", view_func=self.ts_token, methods=["POST"])
+    self.app.add_url_rule("/oauth/revoke", view_func=self.ts_revoke, methods=["POST"])
+    self.app.add_url_rule("/v3/marketdata/quotes/<symbols>", view_func=self.ts_quotes)
+    self.app.add_url_rule("/v3/marketdata/stream/quotes/<symbols>", view_func=self.ts_stream)
+    self.app.add_url_rule("/v3/marketdata/barcharts/<symbol>", view_func=self.ts_barcharts)
+    self.app.add_url_rule("/v3/orderexecution/orders", view_func=self.ts_place, methods=["POST"])
+    self.app.add_url_rule("/v3/orderexecution/orders/<order_id>", view_func=self.ts_cancel, methods=["DELETE"])
+    self.app.add_url_rule("/v3/brokerage/accounts/<account_id>/orders", view_func=self.ts_orders)
+    self.app.add_url_rule("/v3/brokerage/accounts/<account_id>/historicalorders", view_func=self.ts_historical_orders)
+    self.app.add_url_rule("/v3/brokerage/accounts/<account_id>/positions", view_func=self.ts_positions)
+    self.app.add_url_rule("/v3/brokerage/accounts/<account_id>/balances", view_func=self.ts_balances)
+
+    # Finnhub
+    self.app.add_url_rule("/api/v1/stock/market-status", view_func=self.finhub_status)
+
+    # Counters for the load test
+    self.app.add_url_rule("/mock/stats", view_func=self.stats)
+
+  # Latency and error injection in front of every broker request
+  def fault(self):
+    if request.path.startswith("/mock/"):
+      return None
+    with self.lock:
+      self.counters["requests"] += 1
+      wait = self.latency + (self.random.uniform(0, self.latency_jitter) if self.latency_jitter else 0)
+      failed = self.error_rate and self.random.random() < self.error_rate
+      if failed:
+        self.counters["errors"] += 1
+    if wait > 0:
+      time.sleep(wait)
+    if failed:
+      return (jsonify({"error": "Mock broker injected error"}), self.error_status)
+    return None
+
+  def stats(self):
+    with self.lock:
+      data = dict(self.counters)
+      data["open_orders"] = len([each for each in self.orders if each["buy_status"] == "open" or each["sell_status"] == "open"])
+      data["cash"] = round(self.cash, 2)
+    return jsonify(data)
+
+  #
+  # Market Model
+  #
+
+  def now(self):
+    return datetime.datetime.now(pytz.utc).replace(tzinfo=None, microsecond=0)
+
+  # Market session of a date as naive UTC (start, end), None on weekends
+  def session(self, day):
+    if day.weekday() >= 5:
+      return None
+    start = self.use_tz.localize(datetime.datetime.strptime("%s %s" % (day, self.market_hours[0]), "%Y-%m-%d %H:%M"))
+    end = self.use_tz.localize(datetime.datetime.strptime("%s %s" % (day, self.market_hours[1]), "%Y-%m-%d %H:%M"))
+    return (start.astimezone(pytz.utc).replace(tzinfo=None), end.astimezone(pytz.utc).replace(tzinfo=None))
+
+  def is_open(self, cur_date=None):
+    cur_date = cur_date or self.now()
+    session = self.session(cur_date.replace(tzinfo=pytz.utc).astimezone(self.use_tz).date())
+    return bool(session) and session[0] <= cur_date <= session[1]
+
+  def first_price(self, symbol):
+    return self.prices.get(symbol, self.start_price)
+
+  # Current walk price of a symbol, moved along by the seconds since it was last asked
+  def price(self, symbol):
+    symbol = symbol.upper()
+    cur_time = time.time()
+    with self.lock:
+      try:
+        walk = self.walks[symbol]
+      except KeyError:
+        walk = [self.first_price(symbol), cur_time]
+        self.walks[symbol] = walk
+      elapsed = cur_time - walk[1]
+      if elapsed > 0:
+        walk[0] = max(0.01, walk[0] + self.random.gauss(0, self.volatility * math.sqrt(elapsed)))
+        walk[1] = cur_time
+      return walk[0]
+
+  # (bid, ask, last) after filling whatever the new price reaches
+  def quote(self, symbol):
+    last = self.price(symbol)
+    bid = round(max(0.01, last - (self.spread / 2)), 2)
+    ask = round(last + (self.spread / 2), 2)
+    self.fill(symbol.upper(), bid, ask)
+    return (bid, ask, round(last, 2))
+
+  # Fill the open orders of a symbol against a quote
+  def fill(self, symbol, bid, ask):
+    cur_date = self.now()
+    with self.lock:
+      for order in self.orders:
+        if order["symbol"] != symbol:
+          continue
+        if order["buy_status"] == "open" and self.fill_model != "never":
+          if self.fill_model == "instant" or ask <= order["buy_price"]:
+            order["buy_status"] = "filled"
+            order["buy_time"] = cur_date
+            order["sell_status"] = "open"
+            self.cash -= order["buy_price"] * order["qty"]
+            self.counters["fills"] += 1
+        if order["sell_status"] == "open" and order["buy_time"] != cur_date and bid >= order["sell_price"]:
+          order["sell_status"] = "filled"
+          order["sell_time"] = cur_date
+          self.cash += order["sell_price"] * order["qty"]
+          self.counters["fills"] += 1
+
+  # One minute bars of a day, the same bars every time for the same seed
+  def day_bars(self, symbol, day):
+    session = self.session(day)
+    if not session:
+      return []
+    rng = random.Random("%s|%s|%s" % (self.seed, symbol, day))
+    price = self.first_price(symbol) * (1 + rng.uniform(-0.05, 0.05))
+    data = []
+    cur_date = session[0]
+    while cur_date < session[1]:
+      open_price = price
+      high = low = price
+      for tick in range(4):
+        price = max(0.01, price + rng.gauss(0, self.volatility * 4))
+        high = max(high, price)
+        low = min(low, price)
+      data.append((cur_date, round(open_price, 2), round(high, 2), round(low, 2), round(price, 2), rng.randint(100, 10000)))
+      cur_date += datetime.timedelta(minutes=1)
+    return data
+
+  def bars(self, symbol, start_date, end_date):
+    data = []
+    day = start_date.date()
+    while day <= end_date.date():
+      for each in self.day_bars(symbol.upper(), day):
+        if start_date <= each[0] <= end_date:
+          data.append(each)
+      day += datetime.timedelta(days=1)
+    return data
+
+  # Parse "2021-01-05", "2021-01-05 09:30" or "2021-01-05T09:30:00Z"
+  def parse_date(self, value, default=None):
+    if not value:
+      return default
+    value = value.strip().replace("T", " ").rstrip("Z")
+    for use_format in ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d", "%m-%d-%Y"]:
+      try:
+        return datetime.datetime.strptime(value, use_format)
+      except ValueError:
+        continue
+    return default
+
+  #
+  # Orders
+  #
+
+  # Add an order, None when the cash left after the open buys can not pay for it
+  def add_order(self, symbol, qty, buy_price, sell_price):
+    with self.lock:
+      cost = round(float(buy_price), 2) * int(float(qty))
+      reserved = sum(each["buy_price"] * each["qty"] for each in self.orders if each["buy_status"] == "open")
+      if cost > self.cash - reserved:
+        self.counters["rejects"] += 1
+        return None
+      order = {
+        "id": self.next_id,
+        "sell_id": self.next_id + 1,
+        "symbol": symbol.upper(),
+        "qty": int(float(qty)),
+        "buy_price": round(float(buy_price), 2),
+        "sell_price": round(float(sell_price), 2),
+        "buy_status": "open",
+        "sell_status": "pending",
+        "create_time": self.now(),
+        "buy_time": None,
+        "sell_time": None,
+        "cancel_time": None
+      }
+      self.next_id += 2
+      self.orders.append(order)
+      self.order_ids[order["id"]] = order
+      self.order_ids[order["sell_id"]] = order
+      self.counters["orders"] += 1
+    self.quote(order["symbol"])
+    return order
+
+  # Cancel the open leg of an order, None when there is nothing to cancel
+  def cancel_order(self, order_id):
+    with self.lock:
+      try:
+        order = self.order_ids[int(order_id)]
+      except (KeyError, ValueError):
+        return None
+      if order["buy_status"] == "open":
+        order["buy_status"] = "canceled"
+        order["sell_status"] = "canceled"
+      elif order["sell_status"] == "open" and int(order_id) == order["sell_id"]:
+        order["sell_status"] = "canceled"
+      else:
+        return None
+      order["cancel_time"] = self.now()
+      self.counters["cancels"] += 1
+    return order
+
+  # Move every symbol with open orders along before answering about them
+  def refresh(self):
+    with self.lock:
+      symbols = set(each["symbol"] for each in self.orders if each["buy_status"] == "open" or each["sell_status"] == "open")
+    for symbol in symbols:
+      self.quote(symbol)
+
+  # Filled buys not sold yet grouped by symbol, {symbol: [orders]}
+  def open_positions(self):
+    data = {}
+    with self.lock:
+      for order in self.orders:
+        if order["buy_status"] == "filled" and order["sell_status"] != "filled":
+          data.setdefault(order["symbol"], []).append(order)
+    return data
+
+  def closed_orders(self):
+    with self.lock:
+      return [each for each in self.orders if each["sell_status"] == "filled"]
+
+  def page(self, data):
+    token = request.args.get("nextToken")
+    start = int(token) if token and token.isdigit() else 0
+    next_token = None
+    if start + self.page_size < len(data):
+      next_token = str(start + self.page_size)
+    return (data[start:start + self.page_size], next_token)
+
+  #
+  # Tradier
+  #
+
+  def tradier_time(self, cur_date):
+    return cur_date.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+  def tradier_quotes(self):
+    data = []
+    for symbol in request.values.get("symbols", "").split(","):
+      if not symbol:
+        continue
+      bid, ask, last = self.quote(symbol)
+      data.append({"symbol": symbol.upper(), "description": symbol.upper(), "type": "stock", "bid": bid, "ask": ask, "last": last, "close": last, "prevclose": round(self.first_price(symbol.upper()), 2), "volume": 0})
+    if not data:
+      return jsonify({"quotes": {"unmatched_symbols": {"symbol": ""}}})
+    return jsonify({"quotes": {"quote": data if len(data) > 1 else data[0]}})
+
+  def tradier_calendar(self):
+    cur_date = self.now()
+    year = int(request.args.get("year", cur_date.year))
+    month = int(request.args.get("month", cur_date.month))
+    days = []
+    for day in range(1, calendar.monthrange(year, month)[1] + 1):
+      use_day = datetime.date(year, month, day)
+      if self.session(use_day):
+        days.append({"date": use_day.strftime("%Y-%m-%d"), "status": "open", "open": {"start": self.market_hours[0], "end": self.market_hours[1]}})
+      else:
+        days.append({"date": use_day.strftime("%Y-%m-%d"), "status": "closed"})
+    return jsonify({"calendar": {"month": month, "year": year, "days": {"day": days}}})
+
+  def tradier_timesales(self):
+    # Tradier takes the range in Eastern time
+    start_date = self.use_tz.localize(self.parse_date(request.args.get("start"), datetime.datetime(1970, 1, 2))).astimezone(pytz.utc).replace(tzinfo=None)
+    end_date = self.use_tz.localize(self.parse_date(request.args.get("end"), self.now())).astimezone(pytz.utc).replace(tzinfo=None)
+    data = []
+    for bar_time, open_price, high, low, close, volume in self.bars(request.args.get("symbol", ""), start_date, end_date):
+      data.append({
+        "time": bar_time.replace(tzinfo=pytz.utc).astimezone(self.use_tz).strftime("%Y-%m-%dT%H:%M:%S"),
+        "timestamp": calendar.timegm(bar_time.timetuple()),
+        "price": close, "open": open_price, "high": high, "low": low, "close": close, "volume": volume, "vwap": close
+      })
+    if not data:
+      return jsonify({"series": None})
+    return jsonify({"series": {"data": data if len(data) > 1 else data[0]}})
+
+  def tradier_order(self, order):
+    legs = []
+    for side, status, price, leg_time in [("buy", order["buy_status"], order["buy_price"], order["buy_time"]), ("sell", order["sell_status"], order["sell_price"], order["sell_time"])]:
+      legs.append({
+        "type": "limit", "symbol": order["symbol"], "side": side, "quantity": float(order["qty"]),
+        "status": status, "duration": "day" if side == "buy" else "gtc", "price": price,
+        "create_date": self.tradier_time(order["create_time"]),
+        "transaction_date": self.tradier_time(leg_time or order["cancel_time"] or order["create_time"])
+      })
+    return {"id": order["id"], "class": "oto", "status": order["buy_status"], "create_date": self.tradier_time(order["create_time"]), "leg": legs}
+
+  def tradier_orders(self, account_id):
+    if request.method == "POST":
+      form = request.form
+      if form.get("class") != "oto":
+        return (jsonify({"errors": {"error": "Only oto orders are mocked"}}), 400)
+      order = self.add_order(form["symbol[0]"], form["quantity[0]"], form["price[0]"], form["price[1]"])
+      if not order:
+        return (jsonify({"errors": {"error": "Backoffice rejected override of the order. The account does not have enough buying power."}}), 400)
+      return jsonify({"order": {"id": order["id"], "status": "ok"}})
+
+    self.refresh()
+    with self.lock:
+      data = [self.tradier_order(each) for each in self.orders]
+    if not data:
+      return jsonify({"orders": "null"})
+    return jsonify({"orders": {"order": data if len(data) > 1 else data[0]}})
+
+  def tradier_cancel(self, account_id, order_id):
+    order = self.cancel_order(order_id)
+    if not order:
+      return (jsonify({"errors": {"error": "Order %s can not be cancelled" % order_id}}), 400)
+    return jsonify({"order": {"id": order["id"], "status": "ok"}})
+
+  def tradier_positions(self, account_id):
+    self.refresh()
+    data = []
+    for symbol, orders in self.open_positions().items():
+      data.append({
+        "symbol": symbol,
+        "quantity": float(sum(each["qty"] for each in orders)),
+        "cost_basis": round(sum(each["buy_price"] * each["qty"] for each in orders), 2),
+        "date_acquired": self.tradier_time(min(each["buy_time"] for each in orders)),
+        "id": orders[0]["id"]
+      })
+    if not data:
+      return jsonify({"positions": "null"})
+    return jsonify({"positions": {"position": data if len(data) > 1 else data[0]}})
+
+  def tradier_balances(self, account_id):
+    self.refresh()
+    market_value = sum(self.price(symbol) * sum(each["qty"] for each in orders) for symbol, orders in self.open_positions().items())
+    with self.lock:
+      cash = round(self.cash, 2)
+    return jsonify({"balances": {"account_number": account_id, "account_type": "cash", "total_cash": cash, "market_value": round(market_value, 2), "total_equity": round(cash + market_value, 2), "cash": {"cash_available": cash, "unsettled_funds": 0}}})
+
+  def tradier_gainloss(self, account_id):
+    start_date = self.parse_date(request.args.get("start"), datetime.datetime(1970, 1, 2))
+    limit = int(request.args.get("limit", 100))
+    page = int(request.args.get("page", 1))
+    closed = sorted([each for each in self.closed_orders() if each["sell_time"] >= start_date], key=lambda each: each["sell_time"], reverse=True)
+    data = []
+    for order in closed[(page - 1) * limit:page * limit]:
+      cost = round(order["buy_price"] * order["qty"], 2)
+      proceeds = round(order["sell_price"] * order["qty"], 2)
+      data.append({
+        "symbol": order["symbol"], "quantity": float(order["qty"]), "cost": cost, "proceeds": proceeds,
+        "gain_loss": round(proceeds - cost, 2), "gain_loss_percent": round((proceeds - cost) / cost * 100, 2),
+        "open_date": self.tradier_time(order["buy_time"]), "close_date": self.tradier_time(order["sell_time"]),
+        "term": int((order["sell_time"] - order["buy_time"]).days)
+      })
+    if not data:
+      return jsonify({"gainloss": "null"})
+    return jsonify({"gainloss": {"closed_position": data if len(data) > 1 else data[0]}})
+
+  #
+  # TradeStation
+  #
+
+  def ts_time(self, cur_date):
+    return cur_date.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+  # The sign in redirects back with a code, like the real one
+  def ts_authorize(self):
+    return redirect("%s?code=%s&state=%s" % (request.args.get("redirect_uri", "http://localhost"), uuid.uuid4().hex, request.args.get("state", "")))
+
+  def ts_token(self):
+    if request.form.get("grant_type") not in ["authorization_code", "refresh_token"]:
+      return (jsonify({"error": "unsupported_grant_type"}), 400)
+    return jsonify({"access_token": uuid.uuid4().hex, "refresh_token": uuid.uuid4().hex, "id_token": "", "token_type": "Bearer", "scope": "openid offline_access MarketData ReadAccount Trade", "expires_in": self.token_expires_in})
+
+  def ts_revoke(self):
+    return jsonify({})
+
+  def ts_quote(self, symbol):
+    bid, ask, last = self.quote(symbol)
+    return {"Symbol": symbol.upper(), "Bid": "%s" % bid, "Ask": "%s" % ask, "Last": "%s" % last, "Close": "%s" % last, "PreviousClose": "%s" % round(self.first_price(symbol.upper()), 2), "TradeTime": self.ts_time(self.now())}
+
+  def ts_quotes(self, symbols):
+    return jsonify({"Quotes": [self.ts_quote(symbol) for symbol in symbols.split(",") if symbol], "Errors": []})
+
+  # A quote line per symbol every stream_interval seconds, heartbeats in between
+  def ts_stream(self, symbols):
+    symbols = [symbol for symbol in symbols.split(",") if symbol]
+
+    def generate():
+      heartbeat = 0
+      last_heartbeat = time.monotonic()
+      while True:
+        for symbol in symbols:
+          yield json.dumps(self.ts_quote(symbol)) + "\n"
+        if time.monotonic() - last_heartbeat >= self.heartbeat_interval:
+          heartbeat += 1
+          last_heartbeat = time.monotonic()
+          yield json.dumps({"Heartbeat": heartbeat, "Timestamp": self.ts_time(self.now())}) + "\n"
+        time.sleep(self.stream_interval)
+
+    return Response(stream_with_context(generate()), mimetype="application/vnd.tradestation.streams.v2+json")
+
+  def ts_barcharts(self, symbol):
+    start_date = self.parse_date(request.args.get("firstdate"), datetime.datetime(1970, 1, 2))
+    end_date = self.parse_date(request.args.get("lastdate"), self.now())
+    data = []
+    for bar_time, open_price, high, low, close, volume in self.bars(symbol, start_date, end_date):
+      data.append({"TimeStamp": self.ts_time(bar_time), "Open": "%s" % open_price, "High": "%s" % high, "Low": "%s" % low, "Close": "%s" % close, "TotalVolume": "%s" % volume})
+    return jsonify({"Bars": data})
+
+  def ts_place(self):
+    payload = request.get_json(force=True, silent=True) or {}
+    try:
+      sell = payload["OSOs"][0]["Orders"][0]
+      order = self.add_order(payload["Symbol"], payload["Quantity"], payload["LimitPrice"], sell["LimitPrice"])
+    except (KeyError, IndexError, TypeError, ValueError):
+      return (jsonify({"Error": "BadRequest", "Message": "Only a limit buy with one OSO limit sell is mocked"}), 400)
+    if not order:
+      return (jsonify({"Error": "FAILED", "Message": "Insufficient buying power"}), 400)
+    return jsonify({"Orders": [{"Message": "Sent order: Buy %s %s @ %s Limit" % (order["qty"], order["symbol"], order["buy_price"]), "OrderID": "%s" % order["id"]}]})
+
+  def ts_cancel(self, order_id):
+    order = self.cancel_order(order_id)
+    if not order:
+      return (jsonify({"Error": "FAILED", "Message": "Order %s can not be cancelled" % order_id}), 400)
+    return jsonify({"OrderID": order_id, "Message": "Cancel request sent"})
+
+  def ts_status(self, status):
+    return {"open": ("OPN", "Received"), "filled": ("FLL", "Filled"), "canceled": ("CAN", "Canceled")}[status]
+
+  # The buy order plus its sell order once the sell is live
+  def ts_order(self, order):
+    data = []
+    for side in ["buy", "sell"]:
+      status = order["%s_status" % side]
+      if status == "pending" or (side == "sell" and order["buy_status"] != "filled"):
+        continue
+      fill_time = order["%s_time" % side]
+      price = order["%s_price" % side]
+      each = {
+        "AccountID": request.view_args.get("account_id", ""),
+        "OrderID": "%s" % (order["id"] if side == "buy" else order["sell_id"]),
+        "Status": self.ts_status(status)[0],
+        "StatusDescription": self.ts_status(status)[1],
+        "OrderType": "Limit",
+        "LimitPrice": "%s" % price,
+        "Duration": "DAY" if side == "buy" else "GTC",
+        "OpenedDateTime": self.ts_time(order["create_time"] if side == "buy" else order["buy_time"]),
+        "CommissionFee": "0",
+        "UnbundledRouteFee": "0",
+        "Legs": [{
+          "Symbol": order["symbol"],
+          "BuyOrSell": side.capitalize(),
+          "QuantityOrdered": "%s" % order["qty"],
+          "ExecQuantity": "%s" % (order["qty"] if fill_time else 0),
+          "ExecutionPrice": "%s" % price if fill_time else None
+        }]
+      }
+      if fill_time or order["cancel_time"]:
+        each["ClosedDateTime"] = self.ts_time(fill_time or order["cancel_time"])
+      if side == "sell":
+        each["ConditionalOrders"] = [{"OrderID": "%s" % order["id"], "Relationship": "OSP"}]
+      data.append(each)
+    return data
+
+  def ts_order_page(self, orders):
+    data = []
+    for order in orders:
+      data.extend(self.ts_order(order))
+    data, next_token = self.page(data)
+    results = {"Orders": data, "Errors": []}
+    if next_token:
+      results["NextToken"] = next_token
+    return jsonify(results)
+
+  # Today's orders (Eastern time)
+  def ts_orders(self, account_id):
+    self.refresh()
+    session_start = self.use_tz.localize(datetime.datetime.combine(datetime.datetime.now(self.use_tz).date(), datetime.time())).astimezone(pytz.utc).replace(tzinfo=None)
+    with self.lock:
+      orders = [each for each in self.orders if each["create_time"] >= session_start]
+    return self.ts_order_page(orders)
+
+  # Orders since a date, before today
+  def ts_historical_orders(self, account_id):
+    self.refresh()
+    since = self.parse_date(request.args.get("since"), datetime.datetime(1970, 1, 2))
+    session_start = self.use_tz.localize(datetime.datetime.combine(datetime.datetime.now(self.use_tz).date(), datetime.time())).astimezone(pytz.utc).replace(tzinfo=None)
+    with self.lock:
+      orders = [each for each in self.orders if since <= each["create_time"] < session_start]
+    return self.ts_order_page(orders)
+
+  def ts_positions(self, account_id):
+    self.refresh()
+    data = []
+    for symbol, orders in self.open_positions().items():
+      bid, ask, last = self.quote(symbol)
+      qty = sum(each["qty"] for each in orders)
+      cost = sum(each["buy_price"] * each["qty"] for each in orders)
+      data.append({
+        "AccountID": account_id, "Symbol": symbol, "Quantity": "%s" % qty, "LongShort": "Long",
+        "AveragePrice": "%s" % round(cost / qty, 2), "Bid": "%s" % bid, "Ask": "%s" % ask, "Last": "%s" % last,
+        "MarketValue": "%s" % round(last * qty, 2), "TotalCost": "%s" % round(cost, 2),
+        "UnrealizedProfitLoss": "%s" % round((last * qty) - cost, 2),
+        "Timestamp": self.ts_time(min(each["buy_time"] for each in orders))
+      })
+    return jsonify({"Positions": data, "Errors": []})
+
+  def ts_balances(self, account_id):
+    self.refresh()
+    market_value = sum(self.price(symbol) * sum(each["qty"] for each in orders) for symbol, orders in self.open_positions().items())
+    with self.lock:
+      cash = round(self.cash, 2)
+    return jsonify({"Balances": [{"AccountID": account_id, "AccountType": "Cash", "CashBalance": "%s" % cash, "BuyingPower": "%s" % cash, "MarketValue": "%s" % round(market_value, 2), "Equity": "%s" % round(cash + market_value, 2)}], "Errors": []})
+
+  #
+  # Finnhub
+  #
+
+  def finhub_status(self):
+    is_open = self.is_open()
+    return jsonify({"exchange": request.args.get("exchange", "US"), "holiday": None, "isOpen": is_open, "session": "regular" if is_open else None, "timezone": "America/New_York", "t": int(time.time())})
+
+if __name__ == "__main__":
+  # Enable logging
+  logging.basicConfig(level=logging.DEBUG)
+
+  # Initalize Class
+  mock_server = MOCK_SERVER({"mock_broker": {"fill_model": "instant", "latency": 0.05}})
+  mock_server.run()
@@ -0,0 +1,83 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import numpy
+from pprint import pprint
+
+# Custom Modules
+#sys.path.append(os.path.expanduser('~') + "/lazytrader")
+sys.path.append(os.path.expanduser('~') + "/lazytrader-unreleased")
+
+#
+# Histogram of the |close - open| gap of price bars
+#
+# Gaps are binned as whole cents with one numpy.bincount over every bar, no
+# Python loop per bar. Only the per cent counts are kept, every result is
+# worked out from them.
+#
+class PRICE_GAP:
+  # Variables
+  percentile_list = [50, 75, 90, 95, 99]
+
+  def __init__(self, open_prices, close_prices):
+    open_prices = numpy.asarray(open_prices, dtype=numpy.float64)
+    close_prices = numpy.asarray(close_prices, dtype=numpy.float64)
+
+    # Gap per bar in cents and the number of bars per cent
+    cents = numpy.rint(numpy.abs(close_prices - open_prices) * 100).astype(numpy.int64)
+    self.counts = numpy.bincount(cents, minlength=1)
+    self.total = int(cents.size)
+
+  # Number of bars for every cent from 0 to the largest gap
+  def cent_bins(self):
+    return self.counts
+
+  # Original output, {price gap: transaction count} for every gap seen
+  def to_dict(self):
+    data = {}
+    for cent in numpy.flatnonzero(self.counts):
+      data[round(int(cent) / 100, 2)] = int(self.counts[cent])
+    return data
+
+  # {percentile: price gap}
+  def percentiles(self, percentile_list=None):
+    data = {}
+    if not percentile_list:
+      percentile_list = self.percentile_list
+    if self.total == 0:
+      return data
+
+    # Same as numpy.percentile(method="lower") over the sorted gaps
+    positions = numpy.floor(numpy.asarray(percentile_list, dtype=numpy.float64) / 100 * (self.total - 1)).astype(numpy.int64)
+    values = numpy.searchsorted(numpy.cumsum(self.counts), positions, side="right")
+    for percentile, value in zip(percentile_list, values):
+      data[percentile] = round(float(value) / 100, 2)
+    return data
+
+  # {price gap: share of bars with a gap at or below it}
+  def cdf(self):
+    data = {}
+    if self.total == 0:
+      return data
+
+    cumulative = numpy.cumsum(self.counts) / self.total
+    for cent in numpy.flatnonzero(self.counts):
+      data[round(int(cent) / 100, 2)] = round(float(cumulative[cent]), 4)
+    return data
+
+  def summary(self):
+    data = {"bars": self.total}
+    if self.total == 0:
+      return data
+    data["mean_gap"] = round(float(numpy.dot(numpy.arange(self.counts.size), self.counts)) / self.total / 100, 4)
+    data["max_gap"] = round(int(numpy.flatnonzero(self.counts)[-1]) / 100, 2)
+    data["percentiles"] = self.percentiles()
+    return data
+
+if __name__ == "__main__":
+  gap = PRICE_GAP([10.00, 10.02, 10.05, 10.01], [10.01, 10.02, 10.00, 10.02])
+  pprint(gap.to_dict())
+  pprint(gap.cdf())
+  pprint(gap.summary())
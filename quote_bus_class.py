@@ -0,0 +1,329 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import mmap
+import math
+import time
+import struct
+import logging
+import threading
+from pprint import pprint
+
+# Custom Modules
+#sys.path.append(os.path.expanduser('~') + "/lazytrader")
+sys.path.append(os.path.expanduser('~') + "/lazytrader-unreleased")
+
+#
+# Memory mapped quote table shared between the stream (writer) and the trader (reader)
+#
+# File Layout:
+#   Header (64 bytes): magic, version, capacity, symbol count, generation, heartbeat
+#   Slots (64 bytes each): sequence, symbol, bid, ask, last, updated
+#
+# Every slot has its own sequence counter (seqlock). The writer makes the
+# sequence odd, writes the values, then makes it even again. A reader only
+# accepts a slot when the sequence is even and unchanged across the read,
+# so a read never returns a half written quote and never takes a lock.
+#
+# The writer stamps the header heartbeat while the stream is alive. A quote
+# is only served while its own update or the heartbeat is younger than
+# max_age, so a dead stream does not look fresh. When the writer recreates
+# the file (a new inode) the reader maps the new one.
+#
+# Symbols are uppercased on the way in and out, so callers may use the
+# config spelling of a symbol.
+#
+class QUOTE_BUS:
+  # Variables
+  filename = None
+  writer = False
+  capacity = 1024
+  magic = b"LTQB"
+  version = 2
+  max_read_retry = 1000
+  max_symbol = 16
+  max_age = 120
+  remap_interval = 1
+  keywords = ["Bid", "Ask", "Last"]
+
+  # Layout Variables
+  header = struct.Struct("<4sIIIQ")
+  header_size = 64
+  count_offset = 12
+  generation_offset = 16
+  heartbeat_offset = 24
+  slot = struct.Struct("<Q16sdddd")
+  slot_size = 64
+  seq = struct.Struct("<Q")
+  values = struct.Struct("<ddd")
+  stamp = struct.Struct("<d")
+  count = struct.Struct("<I")
+
+  def __init__(self, filename, writer=False, capacity=None, max_age=None):
+    self.filename = filename
+    self.writer = writer
+    if capacity:
+      self.capacity = int(capacity)
+    if max_age is not None:
+      self.max_age = max_age
+
+    # Map Variables
+    self.handle = None
+    self.mm = None
+    self.index = {}
+    self.inode = None
+    self.next_check = 0
+    self.lock = threading.Lock()
+
+  # Open (and for the writer create) the memory mapped file
+  def open(self):
+    if self.mm is not None:
+      return True
+
+    if self.writer:
+      self.open_writer()
+      return True
+
+    try:
+      self.handle = open(self.filename, "rb")
+    except FileNotFoundError:
+      logging.debug("Quote bus %s does not exist yet" % self.filename)
+      return False
+
+    try:
+      self.mm = mmap.mmap(self.handle.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+      logging.debug("Quote bus %s is empty" % self.filename)
+      self.close()
+      return False
+
+    if not self.valid_header():
+      logging.error("Quote bus %s has an unknown layout" % self.filename)
+      self.close()
+      return False
+    self.capacity = self.header.unpack_from(self.mm, 0)[2]
+    self.inode = os.fstat(self.handle.fileno()).st_ino
+    return True
+
+  # Reader side, the writer replaced the file since it was mapped
+  def replaced(self):
+    if self.writer or self.mm is None:
+      return False
+    cur_time = time.monotonic()
+    if cur_time < self.next_check:
+      return False
+    self.next_check = cur_time + self.remap_interval
+    try:
+      return os.stat(self.filename).st_ino != self.inode
+    except FileNotFoundError:
+      return False
+
+  # Map the new file when the writer replaced it
+  def remap(self):
+    if self.replaced():
+      logging.info("Quote bus %s was recreated, mapping the new file" % self.filename)
+      self.close()
+      self.open()
+
+  # Create the file if it is missing, otherwise reuse the existing slots
+  def open_writer(self):
+    size = self.header_size + (self.capacity * self.slot_size)
+    reuse = False
+    if os.path.exists(self.filename) and os.path.getsize(self.filename) == size:
+      self.handle = open(self.filename, "r+b")
+      self.mm = mmap.mmap(self.handle.fileno(), size)
+      reuse = self.valid_header() and self.header.unpack_from(self.mm, 0)[2] == self.capacity
+      if not reuse:
+        self.close()
+
+    if not reuse:
+      logging.info("Creating quote bus %s with %s slots" % (self.filename, self.capacity))
+      temp_file = "%s.tmp" % self.filename
+      with open(temp_file, "wb") as h:
+        h.truncate(size)
+        h.seek(0)
+        h.write(self.header.pack(self.magic, self.version, self.capacity, 0, 0))
+      os.replace(temp_file, self.filename)
+      self.handle = open(self.filename, "r+b")
+      self.mm = mmap.mmap(self.handle.fileno(), size)
+
+    self.index = {}
+    self.scan()
+
+  def valid_header(self):
+    magic, version, capacity, count, generation = self.header.unpack_from(self.mm, 0)
+    return magic == self.magic and version == self.version
+
+  def close(self):
+    if self.mm is not None:
+      self.mm.close()
+      self.mm = None
+    if self.handle is not None:
+      self.handle.close()
+      self.handle = None
+    self.index = {}
+
+  # Pick up symbols added since the last scan
+  def scan(self):
+    count = self.count.unpack_from(self.mm, self.count_offset)[0]
+    for slot_id in range(len(self.index), count):
+      offset = self.header_size + (slot_id * self.slot_size) + self.seq.size
+      symbol = self.mm[offset:offset + 16].rstrip(b"\x00").decode("ascii")
+      self.index[symbol] = slot_id
+
+  # Find the slot for a symbol, O(1) once the symbol has been seen
+  def slot_id(self, symbol):
+    self.remap()
+    try:
+      return self.index[symbol]
+    except KeyError:
+      pass
+    if not self.open():
+      return None
+    self.scan()
+    return self.index.get(symbol)
+
+  # Reserve a slot for a symbol (writer only)
+  def register(self, symbol):
+    symbol = symbol.upper()
+    self.open()
+    with self.lock:
+      slot_id = self.slot_id(symbol)
+      if slot_id is not None:
+        return slot_id
+
+      raw_symbol = symbol.encode("ascii")
+      if len(raw_symbol) > self.max_symbol:
+        # Cut to 16 bytes it could share a slot with another symbol
+        logging.error("Symbol %s is longer than %s bytes, not adding it to the quote bus" % (symbol, self.max_symbol))
+        return None
+
+      slot_id = len(self.index)
+      if slot_id >= self.capacity:
+        logging.error("Quote bus is full, unable to add %s" % symbol)
+        return None
+
+      nan = float("nan")
+      offset = self.header_size + (slot_id * self.slot_size)
+      self.slot.pack_into(self.mm, offset, 0, raw_symbol, nan, nan, nan, 0.0)
+      self.count.pack_into(self.mm, self.count_offset, slot_id + 1)
+      self.index[symbol] = slot_id
+      return slot_id
+
+  # Write the Bid/Ask/Last values found in a quote into the symbol slot
+  def update(self, symbol, quote):
+    nan = float("nan")
+    new_values = [nan, nan, nan]
+    for position, key in enumerate(self.keywords):
+      try:
+        new_values[position] = float(quote[key])
+      except (KeyError, TypeError, ValueError):
+        pass
+    return self.write(symbol, new_values[0], new_values[1], new_values[2])
+
+  # Write bid, ask and last into the symbol slot, a NaN keeps the current value
+  def write(self, symbol, bid, ask, last):
+    symbol = symbol.upper()
+    slot_id = self.register(symbol)
+    if slot_id is None:
+      return False
+
+    offset = self.header_size + (slot_id * self.slot_size)
+    cur_seq, cur_symbol, cur_bid, cur_ask, cur_last, updated = self.slot.unpack_from(self.mm, offset)
+    if bid != bid:
+      bid = cur_bid
+    if ask != ask:
+      ask = cur_ask
+    if last != last:
+      last = cur_last
+
+    # Odd sequence marks the slot as being written
+    self.seq.pack_into(self.mm, offset, cur_seq + 1)
+    self.values.pack_into(self.mm, offset + 24, bid, ask, last)
+    self.stamp.pack_into(self.mm, offset + 48, time.time())
+    self.seq.pack_into(self.mm, offset, cur_seq + 2)
+
+    with self.lock:
+      generation = self.seq.unpack_from(self.mm, self.generation_offset)[0]
+      self.seq.pack_into(self.mm, self.generation_offset, generation + 1)
+    return True
+
+  # Writer side, the stream is alive even when no quote changed
+  def touch(self):
+    if self.mm is not None:
+      self.stamp.pack_into(self.mm, self.heartbeat_offset, time.time())
+
+  # Last time the writer said it was alive
+  def heartbeat(self):
+    if not self.open():
+      return 0
+    return self.stamp.unpack_from(self.mm, self.heartbeat_offset)[0]
+
+  # Read a consistent (bid, ask, last, updated) tuple for a symbol
+  def read(self, symbol):
+    symbol = symbol.upper()
+    slot_id = self.slot_id(symbol)
+    if slot_id is None:
+      return None
+
+    offset = self.header_size + (slot_id * self.slot_size)
+    for count in range(self.max_read_retry):
+      cur_seq, cur_symbol, bid, ask, last, updated = self.slot.unpack_from(self.mm, offset)
+      if cur_seq & 1:
+        continue
+      if self.seq.unpack_from(self.mm, offset)[0] == cur_seq:
+        if cur_seq == 0:
+          return None
+        if self.max_age and time.time() - max(updated, self.heartbeat()) > self.max_age:
+          logging.debug("Quote for %s is older than %s seconds" % (symbol, self.max_age))
+          return None
+        return (bid, ask, last, updated)
+    logging.error("Unable to get a stable quote for %s" % symbol)
+    return None
+
+  # Total number of updates written, lets a reader cheaply detect changes
+  def generation(self):
+    self.remap()
+    if not self.open():
+      return 0
+    return self.seq.unpack_from(self.mm, self.generation_offset)[0]
+
+  def symbols(self):
+    if self.open():
+      self.scan()
+    return list(self.index.keys())
+
+  # Dictionary style access: quote[symbol]["Bid"]
+  def __getitem__(self, symbol):
+    values = self.read(symbol)
+    if values is None:
+      raise KeyError(symbol)
+
+    data = {}
+    for position, key in enumerate(self.keywords):
+      if not math.isnan(values[position]):
+        data[key] = values[position]
+    return data
+
+  def __contains__(self, symbol):
+    return self.read(symbol) is not None
+
+  def keys(self):
+    return [symbol for symbol in self.symbols() if symbol in self]
+
+  def items(self):
+    return [(symbol, self[symbol]) for symbol in self.keys()]
+
+if __name__ == "__main__":
+  # Variables
+  log_level = logging.DEBUG
+  filename = os.path.expanduser('~') + "/lazytrader-unreleased/tradestation_quote_bus"
+
+  # Enable logging
+  logging.basicConfig(level=log_level)
+
+  # Display what the stream has written
+  quote_bus = QUOTE_BUS(filename)
+  pprint(dict(quote_bus.items()))
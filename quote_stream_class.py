@@ -0,0 +1,278 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import re
+import json
+import time
+import logging
+import requests
+import threading
+from pprint import pprint
+
+# Custom Modules
+#sys.path.append(os.path.expanduser('~') + "/lazytrader")
+sys.path.append(os.path.expanduser('~') + "/lazytrader-unreleased")
+
+#
+# TradeStation quote stream split over several connections
+#
+# The symbols are cut into shards of shard_size, each streamed by its own
+# thread and connection into the QUOTE_BUS. A shard that hears nothing
+# (quotes or heartbeats) for heartbeat_timeout seconds is closed by the
+# watchdog and reconnects on its own with jittered backoff, the other
+# shards keep streaming. A shard thread that died anyway is started again
+# by the watchdog. Settings come from the optional "stream" section
+# of user_config.json.
+#
+# Quote lines are not run through json.loads, the symbol and the Bid/Ask/
+# Last values are pulled straight out of the bytes into a table made up
+# front. Only changed symbols are written to the QUOTE_BUS, right away or
+# every flush_interval seconds when that is set. Changed quotes wait in a
+# pending dictionary the flusher swaps out under a lock, so a quote is
+# never lost or written half updated. The reported lag is the longest time
+# from receiving a quote to writing it to the QUOTE_BUS.
+#
+class QUOTE_STREAM:
+  # Variables
+  stream_path = "/marketdata/stream/quotes"
+  shard_size = 50
+  heartbeat_timeout = 30
+  report_interval = 60
+  stable_after = 60
+  flush_interval = 0
+
+  # Decode Variables
+  symbol_re = re.compile(rb'"Symbol":\s*"([^"]+)"')
+  value_re = re.compile(rb'"(Bid|Ask|Last)":\s*"?(-?[0-9.]+(?:[eE][-+]?[0-9]+)?)')
+  positions = {b"Bid": 0, b"Ask": 1, b"Last": 2}
+
+  def __init__(self, broker, quote_bus, symbols, file_data=None):
+    # Variables
+    settings = {}
+    if file_data:
+      settings = file_data.get("stream", {})
+
+    # Set Variables
+    self.broker = broker
+    self.quote_bus = quote_bus
+    self.shard_size = int(settings.get("shard_size", self.shard_size))
+    self.heartbeat_timeout = float(settings.get("heartbeat_timeout", self.heartbeat_timeout))
+    self.report_interval = float(settings.get("report_interval", self.report_interval))
+    self.flush_interval = float(settings.get("flush_interval", self.flush_interval))
+
+    symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+
+    # {symbol bytes: [bid, ask, last]} for every streamed symbol
+    nan = float("nan")
+    self.table = {}
+    self.names = {}
+    for symbol in symbols:
+      self.table[symbol.encode()] = [nan, nan, nan]
+      self.names[symbol.encode()] = symbol
+
+    # {symbol bytes: (bid, ask, last, received, shard)} changed since the last flush
+    self.pending = {}
+    self.pending_lock = threading.Lock()
+
+    self.shards = []
+    for pos in range(0, len(symbols), self.shard_size):
+      self.shards.append({
+        "id": len(self.shards),
+        "symbols": symbols[pos:pos + self.shard_size],
+        "response": None,
+        "last_seen": time.monotonic(),
+        "messages": 0,
+        "reported": 0,
+        "reconnects": 0,
+        "lag": None,
+        "thread": None
+      })
+    self.lock = threading.Lock()
+    self.running = False
+
+  # Start a thread per shard plus the watchdog
+  def start(self):
+    self.running = True
+    for shard in self.shards:
+      self.start_shard(shard)
+    threading.Thread(target=self.watchdog, name="quote-watchdog", daemon=True).start()
+    if self.flush_interval > 0:
+      threading.Thread(target=self.flusher, name="quote-flusher", daemon=True).start()
+    logging.info("Streaming %s symbols over %s connections" % (sum(len(shard["symbols"]) for shard in self.shards), len(self.shards)))
+
+  def start_shard(self, shard):
+    shard["thread"] = threading.Thread(target=self.run_shard, args=(shard,), name="quote-shard-%s" % shard["id"], daemon=True)
+    shard["thread"].start()
+
+  def stop(self):
+    self.running = False
+    for shard in self.shards:
+      self.close_shard(shard)
+
+  # Stream until stopped, report the message rates every report_interval
+  def run(self):
+    self.start()
+    try:
+      while self.running:
+        time.sleep(self.report_interval)
+        self.report()
+    finally:
+      self.stop()
+
+  def close_shard(self, shard):
+    with self.lock:
+      response = shard["response"]
+    if response is not None:
+      try:
+        response.close()
+      except Exception:
+        pass
+
+  # Connect, read until the connection drops, back off and connect again
+  def run_shard(self, shard):
+    attempt = 0
+    url = "%s%s/%s" % (self.broker.base_url, self.stream_path, ",".join(shard["symbols"]))
+    while self.running:
+      start_time = time.monotonic()
+      try:
+        self.stream_shard(shard, url)
+      except (requests.exceptions.RequestException, ValueError, AttributeError) as e:
+        # A watchdog close shows up as a read on a closed response
+        logging.error("Quote shard %s failed: %s" % (shard["id"], e))
+      except Exception as e:
+        # Anything else is retried the same way, the thread must not die
+        logging.error("Quote shard %s failed unexpectedly: %s" % (shard["id"], e))
+      finally:
+        with self.lock:
+          shard["response"] = None
+      if not self.running:
+        break
+
+      # A connection that lasted is a fresh start, not another failure in a row
+      if time.monotonic() - start_time > self.stable_after:
+        attempt = 0
+      shard["reconnects"] += 1
+      wait = self.broker.transport.backoff_time(attempt)
+      attempt += 1
+      logging.info("Quote shard %s reconnecting in %s seconds" % (shard["id"], round(wait, 2)))
+      time.sleep(wait)
+
+  def stream_shard(self, shard, url):
+    # Ensure we have working access token
+    access_token = self.broker.handle_auth()
+    headers = {"Authorization": "Bearer %s" % access_token}
+
+    response = self.broker.transport.get(url, headers=headers, stream=True, timeout=(self.broker.transport.connect_timeout, self.heartbeat_timeout))
+    if response.status_code != 200:
+      logging.error("Quote shard %s got the status code of %s" % (shard["id"], response.status_code))
+      logging.error(response.text)
+      response.close()
+      return
+
+    with self.lock:
+      shard["response"] = response
+    shard["last_seen"] = time.monotonic()
+
+    # Parse stream for each line
+    for line in response.iter_lines():
+      if not line:
+        continue
+      received = time.monotonic()
+      shard["last_seen"] = received
+      # Heartbeats count too, readers know the stream is alive
+      self.quote_bus.touch()
+      if b'"Error"' in line:
+        logging.error("Quote shard %s stream error: %s" % (shard["id"], json.loads(line)))
+        return
+
+      # Heartbeats and other messages have no symbol
+      found = self.symbol_re.search(line)
+      if not found:
+        continue
+      values = self.table.get(found.group(1))
+      if values is None:
+        continue
+      shard["messages"] += 1
+
+      changed = False
+      for key, value in self.value_re.findall(line):
+        position = self.positions[key]
+        value = float(value)
+        if values[position] != value:
+          values[position] = value
+          changed = True
+      if not changed:
+        continue
+
+      # Write only the information we want into the symbol slot
+      if self.flush_interval > 0:
+        with self.pending_lock:
+          self.pending[found.group(1)] = (values[0], values[1], values[2], received, shard)
+      else:
+        self.quote_bus.write(self.names[found.group(1)], values[0], values[1], values[2])
+        self.add_lag(shard, received)
+
+  # Keep the longest receive to write time since the last report
+  def add_lag(self, shard, received):
+    lag = time.monotonic() - received
+    if shard["lag"] is None or lag > shard["lag"]:
+      shard["lag"] = lag
+
+  # Write the symbols changed since the last flush, once every flush_interval
+  def flusher(self):
+    while self.running:
+      time.sleep(self.flush_interval)
+      # Swap the pending quotes out, changes landing during the writes wait for the next flush
+      with self.pending_lock:
+        pending, self.pending = self.pending, {}
+      for symbol, (bid, ask, last, received, shard) in pending.items():
+        self.quote_bus.write(self.names[symbol], bid, ask, last)
+        self.add_lag(shard, received)
+
+  # Close shards that have gone quiet, their thread reconnects, and restart dead shard threads
+  def watchdog(self):
+    while self.running:
+      time.sleep(max(1, self.heartbeat_timeout / 3))
+      cur_time = time.monotonic()
+      for shard in self.shards:
+        if self.running and not shard["thread"].is_alive():
+          logging.error("Quote shard %s thread stopped, starting it again" % shard["id"])
+          shard["reconnects"] += 1
+          self.start_shard(shard)
+          continue
+        with self.lock:
+          connected = shard["response"] is not None
+        if connected and cur_time - shard["last_seen"] > self.heartbeat_timeout:
+          logging.error("Quote shard %s silent for %s seconds, reconnecting" % (shard["id"], round(cur_time - shard["last_seen"], 1)))
+          self.close_shard(shard)
+
+  # [{shard, symbols, messages per second, reconnects, seconds since heard}]
+  def rates(self, interval=None):
+    data = []
+    cur_time = time.monotonic()
+    for shard in self.shards:
+      messages = shard["messages"]
+      use_interval = interval or self.report_interval
+      data.append({
+        "shard": shard["id"],
+        "symbols": len(shard["symbols"]),
+        "msgs_per_sec": round((messages - shard["reported"]) / use_interval, 2),
+        "reconnects": shard["reconnects"],
+        "last_seen": round(cur_time - shard["last_seen"], 1),
+        "lag": self.lag(shard)
+      })
+      shard["reported"] = messages
+    return data
+
+  # Longest seconds from receiving a quote to writing it since the last call, None when nothing was written
+  def lag(self, shard):
+    lag, shard["lag"] = shard["lag"], None
+    if lag is None:
+      return None
+    return round(lag, 3)
+
+  def report(self):
+    for each in self.rates():
+      logging.info("Quote shard %(shard)s: %(symbols)s symbols, %(msgs_per_sec)s msgs/sec, %(lag)s seconds lag, %(reconnects)s reconnects, last heard %(last_seen)s seconds ago" % each)
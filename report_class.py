@@ -0,0 +1,144 @@
+#!/bin/env python3
+
+# Modules
+import io
+import os
+import sys
+import csv
+import html
+import json
+import logging
+import collections
+from pprint import pprint
+
+# Custom Modules
+#sys.path.append(os.path.expanduser('~') + "/lazytrader")
+sys.path.append(os.path.expanduser('~') + "/lazytrader-unreleased")
+
+#
+# Tables for the report emails and files
+#
+# Rows are written straight to a file handle (or joined once for an email
+# body), never built up with repeated string concatenation. Each table can
+# be grouped by its first columns; a group longer than max_rows keeps its
+# first and last rows with one line counting the rows left out.
+#
+class REPORT:
+  # Variables
+  max_rows = 50
+  formats = ["html", "csv", "json"]
+
+  def __init__(self, max_rows=None):
+    if max_rows is not None:
+      self.max_rows = int(max_rows)
+    self.tables = []
+
+  # Add a table from rows (lists in column order), grouped on the first group_size columns
+  def add_table(self, title, columns, rows, group_size=0):
+    self.tables.append({"title": title, "columns": list(columns), "rows": self.cap_rows(rows, group_size)})
+
+  # Add a table from columnar data, {column: list of values}
+  def add_columns(self, title, data, group_size=0):
+    columns = list(data.keys())
+    self.add_table(title, columns, zip(*[data[each] for each in columns]), group_size=group_size)
+
+  # Add a two column table from a dictionary
+  def add_dict(self, title, data, columns=["Description", "Value"]):
+    self.add_table(title, columns, [[key, val] for key, val in data.items()])
+
+  # Keep the first and last rows of long groups, a None row marks the skipped rows
+  def cap_rows(self, rows, group_size):
+    data = []
+    if not self.max_rows:
+      data.extend(list(row) for row in rows)
+      return data
+
+    head_size = (self.max_rows + 1) // 2
+    tail_size = self.max_rows - head_size
+    cur_group = None
+    count = 0
+    tail = collections.deque(maxlen=tail_size)
+    for row in rows:
+      row = list(row)
+      group = tuple(row[:group_size])
+      if group != cur_group:
+        self.flush_tail(data, tail, count - head_size - len(tail))
+        cur_group = group
+        count = 0
+      count += 1
+      if count <= head_size:
+        data.append(row)
+      elif tail_size:
+        tail.append(row)
+    self.flush_tail(data, tail, count - head_size - len(tail))
+    return data
+
+  def flush_tail(self, data, tail, skipped):
+    if skipped > 0:
+      data.append(skipped)
+    data.extend(tail)
+    tail.clear()
+
+  # Write the tables as HTML tables
+  def write_html(self, h):
+    for table in self.tables:
+      h.write("<h3>%s</h3>\n<table><tr>" % html.escape(str(table["title"])))
+      h.write("".join("<th>%s</th>" % html.escape(str(each)) for each in table["columns"]))
+      h.write("</tr>\n")
+      for row in table["rows"]:
+        if type(row) is int:
+          h.write("<tr><td colspan=\"%s\">... %s rows not shown</td></tr>\n" % (len(table["columns"]), row))
+          continue
+        h.write("<tr>%s</tr>\n" % "".join("<td>%s</td>" % html.escape(str(each)) for each in row))
+      h.write("</table><p>\n")
+
+  # One CSV with the table title as the first column
+  def write_csv(self, h):
+    writer = csv.writer(h)
+    for table in self.tables:
+      writer.writerow(["Table"] + table["columns"])
+      for row in table["rows"]:
+        if type(row) is int:
+          writer.writerow([table["title"], "%s rows not shown" % row])
+          continue
+        writer.writerow([table["title"]] + row)
+
+  # {title: [{column: value}, ...]}
+  def write_json(self, h):
+    data = {}
+    for table in self.tables:
+      rows = []
+      for row in table["rows"]:
+        if type(row) is int:
+          rows.append({"skipped_rows": row})
+          continue
+        rows.append(dict(zip(table["columns"], row)))
+      data[table["title"]] = rows
+    json.dump(data, h, indent=2, default=str)
+
+  def write(self, h, output_format="html"):
+    if output_format not in self.formats:
+      raise ValueError("Unknown report format %s" % output_format)
+    getattr(self, "write_%s" % output_format)(h)
+
+  # Write to a file, the format comes from the extension (html by default)
+  def save(self, filename):
+    output_format = os.path.splitext(filename)[1].lstrip(".").lower()
+    if output_format not in self.formats:
+      output_format = "html"
+    with open(filename, "w", newline="") as h:
+      self.write(h, output_format)
+    logging.info("Report written to %s" % filename)
+
+  # The report as one string, used for the email body
+  def render(self, output_format="html"):
+    h = io.StringIO()
+    self.write(h, output_format)
+    return h.getvalue()
+
+if __name__ == "__main__":
+  report = REPORT(max_rows=4)
+  report.add_table("Screener", ["Screener", "Symbol", "Time", "Net Price"], [["test", "AAPL", "09:%02d" % each, each / 100] for each in range(10)], group_size=2)
+  report.add_columns("Columns", {"Symbol": ["AAPL", "AMZN"], "Profit": [1.5, -0.25]})
+  print(report.render())
+  print(report.render("csv"))
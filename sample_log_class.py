@@ -0,0 +1,192 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import zlib
+import struct
+import logging
+import datetime
+from pprint import pprint
+
+# Custom Modules
+#sys.path.append(os.path.expanduser('~') + "/lazytrader")
+sys.path.append(os.path.expanduser('~') + "/lazytrader-unreleased")
+
+#
+# Append only log of screener samples
+#
+# Every record is 48 bytes, a crc32 followed by one of
+#   name    (kind 1): name id, name (32 bytes utf-8)
+#   sample  (kind 2): screener id, symbol id, epoch, open, close, net
+# Screener and symbol names are written once and referred to by id, so a
+# tick only appends one record per symbol. A torn or corrupt tail (crash
+# mid write) fails its crc and is cut off the next time the log is opened.
+#
+class SAMPLE_LOG:
+  # Variables
+  crc_format = struct.Struct("<I")
+  name_format = struct.Struct("<BxxxI4x32s")
+  sample_format = struct.Struct("<BxxxIIqddd")
+  record_size = crc_format.size + sample_format.size
+  name_size = 32
+  name_kind = 1
+  sample_kind = 2
+
+  def __init__(self, filename):
+    self.filename = filename
+
+    # Index Variables
+    self.name_ids = {}
+    self.names = {}
+    self.data = {}
+    self.records = 0
+
+    self.h = None
+    self.open()
+
+  # Read the log into memory and leave it open for appending
+  def open(self):
+    good_size = 0
+    if os.path.exists(self.filename):
+      with open(self.filename, "rb") as h:
+        while True:
+          record = h.read(self.record_size)
+          if len(record) < self.record_size:
+            break
+          if not self.load_record(record):
+            logging.error("Bad record at byte %s of %s, dropping the rest of the log" % (good_size, self.filename))
+            break
+          good_size += self.record_size
+
+    self.h = open(self.filename, "ab")
+    if self.h.tell() != good_size:
+      self.h.truncate(good_size)
+      self.h.seek(good_size)
+    logging.debug("Loaded %s records from %s" % (self.records, self.filename))
+
+  def close(self):
+    if self.h:
+      self.flush()
+      self.h.close()
+      self.h = None
+
+  # Check a record and add it to the in memory index
+  def load_record(self, record):
+    crc, = self.crc_format.unpack_from(record)
+    payload = record[self.crc_format.size:]
+    if crc != zlib.crc32(payload):
+      return False
+
+    kind = payload[0]
+    if kind == self.name_kind:
+      kind, name_id, name = self.name_format.unpack(payload)
+      name = name.rstrip(b"\0").decode()
+      self.names[name_id] = name
+      self.name_ids[name] = name_id
+    elif kind == self.sample_kind:
+      kind, screener_id, symbol_id, epoch, open_price, close_price, net_price = self.sample_format.unpack(payload)
+      self.add(self.names[screener_id], self.names[symbol_id], epoch, open_price, close_price, net_price)
+    else:
+      return False
+    self.records += 1
+    return True
+
+  def write_record(self, payload):
+    self.h.write(self.crc_format.pack(zlib.crc32(payload)) + payload)
+    self.records += 1
+
+  # Names that do not fit a name record, check the configured names once before logging
+  def long_names(self, names):
+    return [name for name in names if len(name.encode()) > self.name_size]
+
+  # Id for a screener or symbol name, written to the log the first time it is seen
+  def name_id(self, name):
+    try:
+      return self.name_ids[name]
+    except KeyError:
+      pass
+    raw_name = name.encode()
+    if len(raw_name) > self.name_size:
+      raise ValueError("Name longer than %s bytes: %s" % (self.name_size, name))
+    name_id = len(self.names) + 1
+    self.write_record(self.name_format.pack(self.name_kind, name_id, raw_name))
+    self.names[name_id] = name
+    self.name_ids[name] = name_id
+    return name_id
+
+  def add(self, screener_name, symbol, epoch, open_price, close_price, net_price):
+    if screener_name not in self.data:
+      self.data[screener_name] = {}
+    if symbol not in self.data[screener_name]:
+      self.data[screener_name][symbol] = {}
+    self.data[screener_name][symbol][epoch] = (open_price, close_price, net_price)
+
+  # Append one sample, call flush() once per tick
+  def append(self, screener_name, symbol, epoch, open_price, close_price, net_price):
+    screener_id = self.name_id(screener_name)
+    symbol_id = self.name_id(symbol)
+    self.write_record(self.sample_format.pack(self.sample_kind, screener_id, symbol_id, int(epoch), open_price, close_price, net_price))
+    self.add(screener_name, symbol, int(epoch), open_price, close_price, net_price)
+
+  # Make the appended records durable
+  def flush(self):
+    self.h.flush()
+    os.fsync(self.h.fileno())
+
+  # Start an empty log
+  def clear(self):
+    self.h.truncate(0)
+    self.h.seek(0)
+    self.name_ids = {}
+    self.names = {}
+    self.data = {}
+    self.records = 0
+    self.flush()
+
+  # Rewrite the log without repeated samples, optionally only samples at or after keep_after (epoch)
+  def compact(self, keep_after=None):
+    data = self.data
+    temp_file = "%s.%s.tmp" % (self.filename, os.getpid())
+    self.h.close()
+    self.h = open(temp_file, "wb")
+    self.name_ids = {}
+    self.names = {}
+    self.data = {}
+    self.records = 0
+
+    for screener_name, symbols in data.items():
+      for symbol, samples in symbols.items():
+        for epoch, sample in sorted(samples.items()):
+          if keep_after and epoch < keep_after:
+            continue
+          self.append(screener_name, symbol, epoch, *sample)
+
+    self.flush()
+    self.h.close()
+    os.replace(temp_file, self.filename)
+    self.h = open(self.filename, "ab")
+    logging.info("Compacted %s to %s records" % (self.filename, self.records))
+
+  # {screener: {symbol: {"HH:MM:SS": {"Open_Price", "Close_Price", "Net_Price"}}}}
+  def to_dict(self):
+    data = {}
+    for screener_name, symbols in self.data.items():
+      data[screener_name] = {}
+      for symbol, samples in symbols.items():
+        data[screener_name][symbol] = {}
+        for epoch, sample in sorted(samples.items()):
+          cur_time = datetime.datetime.fromtimestamp(epoch).strftime("%H:%M:%S")
+          data[screener_name][symbol][cur_time] = {"Open_Price": sample[0], "Close_Price": sample[1], "Net_Price": sample[2]}
+    return data
+
+if __name__ == "__main__":
+  # Enable logging
+  logging.basicConfig(level=logging.DEBUG)
+
+  sample_log = SAMPLE_LOG("/tmp/sample_log_test.log")
+  sample_log.clear()
+  sample_log.append("test", "AAPL", 1609857000, 128.10, 128.20, 0.10)
+  sample_log.append("test", "AAPL", 1609857120, 128.10, 128.15, 0.05)
+  sample_log.flush()
+  pprint(SAMPLE_LOG("/tmp/sample_log_test.log").to_dict())
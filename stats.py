@@ -6,17 +6,16 @@ import os
 import sys
 import json
 import logging
-import smtplib
 import datetime
 import argparse
 from pprint import pprint
-from email.message import EmailMessage
-from email.headerregistry import Address
-from email.utils import make_msgid
 
 # Custom Modules
 sys.path.append(os.path.expanduser('~') + "/lazytrader")
 import common_class
+import ledger_class
+import trade_stats_class
+import report_class
 
 if __name__ == "__main__":
   # Variables 
@@ -36,9 +35,10 @@ if __name__ == "__main__":
   email_server = "localhost"
   subject = "LazyTrader Unreleased Summary Report - %s - Days Checked: " % cur_date.strftime("%Y-%m-%d")
   from_address = ""
-  msg = ""
   email = None
   email_bypass = False  
+  ledger = None
+  output_file = None
 
   # Create the parser
   parser = argparse.ArgumentParser()
@@ -50,6 +50,10 @@ if __name__ == "__main__":
   parser.add_argument('-s', '--symbol', action='append', help="Which symbol to stream")
   parser.add_argument('-e', '--email_address', help="Email Address")
   parser.add_argument('-b', '--email_bypass', action='store_true', help="Bypass send email")
+  parser.add_argument('-l', '--ledger', action='store_true', help="Report from the local trade ledger")
+  parser.add_argument('-L', '--ledger_file', help="Trade ledger file")
+  parser.add_argument('-o', '--output', help="Write the report to a .html, .csv or .json file")
+  parser.add_argument('-m', '--max_rows', type=int, help="Most rows per report table")
 
   # Parse the argument
   args = parser.parse_args()
@@ -66,6 +70,8 @@ if __name__ == "__main__":
     email_bypass = True
   if args.email_address:
     email = args.email_address
+  if args.output:
+    output_file = args.output
 
   # Initalize Logging
   logging.basicConfig(level=log_level)
@@ -93,6 +99,26 @@ if __name__ == "__main__":
         broker = getattr(module, each.upper())
         broker = broker(file_data)
 
+  # Bring the ledger up to date once, every report is then a local query
+  if args.ledger or args.ledger_file:
+    ledger = ledger_class.LEDGER(args.ledger_file)
+    ledger.sync(broker, days_back=max([int(each) for each in days_back_list]))
+
+  # Report tables, written to a file and/or the email body
+  report = report_class.REPORT(max_rows=args.max_rows)
+
+  # Read the widest window once, every window is filled in the same pass
+  stats = trade_stats_class.TRADE_STATS(days_back_list)
+  stats.add_account(broker.get_account_summary())
+  if ledger:
+    # Settled trades totalled by the ledger, today's orders and the order counters from the broker
+    today = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d")
+    stats.add_ledger(ledger, broker.broker, until=today)
+    stats.add_all(broker.iter_trade_results(days_back=stats.max_days(), history=False))
+  else:
+    stats.add_all(broker.iter_trade_results(days_back=stats.max_days()))
+  stats_data = stats.results()
+
   for days_back in days_back_list:
     logging.info("Starting Review")
     logging.info("%s days ago" % days_back)
@@ -108,80 +134,41 @@ if __name__ == "__main__":
     logging.debug("Start Date: %s" % start_date)
     logging.debug("End Date: %s" % end_date)
 
-    transactions = broker.get_transactions(days_back=days_back)
+    transactions = stats_data[days_back]
     logging.debug("Transaction from broker: %s" % transactions)
 
-    # Accumulation Calculations
-    for cur_symbol in transactions:
-      logging.info("Reviewing %s" % cur_symbol)
-      if len(transactions[cur_symbol]) == 0:
-        logging.info("No data found for %s, skipping" % cur_symbol)
+    # Output
+    summary = {"Days Checked": days_back, "Start Date": start_date, "End Date": end_date}
+    summary.update(transactions["Summary"])
+    report.add_dict("Summary - %s Days" % days_back, summary)
+
+    symbol_rows = []
+    counter_rows = []
+    for cur_symbol, each in sorted(transactions.items()):
+      if "success_counter" not in each:
         continue
-    
-      # Output
-      msg += "<table><tr>"
-      msg += "<th>Description</th><th>Value</th>"
-      msg += "</tr><tr>"
-      msg += "<td>Symbol</td><td>%s</td>" % cur_symbol
-      msg += "</tr><tr>"
-      msg += "<td>Days Checked:</td><td>%s</td>" % days_back
-      msg += "</tr><tr>"
-      msg += "<td>Start Date:</td><td>%s</td>" % start_date
-      msg += "</tr><tr>"
-      msg += "<td>End Date:</td><td>%s</td>" % end_date
-      msg += "</tr><tr>"
-   
-      for key, val in transactions[cur_symbol].items():
-        msg += "<td>%s</td><td>%s</td>" % (key, val)
-        msg += "</tr><tr>"
-      msg += "</tr></table>"
-      msg += "<hr><p>"
-    
-  use_msg = "<HTML><BODY>"
-  use_msg += msg
-  use_msg += "</BODY></HTML>"
+      symbol_rows.append([cur_symbol, each["success_counter"], each["total_counter"], each["failure_count"], each["success_percentage"], each["profit"], each["fees"], each["avg_trans_per_sec"]])
+      for key, val in sorted(each.items()):
+        if key.endswith("_counter") and key not in ["success_counter", "total_counter"]:
+          counter_rows.append([cur_symbol, key, val])
+    report.add_table("Symbols - %s Days" % days_back, ["Symbol", "Trades", "Orders", "Failures", "Success %", "Profit", "Fees", "Avg Seconds"], symbol_rows)
+    report.add_table("Unfilled Orders - %s Days" % days_back, ["Symbol", "Counter", "Count"], counter_rows)
+
+    report.add_table("By Hour - %s Days" % days_back, ["Hour", "Trades", "Profit"], [[key, each["count"], each["profit"]] for key, each in transactions["By_Hour"].items()])
+    report.add_table("By Weekday - %s Days" % days_back, ["Weekday", "Trades", "Profit"], [[key, each["count"], each["profit"]] for key, each in transactions["By_Weekday"].items()])
+
+  # Positions are the same for every window
+  report.add_dict("Current Positions", stats_data[stats.max_days()].get("Current_Positions", {}), columns=["Symbol", "Quantity"])
+
+  if output_file:
+    report.save(output_file)
 
   if email_bypass:
     logging.info("Bypass emailed, displaying to console")
-    print(json.dumps(transactions, indent=2))
+    print(json.dumps(stats_data, indent=2))
     sys.exit()
 
   # Update Subject with days
   subject += ", ".join(days_back_list)
 
-  # Generate Email Message
-  try:
-    raw_email = email.split('@')
-    user = raw_email[0]
-    domain = raw_email[1]
-  except:
-    logging.error("Email provide is malformed: %s" % email)
-    sys.exit()
-  msg = EmailMessage()
-  msg['Subject'] = subject
-  msg['From'] = Address(email, user, domain)
-  msg['To'] = Address(email, user, domain)
-  msg.set_content("Yo")
-
-  # Add the html version.  This converts the message into a multipart/alternative
-  # container, with the original text message as the first part and the new html
-  # message as the second part.
-  asparagus_cid = make_msgid()
-  msg.add_alternative(use_msg.format(asparagus_cid=asparagus_cid[1:-1]), subtype='html')
-  # note that we needed to peel the <> off the msgid for use in the html.
-
-  # Send Email
-  if email:
-    logging.debug("Sending email to %s" % msg['To'])
-    logging.debug("To: %s" % msg['To'])
-    logging.debug("From: %s" % msg['From'])
-    logging.debug("Subject: %s" % msg['Subject'])
-    logging.debug("Body: %s" % msg.as_string)
-
-    # Send the message via local SMTP server.
-    with smtplib.SMTP('localhost') as s:
-      s.send_message(msg)
-      s.quit() 
-      logging.info("Email Sent")
-  else:
-    logging.error("No Email Address Provided")
+  common_class.send_email(report.render(), email, subject)
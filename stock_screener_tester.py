@@ -5,18 +5,19 @@ import re
 import os
 import sys
 import time
-import json
 import pytz
 import logging
-import requests
 import datetime
 import argparse
+import concurrent.futures
 from pprint import pprint
 
 # Custom Modules
 sys.path.append(os.path.expanduser('~') + "/lazytrader")
 import common_class
 import finviz_class
+import report_class
+import sample_log_class
 
 if __name__ == "__main__":
   # Variables
@@ -27,7 +28,7 @@ if __name__ == "__main__":
   cur_date = datetime.datetime.now()
   end_date = datetime.datetime.strptime("%s 15:00:00" % cur_date.strftime("%Y-%m-%d"), "%Y-%m-%d %H:%M:%S")
   cur_date = datetime.datetime.now()
-  output_file = "Screener_Test.json"
+  output_file = "Screener_Test.log"
   sleep_timer = 120
 
   # Email Variable
@@ -36,6 +37,9 @@ if __name__ == "__main__":
   email = None
   email_bypass = False
 
+  # Report Variables
+  report_file = None
+
   # Config Variables
   data = {}
   delete_flag = True
@@ -55,6 +59,8 @@ if __name__ == "__main__":
   parser.add_argument('-e', '--email_address', help="Email Address")
   parser.add_argument('-b', '--email_bypass', action='store_true', help="Bypass send email")
   parser.add_argument('-D', '--no_delete', action='store_true', help="DO NOT Delete the old data")
+  parser.add_argument('-o', '--output', help="Write the report to a .html, .csv or .json file")
+  parser.add_argument('-m', '--max_rows', type=int, help="Most samples per symbol in the report")
 
   # Parse the argument
   args = parser.parse_args()
@@ -73,6 +79,8 @@ if __name__ == "__main__":
     email_bypass = True
   if args.no_delete:
     delete_flag = False
+  if args.output:
+    report_file = args.output
 
   # Initalize Logging
   if filename:
@@ -83,6 +91,7 @@ if __name__ == "__main__":
   # Initalize Common Class
   common_class = common_class.COMMON()
   finviz = finviz_class.FINVIZ()
+  report = report_class.REPORT(max_rows=args.max_rows)
 
   # Initalize user config data
   file_data = common_class.get_user_data(user_config)
@@ -102,79 +111,57 @@ if __name__ == "__main__":
         broker = getattr(module, each.upper())
         broker = broker(file_data)
 
-  # Delete old contents from Screener Test Output
+  # Samples are appended to a log
+  sample_log = sample_log_class.SAMPLE_LOG(output_file)
+
+  # Screener names are stored in the log, check them before the first tick
+  long_names = sample_log.long_names(file_data[broker.broker]["screeners"])
+  if long_names:
+    logging.error("Screener names longer than %s bytes, shorten them in %s: %s" % (sample_log.name_size, user_config, ", ".join(long_names)))
+    sys.exit(1)
+
+  # Delete the old contents unless asked not to
   if delete_flag:
-    with open(output_file, "w") as h:
-      json.dump({}, h)
+    sample_log.clear()
 
   #
   # Main Loop
   #
   while True:
     cur_date = datetime.datetime.now()
-    for screener_name, param in file_data[broker.broker]["screeners"].items():
+    screeners = file_data[broker.broker]["screeners"]
 
-      # Get Screener stocks
-      stock_list = finviz.get_symbols(param)
+    # Get Screener stocks, every screener at the same time
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(screeners))) as executor:
+      stock_lists = dict(zip(screeners, executor.map(finviz.get_symbols, screeners.values())))
 
-      if len(stock_list) == 0:
+    # One set of parallel quote requests for the union of the screeners
+    all_symbols = set()
+    for screener_name, stock_list in stock_lists.items():
+      if not stock_list:
         logging.error("No symbols found for %s" % screener_name)
         continue
+      all_symbols.update(stock_list)
+    quotes = broker.get_market_quotes(all_symbols)
 
-      # Ensure we have working access token
-      broker.access_token = broker.handle_auth()
-
-      # Get Account Balance
-      url = broker.base_url + "/marketdata/quotes/%s" % ",".join(stock_list)
-      logging.debug("Send Broker %s" % url)
-      res = requests.get(url, headers=broker.headers)
-      status_code = res.status_code
-      if status_code == 200:
-        results = res.json()
-      else:
-        logging.error("Got the status code of %s" % status_code)
-        logging.error(res.text)
-
-      # Verify we have data
-      if "Quotes" not in results:
-        logging.error("Unable to find quotes for %s" % screener_name)
-
-      # Get the current time
-      cur_time = datetime.datetime.now().strftime("%H:%M:%S")
-
-      # Create the output file is missing
-      if not os.path.exists(output_file):
-        with open(output_file, "w") as h:
-          h.write("")
-      
-      # Get data from file
-      with open(output_file, "r") as h:
-        try:
-          data = json.load(h)
-        except json.decoder.JSONDecodeError:
-          data = {}
+    # Get the current time
+    cur_time = int(time.time())
 
-      # Parse Market Data per Screener
-      for each in results["Quotes"]:
-        symbol = each["Symbol"]
+    # Parse Market Data per Screener
+    for screener_name, stock_list in stock_lists.items():
+      for symbol in stock_list or []:
+        try:
+          each = quotes[symbol.upper()]
+        except KeyError:
+          logging.error("Unable to find a quote for %s in %s" % (symbol, screener_name))
+          continue
         open_price = float(each["PreviousClose"])
         close_price = float(each["Close"])
         net_price = round(float(close_price - open_price), 2)
-  
-        if screener_name not in data:
-          data[screener_name] = {}
-        if symbol not in data[screener_name]:
-          data[screener_name][symbol] = {}
-
-        data[screener_name][symbol][cur_time] = {
-          "Open_Price": open_price,
-          "Close_Price": close_price,
-          "Net_Price": net_price
-        }
-
-      # Write current data to file
-      with open(output_file, "w") as h:
-        json.dump(data, h)
+        sample_log.append(screener_name, each["Symbol"], cur_time, open_price, close_price, net_price)
+
+    # One sync per tick
+    sample_log.flush()
 
     if cur_date > end_date:
       break
@@ -183,35 +170,17 @@ if __name__ == "__main__":
   #
   # E-Mail Section
   #
-  msg = "<table><tr>"
-  msg += "<th>Screener</th>"
-  msg += "<th>Symbol</th>"
-  msg += "<th>Open Price</th>"
-  msg += "<th>Close Price</th>"
-  msg += "<th>Net Price</th>"
-  msg += "</tr>"
+  sample_log.compact()
+  data = sample_log.to_dict()
+  sample_log.close()
 
+  rows = []
   for name, cur_data in data.items():
-    #msg += "<tr>"
-    #msg += "<td>%s</td>" % name
     for symbol, each_data in cur_data.items():
       for cur_time, the_data in each_data.items():
-        msg += "<tr>"
-        msg += "<td>%s</td>" % name
-        msg += "<td>%s</td>" % symbol
-        msg += "<td>%s</td>" % data[name][symbol][cur_time]["Open_Price"]
-        msg += "<td>%s</td>" % data[name][symbol][cur_time]["Close_Price"]
-        msg += "<td>%s</td>" % data[name][symbol][cur_time]["Net_Price"]
-        msg += "</tr>"
-      msg += "<tr>"
-      msg += "<td>------------------</td>"
-      msg += "<td>------------------</td>"
-      msg += "<td>------------------</td>"
-      msg += "<td>------------------</td>"
-      msg += "<td>------------------</td>"
-      msg += "</tr>"
-
-  msg += "</table><p>"
-
-  common_class.send_email(msg, email, subject, email_bypass)
- 
+        rows.append([name, symbol, cur_time, the_data["Open_Price"], the_data["Close_Price"], the_data["Net_Price"]])
+  report.add_table("Screener Samples", ["Screener", "Symbol", "Time", "Open Price", "Close Price", "Net Price"], rows, group_size=2)
+
+  if report_file:
+    report.save(report_file)
+  common_class.send_email(report.render(), email, subject, email_bypass)
@@ -0,0 +1,157 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import numpy
+import tempfile
+import unittest
+
+# Custom Modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import backtest
+import backtest_class
+import sample_log_class
+
+#
+# Bar by bar replay of the strategy, the reference for BACKTEST.run
+#
+# On every bar: cancel an expired buy, fill the open buy, drop a position
+# that is too old, fill the open sells, then place the next buy at the
+# close when one is due.
+#
+def replay(bars, profit, cancel, qty=1, max_order_age=None, spend_per_day=None):
+  bar_time = [int(each) for each in bars["time"]]
+  low = bars["low"]
+  high = bars["high"]
+  buy = [round(float(each), 2) for each in bars["close"]]
+  n = len(bar_time)
+  epsilon = 1e-9
+
+  day = [0] * n
+  for pos in range(1, n):
+    day[pos] = day[pos - 1] + int(bar_time[pos] - bar_time[pos - 1] > 4 * 3600)
+
+  data = {"orders": 0, "fills": 0, "trades": 0, "aged": 0, "hold": 0, "capital": 0}
+  spent = {}
+  order = None
+  position = None
+  sells = []
+  place_at = 0
+  for pos in range(n):
+    if order is not None:
+      order_bar, price = order
+      if bar_time[pos] > bar_time[order_bar] + (cancel * 60) or day[pos] != day[order_bar]:
+        order = None
+        place_at = pos
+      elif low[pos] <= price + epsilon:
+        order = None
+        data["fills"] += 1
+        spent[day[order_bar]] = spent.get(day[order_bar], 0) + (price * qty)
+        position = [pos, round(price + profit, 2), price]
+        sells.append(position)
+
+    if position is not None and max_order_age and bar_time[pos] >= bar_time[position[0]] + max_order_age:
+      data["aged"] += 1
+      position = None
+      place_at = pos
+
+    for each in list(sells):
+      if each[0] < pos and high[pos] >= each[1] - epsilon:
+        sells.remove(each)
+        held = bar_time[pos] - bar_time[each[0]]
+        data["trades"] += 1
+        data["hold"] += held
+        data["capital"] += held * each[2] * qty
+        if each is position:
+          position = None
+          place_at = pos + 1
+
+    if order is None and position is None and place_at == pos:
+      if spend_per_day and not (spend_per_day - spent.get(day[pos], 0)) > buy[pos] * qty:
+        place_at = next((later for later in range(pos + 1, n) if day[later] != day[pos]), n)
+      else:
+        order = (pos, buy[pos])
+        data["orders"] += 1
+
+  data["open_end"] = len(sells) > 0
+  return data
+
+# Random walk minute bars over a few days
+def make_bars(rng, days=3, minutes=120):
+  bar_time = (numpy.arange(days)[:, None] * 86400 + numpy.arange(minutes)[None, :] * 60).ravel() + 1609857000
+  close = 100 + numpy.cumsum(rng.normal(0, 0.02, len(bar_time)))
+  return {"time": bar_time, "close": close, "low": close - rng.random(len(bar_time)) * 0.03, "high": close + rng.random(len(bar_time)) * 0.03}
+
+class TEST_BACKTEST(unittest.TestCase):
+  def setUp(self):
+    self.rng = numpy.random.default_rng(7)
+
+  # The sparse table descent finds the same bar as a linear scan
+  def test_first_at(self):
+    for n in [1, 2, 5, 64, 100]:
+      bars = make_bars(self.rng, days=1, minutes=n)
+      test = backtest_class.BACKTEST(bars)
+      start = self.rng.integers(0, n + 1, 200)
+      price = self.rng.uniform(bars["low"].min() - 0.05, bars["high"].max() + 0.05, 200)
+      below = test.first_at_or_below(start, price)
+      above = test.first_at_or_above(start, price)
+      for pos in range(200):
+        expected = next((cur for cur in range(start[pos], n) if bars["low"][cur] <= price[pos]), n)
+        self.assertEqual(below[pos], expected)
+        expected = next((cur for cur in range(start[pos], n) if bars["high"][cur] >= price[pos]), n)
+        self.assertEqual(above[pos], expected)
+
+  def test_run_against_replay(self):
+    for trial in range(40):
+      bars = make_bars(self.rng, days=int(self.rng.integers(1, 4)), minutes=int(self.rng.integers(5, 150)))
+      qty = int(self.rng.integers(1, 4))
+      max_order_age = [None, 600, 1800][trial % 3]
+      spend_per_day = [None, 250, 1000][(trial // 3) % 3]
+      test = backtest_class.BACKTEST(bars, qty=qty, max_order_age=max_order_age, spend_per_day=spend_per_day)
+      profit_list = [0.01, 0.03, 0.1]
+      cancel_list = [1, 5, 30]
+
+      results = test.run(profit_list, cancel_list)
+      self.assertEqual(len(results), 9)
+      for each in results:
+        data = replay(bars, each["profit"], each["cancel_order_in_minutes"], qty, max_order_age, spend_per_day)
+        expected = test.result(each["profit"], each["cancel_order_in_minutes"], data["orders"], data["fills"], data["trades"], data["hold"], data["capital"], data["open_end"], data["aged"])
+        self.assertEqual(each, expected, (trial, each["profit"], each["cancel_order_in_minutes"]))
+
+  # Hand checked: buy 100.00 at bar 0, fill at bar 1, sell 100.05 at bar 3, buy again at bar 4
+  def test_small(self):
+    bars = {"time": [0, 60, 120, 180, 240, 300], "close": [100.00, 99.99, 100.02, 100.05, 100.10, 100.20], "low": [100.00, 99.99, 100.01, 100.04, 100.10, 100.20], "high": [100.00, 100.00, 100.03, 100.06, 100.10, 100.20]}
+    data = backtest_class.BACKTEST(bars).run([0.05], [10])[0]
+    self.assertEqual((data["orders"], data["fills"], data["trades"], data["aged"]), (2, 1, 1, 0))
+    self.assertEqual((data["total_profit"], data["avg_trans_sec"], data["open_at_end"]), (0.05, 120, False))
+
+  # A position never sold and never too old is open at the end, not aged
+  def test_open_at_end(self):
+    bars = {"time": [0, 60, 120], "close": [100.00, 99.99, 99.98], "low": [100.00, 99.99, 99.98], "high": [100.00, 100.00, 99.99]}
+    data = backtest_class.BACKTEST(bars, max_order_age=3600).run([0.05], [10])[0]
+    self.assertEqual((data["orders"], data["fills"], data["trades"], data["aged"], data["open_at_end"]), (1, 1, 0, 0, True))
+
+  def test_empty(self):
+    bars = {"time": [], "close": [], "low": [], "high": []}
+    self.assertEqual(backtest_class.BACKTEST(bars).run([0.01], [5])[0]["orders"], 0)
+
+  # Recorded samples are replayed through from_ticks
+  def test_samples(self):
+    with tempfile.TemporaryDirectory() as temp_dir:
+      filename = os.path.join(temp_dir, "samples.log")
+      sample_log = sample_log_class.SAMPLE_LOG(filename)
+      for pos, price in enumerate([100.00, 99.99, 100.02, 100.05, 100.10]):
+        sample_log.append("test", "AAPL", 1609857000 + (pos * 60), 99.00, price, 0)
+      sample_log.append("other", "AAPL", 1609857000 + (5 * 60), 99.00, 100.20, 0)
+      sample_log.close()
+      samples = backtest.load_samples(filename)
+
+    tick_time, price = samples["AAPL"]
+    self.assertEqual(list(tick_time - 1609857000), [0, 60, 120, 180, 240, 300])
+    self.assertEqual(list(price), [100.00, 99.99, 100.02, 100.05, 100.10, 100.20])
+    data = backtest_class.BACKTEST.from_ticks(tick_time, price).run([0.05], [10])[0]
+    self.assertEqual((data["orders"], data["fills"], data["trades"]), (2, 1, 1))
+
+if __name__ == "__main__":
+  unittest.main()
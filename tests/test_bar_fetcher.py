@@ -0,0 +1,66 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import time
+import datetime
+import unittest
+
+# Custom Modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bar_fetcher_class
+
+class TEST_BAR_FETCHER(unittest.TestCase):
+  def setUp(self):
+    self.calls = []
+    self.fail = set()
+    self.fetcher = bar_fetcher_class.BAR_FETCHER(self.fetch_window, window_days=5, workers=3, min_interval=0)
+
+  # One bar per day at noon UTC, plus a repeat of the first bar of the next window
+  def fetch_window(self, symbol, start_date, end_date):
+    self.calls.append((start_date, end_date))
+    if start_date in self.fail:
+      raise ValueError("Broker Error: 500")
+    rows = []
+    cur_day = start_date
+    while cur_day <= end_date + datetime.timedelta(days=1):
+      epoch = int(datetime.datetime(cur_day.year, cur_day.month, cur_day.day, 12, tzinfo=datetime.timezone.utc).timestamp())
+      rows.append((epoch, cur_day.day, cur_day.day, cur_day.day, cur_day.day, 100))
+      cur_day += datetime.timedelta(days=1)
+    return rows[::-1]
+
+  def test_windows(self):
+    windows = self.fetcher.windows(datetime.date(2026, 9, 1), datetime.date(2026, 9, 12))
+    self.assertEqual(windows, [(datetime.date(2026, 9, 1), datetime.date(2026, 9, 5)), (datetime.date(2026, 9, 6), datetime.date(2026, 9, 10)), (datetime.date(2026, 9, 11), datetime.date(2026, 9, 12))])
+    self.assertEqual(self.fetcher.windows(datetime.date(2026, 9, 2), datetime.date(2026, 9, 1)), [])
+
+  # The windows are stitched in time order without the repeated edge bars
+  def test_fetch(self):
+    bars, failed = self.fetcher.fetch("AAPL", datetime.date(2026, 9, 1), datetime.date(2026, 9, 12))
+    self.assertEqual(failed, [])
+    self.assertEqual(len(self.calls), 3)
+    self.assertEqual(list(bars["close"]), list(range(1, 14)))
+    self.assertEqual(bars["time"].dtype.kind, "i")
+    self.assertTrue((bars["time"][1:] > bars["time"][:-1]).all())
+
+  # A failed window is returned, not dropped
+  def test_failed(self):
+    self.fail = {datetime.date(2026, 9, 6)}
+    bars, failed = self.fetcher.fetch("AAPL", datetime.date(2026, 9, 1), datetime.date(2026, 9, 12))
+    self.assertEqual(failed, [(datetime.date(2026, 9, 6), datetime.date(2026, 9, 10))])
+    self.assertEqual(list(bars["close"]), [1, 2, 3, 4, 5, 6, 11, 12, 13])
+
+  def test_empty(self):
+    bars, failed = self.fetcher.fetch_windows("AAPL", [])
+    self.assertEqual((len(bars["time"]), failed), (0, []))
+
+  # Request starts are spaced min_interval apart across the workers
+  def test_throttle(self):
+    self.fetcher.min_interval = 0.05
+    start_time = time.monotonic()
+    self.fetcher.fetch("AAPL", datetime.date(2026, 9, 1), datetime.date(2026, 9, 30))
+    self.assertGreaterEqual(time.monotonic() - start_time, 0.05 * 5)
+
+if __name__ == "__main__":
+  unittest.main()
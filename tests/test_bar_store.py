@@ -0,0 +1,110 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import json
+import datetime
+import tempfile
+import unittest
+
+# Custom Modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bar_store_class
+import bar_fetcher_class
+
+#
+# Broker stand in, three 1 minute bars per weekday from 09:30 New York time
+#   Days in "missing" come back empty, like a day past the broker history
+#
+class FAKE_BROKER:
+  def __init__(self):
+    self.calls = []
+    self.missing = set()
+
+  def fetch_window(self, symbol, start_date, end_date):
+    self.calls.append((start_date, end_date))
+    rows = []
+    cur_day = start_date
+    while cur_day <= end_date:
+      if cur_day.weekday() < 5 and cur_day not in self.missing:
+        epoch = int(datetime.datetime(cur_day.year, cur_day.month, cur_day.day, 14, 30, tzinfo=datetime.timezone.utc).timestamp())
+        for minute in range(3):
+          price = cur_day.day + (minute / 100)
+          rows.append((epoch + (minute * 60), price, price, price, price, 100))
+      cur_day += datetime.timedelta(days=1)
+    return rows
+
+class TEST_BAR_STORE(unittest.TestCase):
+  def setUp(self):
+    self.temp_dir = tempfile.TemporaryDirectory()
+    self.broker = FAKE_BROKER()
+    self.fetcher = bar_fetcher_class.BAR_FETCHER(self.broker.fetch_window, window_days=5, workers=2, min_interval=0)
+    self.store = bar_store_class.BAR_STORE(self.temp_dir.name, self.fetcher)
+
+  def tearDown(self):
+    self.temp_dir.cleanup()
+
+  def index(self):
+    with open(os.path.join(self.temp_dir.name, "AAPL", "index.json")) as h:
+      return json.load(h)["days"]
+
+  def test_stored_once(self):
+    bars = self.store.get("AAPL", datetime.date(2026, 9, 14), datetime.date(2026, 9, 18))
+    self.assertEqual(len(bars["time"]), 15)
+    self.assertEqual(list(bars["close"][:3]), [14.0, 14.01, 14.02])
+    self.assertTrue((bars["time"][1:] > bars["time"][:-1]).all())
+    calls = len(self.broker.calls)
+
+    again = self.store.get("AAPL", datetime.date(2026, 9, 14), datetime.date(2026, 9, 18))
+    self.assertEqual(len(self.broker.calls), calls)
+    self.assertEqual(list(again["time"]), list(bars["time"]))
+
+  # Only the days between the stored ones are fetched, weekends do not split a window
+  def test_gap_fill(self):
+    self.store.get("AAPL", datetime.date(2026, 9, 14), datetime.date(2026, 9, 15))
+    self.store.get("AAPL", datetime.date(2026, 9, 24), datetime.date(2026, 9, 25))
+    self.broker.calls = []
+
+    bars = self.store.get("AAPL", datetime.date(2026, 9, 14), datetime.date(2026, 9, 25))
+    self.assertEqual(self.broker.calls, [(datetime.date(2026, 9, 16), datetime.date(2026, 9, 20)), (datetime.date(2026, 9, 21), datetime.date(2026, 9, 23))])
+    self.assertEqual(len(bars["time"]), 30)
+    self.assertEqual(sorted(set(int(each) for each in bars["close"])), [14, 15, 16, 17, 18, 21, 22, 23, 24, 25])
+
+  # An empty trading day is asked for again, an empty holiday is stored
+  def test_empty_days(self):
+    self.broker.missing = {datetime.date(2026, 9, 7), datetime.date(2026, 9, 8)}
+    bars = self.store.get("AAPL", datetime.date(2026, 9, 7), datetime.date(2026, 9, 9))
+    self.assertEqual(len(bars["time"]), 3)
+    days = self.index()
+    self.assertEqual(days["2026-09-07"][1], 0)
+    self.assertNotIn("2026-09-08", days)
+
+    self.broker.missing = set()
+    self.broker.calls = []
+    bars = self.store.get("AAPL", datetime.date(2026, 9, 7), datetime.date(2026, 9, 9))
+    self.assertEqual(self.broker.calls, [(datetime.date(2026, 9, 8), datetime.date(2026, 9, 8))])
+    self.assertEqual(len(bars["time"]), 6)
+
+  # A failed window raises, the windows that arrived are stored and only the failed one is fetched again
+  def test_failed_window(self):
+    fetch_window = self.broker.fetch_window
+
+    def failing_window(symbol, start_date, end_date):
+      if start_date <= datetime.date(2026, 9, 21) <= end_date:
+        raise ValueError("Broker Error: 500")
+      return fetch_window(symbol, start_date, end_date)
+
+    self.fetcher.fetch_window = failing_window
+    with self.assertRaises(ValueError):
+      self.store.get("AAPL", datetime.date(2026, 9, 14), datetime.date(2026, 9, 25))
+    self.assertEqual(sorted(self.index().keys()), ["2026-09-14", "2026-09-15", "2026-09-16", "2026-09-17", "2026-09-18", "2026-09-24", "2026-09-25"])
+
+    self.fetcher.fetch_window = fetch_window
+    self.broker.calls = []
+    bars = self.store.get("AAPL", datetime.date(2026, 9, 14), datetime.date(2026, 9, 25))
+    self.assertEqual(self.broker.calls, [(datetime.date(2026, 9, 21), datetime.date(2026, 9, 23))])
+    self.assertEqual(len(bars["time"]), 30)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,59 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import datetime
+import unittest
+
+# Custom Modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import clock_class
+
+class TEST_CLOCK(unittest.TestCase):
+  def setUp(self):
+    self.clock = clock_class.CLOCK()
+
+  def test_parse(self):
+    expected = datetime.datetime(2021, 1, 5, 14, 30)
+    for value in ["2021-01-05T14:30:00Z", "2021-01-05 14:30:00 +0000", "2021-01-05T09:30:00-05:00", "2021-01-05T14:30:00.617Z"]:
+      self.assertEqual(self.clock.parse(value), expected, value)
+    self.assertEqual(self.clock.parse("2021-01-05 09:30"), datetime.datetime(2021, 1, 5, 9, 30))
+    self.assertEqual(self.clock.epoch("2021-01-05T14:30:00Z"), 1609857000)
+
+  # Each distinct string is parsed once, repeats come from the cache
+  def test_parse_cache(self):
+    clock_class.parse_date.cache_clear()
+    first = self.clock.parse("2026-10-16T14:30:00Z")
+    for count in range(10):
+      self.assertIs(self.clock.parse("2026-10-16T14:30:00Z"), first)
+    self.clock.parse("2026-10-16T14:31:00Z")
+    info = clock_class.parse_date.cache_info()
+    self.assertEqual((info.hits, info.misses, info.currsize), (10, 2, 2))
+
+    # A datetime is passed through without touching the cache
+    self.assertIs(self.clock.parse(first), first)
+    self.assertEqual(clock_class.parse_date.cache_info().misses, 2)
+
+  # New York is UTC-4 in the summer and UTC-5 in the winter
+  def test_dst_offset(self):
+    self.assertEqual(self.clock.parse("2026-07-01T09:30:00-04:00"), datetime.datetime(2026, 7, 1, 13, 30))
+    self.assertEqual(self.clock.parse("2026-12-01T09:30:00-05:00"), datetime.datetime(2026, 12, 1, 14, 30))
+
+  def test_cycle(self):
+    self.assertIsNone(self.clock.current_cycle())
+    with self.clock.cycle():
+      first = self.clock.now()
+      cycle_id = self.clock.current_cycle()
+      with self.clock.cycle():
+        self.assertEqual(self.clock.current_cycle(), cycle_id)
+      self.assertEqual(self.clock.now(), first)
+      utc = self.clock.now("UTC")
+      local = self.clock.now("America/New_York")
+      self.assertIn((utc - local).total_seconds(), [4 * 3600, 5 * 3600])
+    self.assertIsNone(self.clock.current_cycle())
+    with self.clock.cycle():
+      self.assertEqual(self.clock.current_cycle(), cycle_id + 1)
+
+if __name__ == "__main__":
+  unittest.main()
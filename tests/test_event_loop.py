@@ -0,0 +1,139 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import unittest
+
+# Custom Modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import clock_class
+import quote_bus_class
+import event_loop_class
+
+#
+# Broker stand in, records when each order call ran and for which symbols
+#   market_delay makes every market check after the first one slow
+#
+class FAKE_BROKER:
+  broker = "fake"
+  stock_list = ["AAPL", "MSFT"]
+  current_spend = 0
+
+  def __init__(self, filename):
+    self.quote_bus = quote_bus_class.QUOTE_BUS(filename)
+    self.clock = clock_class.CLOCK()
+    self.calls = []
+    self.market_checks = 0
+    self.market_delay = 0
+
+  def market_open(self, delay=0):
+    self.market_checks += 1
+    if self.market_checks > 1:
+      time.sleep(self.market_delay)
+    return True
+
+  def seconds_until_close(self):
+    return 3600
+
+  def seconds_until_open(self, delay=0):
+    return 0
+
+  def place_orders(self, symbols=None):
+    self.calls.append(("place", time.monotonic(), symbols))
+
+  def cancel_orders(self):
+    self.calls.append(("cancel", time.monotonic(), None))
+
+class TEST_EVENT_LOOP(unittest.TestCase):
+  def setUp(self):
+    self.temp_dir = tempfile.TemporaryDirectory()
+    filename = os.path.join(self.temp_dir.name, "quote_bus")
+    self.writer = quote_bus_class.QUOTE_BUS(filename, writer=True, capacity=8)
+    self.writer.open()
+    for symbol in FAKE_BROKER.stock_list:
+      self.writer.register(symbol)
+    self.broker = FAKE_BROKER(filename)
+    file_data = {
+      "delay_market_open": 0,
+      "sleep_timer": 2,
+      "asyncio": {"quote_poll": 0.01, "symbol_cycle": 0.3},
+      "fake": {"cancel_order_in_minutes": 10}
+    }
+    self.event_loop = event_loop_class.EVENT_LOOP(self.broker, file_data)
+    self.writes = []
+
+  def tearDown(self):
+    self.writer.close()
+    self.temp_dir.cleanup()
+
+  # Run the event loop while writing AAPL quotes every 20ms from start to end (seconds)
+  def run_loop(self, start, end, run_time):
+    async def write_quotes():
+      await asyncio.sleep(start)
+      price = 100
+      while time.monotonic() < self.start_time + end:
+        price += 0.01
+        self.writer.write("AAPL", price, price + 0.02, price + 0.01)
+        self.writes.append(time.monotonic())
+        await asyncio.sleep(0.02)
+
+    async def main():
+      task = asyncio.ensure_future(self.event_loop.main())
+      await write_quotes()
+      try:
+        await asyncio.wait_for(asyncio.shield(task), run_time - end)
+      except asyncio.TimeoutError:
+        task.cancel()
+
+    self.start_time = time.monotonic()
+    try:
+      asyncio.run(main())
+    except asyncio.CancelledError:
+      pass
+
+  def place_calls(self, symbols):
+    return [call_time - self.start_time for kind, call_time, each in self.broker.calls if kind == "place" and each == symbols]
+
+  # The market open runs one full cycle, new quotes then only run the symbol that changed
+  def test_quote_cycle(self):
+    self.run_loop(0.5, 1.4, 1.6)
+    self.assertEqual(len(self.place_calls(None)), 1)
+    self.assertEqual(len([each for each in self.broker.calls if each[0] == "cancel"]), 1)
+
+    aapl = self.place_calls(["AAPL"])
+    self.assertEqual(self.place_calls(["MSFT"]), [])
+
+    # Well before the sleep_timer, and about once per symbol_cycle after that
+    self.assertLess(aapl[0] - (self.writes[0] - self.start_time), 0.15)
+    self.assertTrue(3 <= len(aapl) <= 4, aapl)
+    for pos in range(1, len(aapl)):
+      self.assertGreaterEqual(aapl[pos] - aapl[pos - 1], 0.29)
+
+  # A slow market check runs on its own thread and does not hold up an order
+  #   The second market check starts at the sleep_timer and takes a second
+  def test_slow_market_check(self):
+    self.broker.market_delay = 1
+    self.run_loop(2.4, 2.5, 2.65)
+    self.assertEqual(self.broker.market_checks, 2)
+    aapl = self.place_calls(["AAPL"])
+    self.assertEqual(len(aapl), 1)
+    self.assertLess(aapl[0] - (self.writes[0] - self.start_time), 0.15)
+
+  def test_symbol_wait(self):
+    self.event_loop.symbols = {"AAPL", "MSFT"}
+    self.event_loop.symbol_time = {"AAPL": 10.0}
+    self.assertEqual(self.event_loop.due_symbols(10.1), ["MSFT"])
+    self.assertLess(self.event_loop.next_symbol_wait(10.1), 0)
+    self.event_loop.symbols = {"AAPL"}
+    self.assertEqual(self.event_loop.due_symbols(10.1), [])
+    self.assertAlmostEqual(self.event_loop.next_symbol_wait(10.1), 0.2)
+    self.assertEqual(self.event_loop.due_symbols(10.3), ["AAPL"])
+    self.event_loop.symbols = set()
+    self.assertIsNone(self.event_loop.next_symbol_wait(10.3))
+
+if __name__ == "__main__":
+  unittest.main()
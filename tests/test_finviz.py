@@ -0,0 +1,154 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import logging
+import unittest
+import threading
+from werkzeug.serving import make_server
+from werkzeug.wrappers import Request, Response
+
+# Custom Modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import finviz_class
+
+#
+# FinViz stand in, pages of page_size symbols starting at the "r" row with an ETag per result set
+#   Rows in "failing" answer with a 500
+#
+class FAKE_FINVIZ:
+  page_size = 20
+
+  def __init__(self):
+    self.symbols = []
+    self.etag = '"v1"'
+    self.failing = set()
+    self.calls = []
+    self.lock = threading.Lock()
+
+  def page(self, start_row):
+    rows = ["%s|%s|Company %s" % (symbol, pos, symbol) for pos, symbol in enumerate(self.symbols[start_row - 1:start_row - 1 + self.page_size], start_row)]
+    return "<html><td>Total: </b>%s #%s</td>\n<!-- TS\n%s\nTE -->\n<table>|NOT|A|SYMBOL|</table></html>" % (len(self.symbols), start_row, "\n".join(rows))
+
+  def app(self, environ, start_response):
+    request = Request(environ)
+    start_row = int(request.args.get("r", 1))
+    with self.lock:
+      self.calls.append((start_row, request.headers.get("If-None-Match")))
+    if start_row in self.failing:
+      return Response("busy", status=500)(environ, start_response)
+    if request.headers.get("If-None-Match") == self.etag:
+      return Response(status=304)(environ, start_response)
+    return Response(self.page(start_row), headers={"ETag": self.etag})(environ, start_response)
+
+class TEST_FINVIZ(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.fake = FAKE_FINVIZ()
+    cls.server = make_server("127.0.0.1", 0, cls.fake.app, threaded=True)
+    cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+    cls.thread.start()
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.server.shutdown()
+    cls.thread.join()
+
+  def setUp(self):
+    self.fake.symbols = ["S%03d" % pos for pos in range(15)]
+    self.fake.etag = '"v1"'
+    self.fake.failing = set()
+    self.fake.calls = []
+    self.finviz = finviz_class.FINVIZ(ttl=300, min_interval=0)
+    self.finviz.url = "http://127.0.0.1:%s/screener.ashx" % self.server.port
+
+  def test_parse(self):
+    text = self.fake.page(1)
+    self.assertEqual(self.finviz.parse_symbols(text), self.fake.symbols)
+    self.assertEqual(self.finviz.parse_total(text), 15)
+    self.assertEqual(self.finviz.parse_total("<td>45 Total</td>"), 45)
+    self.assertIsNone(self.finviz.parse_total("<td>Nothing</td>"))
+    self.assertEqual(self.finviz.parse_symbols("<html>no results</html>"), [])
+
+    # A page cut off before "TE -->" keeps the rows that arrived
+    self.assertEqual(self.finviz.parse_symbols("<!-- TS\nAAPL|1\n\nMSFT|2\n"), ["AAPL", "MSFT"])
+
+  # Within the ttl nothing is asked for, after it a 304 keeps the cached symbols
+  def test_cache(self):
+    param = "v=111&f=sh_price_1to10"
+    self.assertEqual(self.finviz.get_symbols(param), self.fake.symbols)
+    self.assertEqual(self.finviz.get_symbols(param), self.fake.symbols)
+    self.assertEqual(self.fake.calls, [(1, None)])
+
+    self.finviz.cache[param]["expires"] = 0
+    # Nothing is parsed for a 304
+    self.finviz.parse_symbols = None
+    self.assertEqual(self.finviz.get_symbols(param), self.fake.symbols)
+    self.assertEqual(self.fake.calls[-1], (1, '"v1"'))
+    del self.finviz.parse_symbols
+
+    # A new result set comes with a new ETag and is downloaded again
+    self.finviz.cache[param]["expires"] = 0
+    self.fake.symbols = ["AAPL", "MSFT"]
+    self.fake.etag = '"v2"'
+    self.assertEqual(self.finviz.get_symbols(param), ["AAPL", "MSFT"])
+    self.assertEqual(self.finviz.cache[param]["etag"], '"v2"')
+
+  # A failed revalidation keeps what was cached, a failed first request gives nothing
+  def test_failed(self):
+    param = {"v": "111", "f": "sh_price_1to10"}
+    self.finviz.get_symbols(param)
+    self.finviz.cache[self.finviz.cache_key(param)]["expires"] = 0
+    self.fake.failing = {1}
+    logging.disable(logging.CRITICAL)
+    try:
+      self.assertEqual(self.finviz.get_symbols(param), self.fake.symbols)
+      self.assertEqual(self.finviz.get_symbols("v=111"), [])
+    finally:
+      logging.disable(logging.NOTSET)
+    self.assertEqual(self.finviz.get_symbols(None), None)
+
+  # Every page is read, in page order, for string and dictionary parameters
+  def test_pages(self):
+    self.fake.symbols = ["S%03d" % pos for pos in range(45)]
+    self.assertEqual(self.finviz.get_symbols("v=111"), self.fake.symbols)
+    self.assertEqual(sorted(each[0] for each in self.fake.calls), [1, 21, 41])
+    self.assertEqual(self.finviz.page_times["v=111"][0][2], 20)
+    self.assertEqual([each[2] for each in self.finviz.page_times["v=111"][1:]], [20, 5])
+
+    param = {"v": "111"}
+    self.assertEqual(self.finviz.get_symbols(param), self.fake.symbols)
+    self.assertEqual(self.finviz.page_param(param, 21), {"v": "111", "r": 21})
+    self.assertEqual(self.finviz.page_param("v=111", 1), "v=111")
+
+  # Rows past max_pages are left out, repeats from shifted pages are dropped
+  def test_max_pages(self):
+    self.fake.symbols = ["S%03d" % pos for pos in range(30)] + ["S%03d" % pos for pos in range(20, 50)]
+    self.finviz.max_pages = 2
+    logging.disable(logging.CRITICAL)
+    try:
+      data = self.finviz.get_symbols("v=111")
+    finally:
+      logging.disable(logging.NOTSET)
+    self.assertEqual(data, ["S%03d" % pos for pos in range(30)])
+    self.assertEqual(sorted(each[0] for each in self.fake.calls), [1, 21])
+
+  # An incomplete result set is kept without an ETag, so it is downloaded again after the ttl
+  def test_failed_page(self):
+    self.fake.symbols = ["S%03d" % pos for pos in range(45)]
+    self.fake.failing = {21}
+    logging.disable(logging.CRITICAL)
+    try:
+      self.assertEqual(self.finviz.get_symbols("v=111"), self.fake.symbols[:20] + self.fake.symbols[40:])
+    finally:
+      logging.disable(logging.NOTSET)
+    self.assertIsNone(self.finviz.cache["v=111"]["etag"])
+
+    self.fake.failing = set()
+    self.finviz.cache["v=111"]["expires"] = 0
+    self.assertEqual(self.finviz.get_symbols("v=111"), self.fake.symbols)
+    self.assertIn((1, None), self.fake.calls[-3:])
+
+if __name__ == "__main__":
+  unittest.main()
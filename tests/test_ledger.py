@@ -0,0 +1,109 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import datetime
+import unittest
+
+# Custom Modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ledger_class
+
+#
+# Broker stand in, yields its trades and can fail after the first one
+#
+class FAKE_BROKER:
+  broker = "fake"
+
+  def __init__(self, trades):
+    self.trades = trades
+    self.fail = False
+    self.days_back = []
+
+  def iter_closed_trades(self, days_back=0, raise_on_failure=False):
+    self.days_back.append(days_back)
+    for pos, trade in enumerate(self.trades):
+      if self.fail and pos > 0:
+        raise ValueError("Broker Error: 500")
+      yield trade
+
+def make_trade(trade_id, symbol, days_ago, buy_amount, sell_amount, fees=0):
+  close_date = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0) - datetime.timedelta(days=days_ago)
+  open_date = close_date - datetime.timedelta(seconds=60)
+  return {"trade_id": trade_id, "symbol": symbol, "open_time": open_date.strftime("%Y-%m-%d %H:%M:%S"), "close_time": close_date.strftime("%Y-%m-%d %H:%M:%S"), "qty": 1, "buy_amount": buy_amount, "sell_amount": sell_amount, "fees": fees}
+
+class TEST_LEDGER(unittest.TestCase):
+  def setUp(self):
+    self.ledger = ledger_class.LEDGER(":memory:")
+    self.ledger.batch_size = 2
+    self.broker = FAKE_BROKER([
+      make_trade("1", "AAPL", 0, 128.10, 128.20, 0.5),
+      make_trade("2", "AAPL", 0, 128.10, 128.15),
+      make_trade("3", "MSFT", 5, 210.00, 210.30),
+    ])
+
+  def tearDown(self):
+    self.ledger.close()
+
+  def test_sync(self):
+    self.assertIsNone(self.ledger.last_sync("fake"))
+    self.assertEqual(self.ledger.sync(self.broker), 3)
+    self.assertEqual(self.broker.days_back, [self.ledger.initial_days])
+    self.assertIsNotNone(self.ledger.last_sync("fake"))
+
+    # Only the overlap is asked for again and the repeats are skipped
+    self.assertEqual(self.ledger.sync(self.broker), 0)
+    self.assertEqual(self.broker.days_back[-1], self.ledger.overlap_days)
+
+  # A failed sync keeps what arrived, but the next one starts from the old watermark
+  def test_failed_sync(self):
+    self.broker.fail = True
+    self.assertEqual(self.ledger.sync(self.broker), 1)
+    self.assertIsNone(self.ledger.last_sync("fake"))
+
+    self.broker.fail = False
+    self.assertEqual(self.ledger.sync(self.broker), 2)
+    self.assertEqual(self.broker.days_back, [self.ledger.initial_days, self.ledger.initial_days])
+
+  def test_max_days(self):
+    self.broker.ledger_max_days = 89
+    self.ledger.sync(self.broker, days_back=400)
+    self.assertEqual(self.broker.days_back, [89])
+
+  def test_reports(self):
+    self.ledger.sync(self.broker)
+    data = self.ledger.summary("fake", days_back=0)
+    self.assertEqual(list(data.keys()), ["Summary", "AAPL"])
+    self.assertEqual((data["AAPL"]["success_counter"], data["AAPL"]["profit"], data["AAPL"]["fees"], data["AAPL"]["avg_trans_per_sec"]), (2, 0.15, 0.5, 60))
+    self.assertEqual(self.ledger.summary("fake", days_back=7)["Summary"]["Total_Profit"], 0.45)
+    self.assertEqual(self.ledger.summary("other", days_back=7), {"Summary": {"Total_Profit": 0}})
+
+    self.assertEqual([each["trade_id"] for each in self.ledger.trades("fake", days_back=7)], ["3", "1", "2"])
+    self.assertEqual([each["trade_id"] for each in self.ledger.trades("fake", days_back=7, symbol="msft")], ["3"])
+
+  # 14:30 UTC is 09:30 in New York before the DST change and 10:30 after it,
+  #   00:30 UTC on a Saturday is still Friday evening in New York
+  def test_hour_totals(self):
+    self.ledger.insert([
+      ["fake", "1", "AAPL", "2026-03-06 14:29:00", "2026-03-06 14:30:00", 1, 100.00, 100.10, 0],
+      ["fake", "2", "AAPL", "2026-03-09 14:29:00", "2026-03-09 14:30:00", 1, 100.00, 100.20, 0],
+      ["fake", "3", "AAPL", "2026-03-09 14:39:00", "2026-03-09 14:40:00", 1, 100.00, 100.30, 0],
+      ["fake", "4", "MSFT", "2026-03-14 00:29:00", "2026-03-14 00:30:00", 1, 200.00, 200.40, 1],
+    ])
+    data = self.ledger.hour_totals("fake", "2026-03-01 00:00:00")
+    self.assertEqual(sorted(data.keys()), [("09:00", "Friday"), ("10:00", "Monday"), ("20:00", "Friday")])
+    self.assertEqual(data[("10:00", "Monday")]["count"], 2)
+    self.assertAlmostEqual(data[("10:00", "Monday")]["profit"], 0.5)
+
+    # until leaves out the trades closed on or after it
+    data = self.ledger.hour_totals("fake", "2026-03-01 00:00:00", until="2026-03-09")
+    self.assertEqual(list(data.keys()), [("09:00", "Friday")])
+
+    totals = self.ledger.symbol_totals("fake", "2026-03-07 00:00:00")
+    self.assertEqual(sorted(totals.keys()), ["AAPL", "MSFT"])
+    self.assertEqual((totals["AAPL"]["success_counter"], round(totals["AAPL"]["total_trans_sec"])), (2, 120))
+    self.assertEqual((totals["MSFT"]["fees"], round(totals["MSFT"]["profit"], 2)), (1, 0.4))
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,79 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import pytz
+import datetime
+import unittest
+
+# Custom Modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import market_session_class
+
+class TEST_MARKET_SESSION(unittest.TestCase):
+  def setUp(self):
+    self.session = market_session_class.MARKET_SESSION()
+    self.use_tz = pytz.timezone("America/New_York")
+
+  def local(self, year, month, day, hour, minute):
+    return self.use_tz.localize(datetime.datetime(year, month, day, hour, minute))
+
+  def test_holidays_2026(self):
+    holidays = self.session.local_holidays(2026)
+    closed = sorted(day for day, end in holidays.items() if end is None)
+    self.assertEqual([day.strftime("%Y-%m-%d") for day in closed], [
+      "2026-01-01", "2026-01-19", "2026-02-16", "2026-04-03", "2026-05-25",
+      "2026-06-19", "2026-07-03", "2026-09-07", "2026-11-26", "2026-12-25"])
+    early = sorted(day.strftime("%Y-%m-%d") for day, end in holidays.items() if end)
+    self.assertEqual(early, ["2026-11-27", "2026-12-24"])
+
+  # A Saturday New Years Day is not observed on the Friday before
+  def test_new_year_saturday(self):
+    holidays = self.session.local_holidays(2022)
+    self.assertNotIn(datetime.date(2021, 12, 31), holidays)
+    self.assertNotIn(datetime.date(2022, 1, 1), holidays)
+
+  def test_easter(self):
+    self.assertEqual(self.session.easter(2024), datetime.date(2024, 3, 31))
+    self.assertEqual(self.session.easter(2025), datetime.date(2025, 4, 20))
+    self.assertEqual(self.session.easter(2026), datetime.date(2026, 4, 5))
+
+  def test_local_month(self):
+    self.session.add_local_month(2026, 11)
+    self.assertIsNone(self.session.get_session(datetime.date(2026, 11, 26)))
+    self.assertIsNone(self.session.get_session(datetime.date(2026, 11, 28)))
+    start_date, end_date = self.session.get_session(datetime.date(2026, 11, 27))
+    self.assertEqual(end_date.strftime("%H:%M"), "13:00")
+    self.assertTrue(self.session.has_month(2026, 11))
+
+  # The session is fixed in New York time, so its UTC hours move with daylight saving
+  def test_dst(self):
+    self.session.add_local_month(2026, 3)
+    before = self.session.get_session(datetime.date(2026, 3, 6))[0].astimezone(pytz.utc)
+    after = self.session.get_session(datetime.date(2026, 3, 9))[0].astimezone(pytz.utc)
+    self.assertEqual(before.strftime("%H:%M"), "14:30")
+    self.assertEqual(after.strftime("%H:%M"), "13:30")
+
+  def test_open_and_close(self):
+    self.session.add_local_month(2026, 10)
+    self.assertFalse(self.session.is_open(cur_date=self.local(2026, 10, 16, 9, 29)))
+    self.assertTrue(self.session.is_open(cur_date=self.local(2026, 10, 16, 9, 30)))
+    self.assertFalse(self.session.is_open(delay=60, cur_date=self.local(2026, 10, 16, 9, 30)))
+    self.assertEqual(self.session.seconds_until_close(self.local(2026, 10, 16, 15, 0)), 3600)
+    self.assertIsNone(self.session.seconds_until_close(self.local(2026, 10, 17, 12, 0)))
+
+    # Friday after the close to Monday morning
+    self.assertEqual(self.session.seconds_until_open(cur_date=self.local(2026, 10, 16, 17, 0)), (64 * 3600) + 1800)
+    self.assertEqual(self.session.seconds_until_open(cur_date=self.local(2026, 10, 16, 10, 0)), 0)
+
+  def test_calendar_not_loaded(self):
+    self.assertIsNone(self.session.seconds_until_open(cur_date=self.local(2026, 10, 16, 17, 0)))
+
+  def test_set_session(self):
+    self.session.add_local_month(2026, 10)
+    self.session.set_session(self.local(2026, 10, 16, 9, 30), self.local(2026, 10, 16, 12, 0))
+    self.assertFalse(self.session.is_open(cur_date=self.local(2026, 10, 16, 12, 1)))
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,92 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import logging
+import datetime
+import tempfile
+import unittest
+import threading
+from werkzeug.serving import make_server
+
+# Custom Modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ledger_class
+import tradier_class
+import mock_server_class
+
+#
+# Tradier against the mock broker over HTTP
+#
+class TEST_LEDGER_TRADIER(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.mock = mock_server_class.MOCK_SERVER({"mock_broker": {"fill_model": "never"}})
+    cls.server = make_server("127.0.0.1", 0, cls.mock.app, threaded=True)
+    cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+    cls.thread.start()
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.server.shutdown()
+    cls.thread.join()
+
+  def setUp(self):
+    self.temp_dir = tempfile.TemporaryDirectory()
+    self.ledger = ledger_class.LEDGER(os.path.join(self.temp_dir.name, "ledger.db"))
+    self.mock.error_rate = 0
+    with self.mock.lock:
+      self.mock.orders = []
+      self.mock.order_ids = {}
+
+    file_data = {
+      "http": {"retries": 0},
+      "tradier": {
+        "sandbox": False, "base_url": "http://127.0.0.1:%s" % self.server.port, "account_id": "A1", "access_token": "t",
+        "account_type": "cash", "cancel_order_in_minutes": 15, "stocks": {"AAPL": {"profit": 0.01, "qty": 1}},
+        "bars": {"store_dir": self.temp_dir.name}
+      }
+    }
+    self.broker = tradier_class.TRADIER_CLASS(file_data=file_data)
+    self.broker.gainloss_limit = 2
+
+  def tearDown(self):
+    self.ledger.close()
+    self.temp_dir.cleanup()
+
+  # Add a round trip that closed days_ago days back
+  def add_closed(self, symbol, days_ago, buy_price, sell_price):
+    order = self.mock.add_order(symbol, 1, buy_price, sell_price)
+    sell_time = self.mock.now() - datetime.timedelta(days=days_ago)
+    with self.mock.lock:
+      order.update({"buy_status": "filled", "sell_status": "filled", "buy_time": sell_time - datetime.timedelta(seconds=60), "sell_time": sell_time})
+    return order
+
+  def test_sync(self):
+    self.add_closed("AAPL", 0, 100.00, 100.05)
+    self.add_closed("AAPL", 1, 100.00, 100.10)
+    self.add_closed("MSFT", 3, 200.00, 200.20)
+
+    # Three closed positions over two gainloss pages
+    self.assertEqual(self.ledger.sync(self.broker), 3)
+    self.assertIsNotNone(self.ledger.last_sync("tradier"))
+    self.assertEqual(self.ledger.summary("tradier", days_back=7)["Summary"]["Total_Profit"], 0.35)
+    self.assertEqual(self.ledger.summary("tradier", days_back=0)["AAPL"]["avg_trans_per_sec"], 60)
+
+    self.add_closed("AAPL", 0, 100.00, 100.01)
+    self.assertEqual(self.ledger.sync(self.broker), 1)
+    self.assertEqual(len(list(self.ledger.trades("tradier", days_back=7))), 4)
+
+  def test_failed_sync(self):
+    self.add_closed("AAPL", 0, 100.00, 100.05)
+    self.mock.error_rate = 1
+    logging.disable(logging.CRITICAL)
+    try:
+      self.assertEqual(self.ledger.sync(self.broker), 0)
+    finally:
+      logging.disable(logging.NOTSET)
+    self.assertIsNone(self.ledger.last_sync("tradier"))
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,40 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import numpy
+import unittest
+
+# Custom Modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import price_gap_class
+
+class TEST_PRICE_GAP(unittest.TestCase):
+  def test_histogram(self):
+    gap = price_gap_class.PRICE_GAP([10.00, 10.02, 10.05, 10.01], [10.01, 10.02, 10.00, 10.02])
+    self.assertEqual(gap.to_dict(), {0.0: 1, 0.01: 2, 0.05: 1})
+    self.assertEqual(gap.total, 4)
+    self.assertEqual(gap.cdf(), {0.0: 0.25, 0.01: 0.75, 0.05: 1.0})
+    self.assertEqual(gap.summary(), {"bars": 4, "mean_gap": 0.0175, "max_gap": 0.05, "percentiles": {50: 0.01, 75: 0.01, 90: 0.01, 95: 0.01, 99: 0.01}})
+
+  def test_empty(self):
+    gap = price_gap_class.PRICE_GAP([], [])
+    self.assertEqual(gap.to_dict(), {})
+    self.assertEqual(gap.percentiles(), {})
+    self.assertEqual(gap.summary(), {"bars": 0})
+
+  # The percentiles come from the counts only and match numpy over the gaps
+  def test_percentiles(self):
+    rng = numpy.random.default_rng(1)
+    for size in [1, 2, 7, 1000]:
+      open_prices = rng.uniform(10, 20, size).round(2)
+      close_prices = (open_prices + rng.normal(0, 0.05, size)).round(2)
+      gap = price_gap_class.PRICE_GAP(open_prices, close_prices)
+      cents = numpy.rint(numpy.abs(close_prices - open_prices) * 100)
+      expected = numpy.percentile(cents, gap.percentile_list, method="lower")
+      self.assertEqual(list(gap.percentiles().values()), [round(each / 100, 2) for each in expected])
+      self.assertEqual(gap.summary()["mean_gap"], round(cents.mean() / 100, 4))
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,130 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import time
+import tempfile
+import unittest
+import threading
+
+# Custom Modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import quote_bus_class
+
+class TEST_QUOTE_BUS(unittest.TestCase):
+  def setUp(self):
+    self.temp_dir = tempfile.TemporaryDirectory()
+    self.filename = os.path.join(self.temp_dir.name, "quote_bus")
+    self.writer = quote_bus_class.QUOTE_BUS(self.filename, writer=True, capacity=8)
+    self.writer.open()
+    self.reader = quote_bus_class.QUOTE_BUS(self.filename)
+    self.reader.remap_interval = 0
+
+  def tearDown(self):
+    self.reader.close()
+    self.writer.close()
+    self.temp_dir.cleanup()
+
+  def test_write_read(self):
+    self.writer.write("AAPL", 128.10, 128.12, 128.11)
+    bid, ask, last, updated = self.reader.read("AAPL")
+    self.assertEqual((bid, ask, last), (128.10, 128.12, 128.11))
+    self.assertEqual(self.reader["AAPL"], {"Bid": 128.10, "Ask": 128.12, "Last": 128.11})
+    self.assertEqual(self.reader.generation(), 1)
+
+  # Any spelling of a symbol uses the same slot
+  def test_symbol_case(self):
+    self.assertEqual(self.writer.register("aapl"), 0)
+    self.writer.write("AAPL", 1.0, 2.0, 3.0)
+    self.writer.write("Aapl", float("nan"), 2.5, float("nan"))
+    self.assertEqual(self.writer.symbols(), ["AAPL"])
+    self.assertEqual(self.reader.read("aapl")[:3], (1.0, 2.5, 3.0))
+    self.assertEqual(self.reader["aApL"], {"Bid": 1.0, "Ask": 2.5, "Last": 3.0})
+    self.assertIn("aapl", self.reader)
+
+  # A NaN keeps the value already in the slot
+  def test_partial_update(self):
+    self.writer.write("AAPL", 1.0, 2.0, 3.0)
+    self.writer.update("AAPL", {"Bid": "1.5"})
+    self.assertEqual(self.reader.read("AAPL")[:3], (1.5, 2.0, 3.0))
+
+  def test_unknown_and_unwritten(self):
+    self.assertIsNone(self.reader.read("MSFT"))
+    self.writer.register("MSFT")
+    self.assertIsNone(self.reader.read("MSFT"))
+    self.assertNotIn("MSFT", self.reader)
+
+  # A read while another thread writes always sees one whole write
+  def test_seqlock(self):
+    self.writer.register("AAPL")
+    stop = threading.Event()
+
+    def write_loop():
+      count = 0
+      while not stop.is_set():
+        count += 1
+        self.writer.write("AAPL", float(count), float(count), float(count))
+
+    thread = threading.Thread(target=write_loop)
+    thread.start()
+    try:
+      seen = 0
+      end_time = time.monotonic() + 0.5
+      while time.monotonic() < end_time:
+        values = self.reader.read("AAPL")
+        if values is None:
+          continue
+        seen += 1
+        self.assertEqual(values[0], values[1])
+        self.assertEqual(values[1], values[2])
+    finally:
+      stop.set()
+      thread.join()
+    self.assertGreater(seen, 0)
+
+  # An odd sequence is a write in progress, the reader gives up instead of returning it
+  def test_torn_slot(self):
+    self.writer.write("AAPL", 1.0, 2.0, 3.0)
+    offset = self.writer.header_size
+    cur_seq = self.writer.seq.unpack_from(self.writer.mm, offset)[0]
+    self.writer.seq.pack_into(self.writer.mm, offset, cur_seq + 1)
+    self.reader.max_read_retry = 10
+    self.assertIsNone(self.reader.read("AAPL"))
+
+  # The reader follows the writer to a recreated file
+  def test_remap(self):
+    self.writer.write("AAPL", 1.0, 2.0, 3.0)
+    self.assertEqual(self.reader.read("AAPL")[0], 1.0)
+    old_inode = self.reader.inode
+
+    self.writer.close()
+    self.writer = quote_bus_class.QUOTE_BUS(self.filename, writer=True, capacity=16)
+    self.writer.open()
+    self.writer.write("MSFT", 5.0, 6.0, 7.0)
+
+    self.assertEqual(self.reader.read("MSFT")[0], 5.0)
+    self.assertNotEqual(self.reader.inode, old_inode)
+    self.assertIsNone(self.reader.read("AAPL"))
+
+  # A stale quote is only served while the writer heartbeat is fresh
+  def test_max_age(self):
+    self.writer.write("AAPL", 1.0, 2.0, 3.0)
+    offset = self.writer.header_size + 48
+    self.writer.stamp.pack_into(self.writer.mm, offset, time.time() - 600)
+    self.assertIsNone(self.reader.read("AAPL"))
+    self.writer.touch()
+    self.assertEqual(self.reader.read("AAPL")[0], 1.0)
+
+  def test_long_symbol(self):
+    self.assertIsNone(self.writer.register("A" * 17))
+    self.assertFalse(self.writer.write("A" * 17, 1.0, 2.0, 3.0))
+    self.assertEqual(self.writer.symbols(), [])
+
+  def test_full(self):
+    for pos in range(8):
+      self.assertEqual(self.writer.register("S%s" % pos), pos)
+    self.assertIsNone(self.writer.register("S8"))
+
+if __name__ == "__main__":
+  unittest.main()
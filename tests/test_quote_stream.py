@@ -0,0 +1,167 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import time
+import logging
+import threading
+import unittest
+
+# Custom Modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import quote_stream_class
+
+#
+# Streaming response stand in, gives its lines and then stays silent until closed when block is set
+#
+class FAKE_RESPONSE:
+  status_code = 200
+
+  def __init__(self, lines, block=False):
+    self.lines = lines
+    self.block = block
+    self.closed = threading.Event()
+
+  def iter_lines(self):
+    for line in self.lines:
+      yield line
+    if self.block:
+      self.closed.wait(5)
+
+  def close(self):
+    self.closed.set()
+
+#
+# Transport stand in, records each url asked for and hands out silent responses
+#
+class FAKE_TRANSPORT:
+  connect_timeout = 1
+
+  def __init__(self):
+    self.urls = []
+
+  def get(self, url, **kwargs):
+    self.urls.append(url)
+    return FAKE_RESPONSE([], block=True)
+
+  def backoff_time(self, attempt):
+    return 0
+
+class FAKE_BROKER:
+  base_url = "http://broker"
+
+  def __init__(self):
+    self.transport = FAKE_TRANSPORT()
+
+  def handle_auth(self):
+    return "token"
+
+class FAKE_QUOTE_BUS:
+  def __init__(self):
+    self.writes = []
+    self.touches = 0
+
+  def write(self, symbol, bid, ask, last):
+    self.writes.append((symbol, bid, ask, last))
+
+  def touch(self):
+    self.touches += 1
+
+class TEST_QUOTE_STREAM(unittest.TestCase):
+  def setUp(self):
+    self.broker = FAKE_BROKER()
+    self.quote_bus = FAKE_QUOTE_BUS()
+
+  def wait_for(self, check, timeout=5):
+    end_time = time.monotonic() + timeout
+    while time.monotonic() < end_time:
+      if check():
+        return True
+      time.sleep(0.02)
+    return False
+
+  def stream(self, symbols, lines, file_data=None):
+    stream = quote_stream_class.QUOTE_STREAM(self.broker, self.quote_bus, symbols, file_data)
+    stream.running = True
+    self.broker.transport.get = lambda url, **kwargs: FAKE_RESPONSE(lines)
+    stream.stream_shard(stream.shards[0], "http://broker")
+    return stream
+
+  # Quoted, bare and exponent values are read from the bytes, only changes are written
+  def test_decode(self):
+    lines = [
+      b'{"Symbol":"AAPL","Bid":"128.10","Ask":"128.20","Last":"128.15","Volume":"100"}',
+      b'{"Heartbeat":1,"Timestamp":"2026-10-16T14:30:00Z"}',
+      b'',
+      b'{"Symbol":"AAPL","Bid":"128.10","Ask":"128.20","Last":"128.15","Volume":"200"}',
+      b'{"Symbol":"TSLA","Bid":"250.00","Ask":"250.10","Last":"250.05"}',
+      b'{"Symbol": "MSFT", "Bid": 210.5, "Ask": "2.106E2", "Last": -1}',
+      b'{"Symbol":"AAPL","Last":"128.16"}'
+    ]
+    stream = self.stream(["aapl", "MSFT", "AAPL"], lines)
+    self.assertEqual(stream.shards[0]["symbols"], ["AAPL", "MSFT"])
+    self.assertEqual(self.quote_bus.writes, [("AAPL", 128.10, 128.20, 128.15), ("MSFT", 210.5, 210.6, -1.0), ("AAPL", 128.10, 128.20, 128.16)])
+    self.assertEqual(self.quote_bus.touches, 6)
+    self.assertEqual(stream.shards[0]["messages"], 4)
+    self.assertIsNotNone(stream.rates()[0]["lag"])
+
+  # An error message ends the connection, the lines after it are not read
+  def test_stream_error(self):
+    lines = [
+      b'{"Symbol":"AAPL","Bid":"1","Ask":"2","Last":"3"}',
+      b'{"Error":"GoAway","Message":"Connection closed"}',
+      b'{"Symbol":"AAPL","Bid":"4","Ask":"5","Last":"6"}'
+    ]
+    logging.disable(logging.CRITICAL)
+    try:
+      self.stream(["AAPL"], lines)
+    finally:
+      logging.disable(logging.NOTSET)
+    self.assertEqual(self.quote_bus.writes, [("AAPL", 1.0, 2.0, 3.0)])
+
+  # With a flush_interval only the latest quote per symbol waits, the flusher swaps it out and writes it
+  def test_flush(self):
+    lines = [b'{"Symbol":"AAPL","Bid":"%s","Ask":"2","Last":"3"}' % str(price).encode() for price in [1, 1.5, 1.75]]
+    lines.append(b'{"Symbol":"MSFT","Bid":"7","Ask":"8","Last":"9"}')
+    stream = self.stream(["AAPL", "MSFT"], lines, {"stream": {"flush_interval": 0.05}})
+    self.assertEqual(self.quote_bus.writes, [])
+    self.assertEqual(sorted(stream.pending.keys()), [b"AAPL", b"MSFT"])
+
+    threading.Thread(target=stream.flusher, daemon=True).start()
+    try:
+      self.assertTrue(self.wait_for(lambda: len(self.quote_bus.writes) == 2))
+      self.assertEqual(sorted(self.quote_bus.writes), [("AAPL", 1.75, 2.0, 3.0), ("MSFT", 7.0, 8.0, 9.0)])
+      self.assertEqual(stream.pending, {})
+      self.assertIsNotNone(stream.rates()[0]["lag"])
+
+      # Quotes arriving while the flusher runs are all written, the last one per symbol ends up on top
+      self.broker.transport.get = lambda url, **kwargs: FAKE_RESPONSE([b'{"Symbol":"AAPL","Bid":"%s","Ask":"2","Last":"3"}' % str(price).encode() for price in range(10, 500)])
+      stream.stream_shard(stream.shards[0], "http://broker")
+      self.assertTrue(self.wait_for(lambda: self.quote_bus.writes[-1] == ("AAPL", 499.0, 2.0, 3.0)))
+    finally:
+      stream.running = False
+
+  # The watchdog closes a silent shard, which reconnects, and starts a dead shard thread again
+  def test_watchdog(self):
+    stream = quote_stream_class.QUOTE_STREAM(self.broker, self.quote_bus, ["AAPL", "MSFT"], {"stream": {"shard_size": 1, "heartbeat_timeout": 0.3}})
+    silent, dead = stream.shards
+    stream.running = True
+    stream.start_shard(silent)
+    dead["thread"] = threading.Thread(target=lambda: None)
+    dead["thread"].start()
+    dead["thread"].join()
+
+    logging.disable(logging.CRITICAL)
+    try:
+      threading.Thread(target=stream.watchdog, daemon=True).start()
+      urls = self.broker.transport.urls
+      self.assertTrue(self.wait_for(lambda: urls.count("http://broker/marketdata/stream/quotes/AAPL") >= 2 and "http://broker/marketdata/stream/quotes/MSFT" in urls))
+    finally:
+      stream.stop()
+      logging.disable(logging.NOTSET)
+    self.assertGreaterEqual(silent["reconnects"], 1)
+    self.assertGreaterEqual(dead["reconnects"], 1)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,87 @@
+#!/bin/env python3
+
+# Modules
+import io
+import os
+import sys
+import csv
+import json
+import random
+import tempfile
+import unittest
+import itertools
+
+# Custom Modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import report_class
+
+# Each run of rows with the same first group_size columns, capped to its first and last rows
+def capped(rows, group_size, max_rows):
+  data = []
+  for group, group_rows in itertools.groupby(rows, key=lambda row: row[:group_size]):
+    group_rows = list(group_rows)
+    if not max_rows or len(group_rows) <= max_rows:
+      data.extend(group_rows)
+      continue
+    head_size = (max_rows + 1) // 2
+    data.extend(group_rows[:head_size])
+    data.append(len(group_rows) - max_rows)
+    data.extend(group_rows[len(group_rows) - (max_rows - head_size):])
+  return data
+
+class TEST_REPORT(unittest.TestCase):
+  def setUp(self):
+    self.report = report_class.REPORT(max_rows=4)
+    self.report.add_table("Screener <test>", ["Screener", "Symbol", "Time", "Net Price"], [["test", "AAPL", "09:%02d" % each, each / 100] for each in range(10)] + [["test", "MSFT", "09:00", 0.5]], group_size=2)
+    self.report.add_dict("Summary", {"Total_Profit": 1.25})
+
+  def test_cap_rows(self):
+    rng = random.Random(5)
+    for trial in range(200):
+      rows = [[rng.choice("AB"), rng.choice("xy"), pos] for pos in range(rng.randint(0, 30))]
+      rows.sort(key=lambda row: row[:2])
+      group_size = rng.randint(0, 2)
+      max_rows = rng.randint(0, 7)
+      report = report_class.REPORT(max_rows=max_rows)
+      self.assertEqual(report.cap_rows(iter(rows), group_size), capped(rows, group_size, max_rows), (rows, group_size, max_rows))
+
+  def test_add_columns(self):
+    report = report_class.REPORT()
+    report.add_columns("Columns", {"Symbol": ["AAPL", "AMZN"], "Profit": [1.5, -0.25]})
+    self.assertEqual(report.tables, [{"title": "Columns", "columns": ["Symbol", "Profit"], "rows": [["AAPL", 1.5], ["AMZN", -0.25]]}])
+
+  def test_html(self):
+    text = self.report.render()
+    self.assertIn("<h3>Screener &lt;test&gt;</h3>", text)
+    self.assertIn("<tr><td colspan=\"4\">... 6 rows not shown</td></tr>", text)
+    self.assertIn("<tr><td>test</td><td>AAPL</td><td>09:09</td><td>0.09</td></tr>", text)
+    self.assertIn("<tr><td>test</td><td>MSFT</td><td>09:00</td><td>0.5</td></tr>", text)
+    self.assertEqual(text.count("<tr>"), 2 + 4 + 1 + 1 + 1)
+
+  def test_csv(self):
+    rows = list(csv.reader(io.StringIO(self.report.render("csv"))))
+    self.assertEqual(rows[0], ["Table", "Screener", "Symbol", "Time", "Net Price"])
+    self.assertEqual(rows[1], ["Screener <test>", "test", "AAPL", "09:00", "0.0"])
+    self.assertEqual(rows[3], ["Screener <test>", "6 rows not shown"])
+    self.assertEqual(rows[-2:], [["Table", "Description", "Value"], ["Summary", "Total_Profit", "1.25"]])
+
+  def test_json(self):
+    data = json.loads(self.report.render("json"))
+    self.assertEqual(list(data.keys()), ["Screener <test>", "Summary"])
+    self.assertEqual(data["Screener <test>"][2], {"skipped_rows": 6})
+    self.assertEqual(data["Screener <test>"][3], {"Screener": "test", "Symbol": "AAPL", "Time": "09:08", "Net Price": 0.08})
+    self.assertEqual(data["Summary"], [{"Description": "Total_Profit", "Value": 1.25}])
+
+  # The format comes from the extension, html for anything else
+  def test_save(self):
+    with tempfile.TemporaryDirectory() as temp_dir:
+      for name, output_format in [("report.csv", "csv"), ("report.JSON", "json"), ("report.txt", "html")]:
+        filename = os.path.join(temp_dir, name)
+        self.report.save(filename)
+        with open(filename, newline="") as h:
+          self.assertEqual(h.read(), self.report.render(output_format), name)
+    with self.assertRaises(ValueError):
+      self.report.render("xml")
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,123 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import logging
+import datetime
+import tempfile
+import unittest
+
+# Custom Modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sample_log_class
+
+class TEST_SAMPLE_LOG(unittest.TestCase):
+  def setUp(self):
+    self.temp_dir = tempfile.TemporaryDirectory()
+    self.filename = os.path.join(self.temp_dir.name, "samples.log")
+    self.sample_log = sample_log_class.SAMPLE_LOG(self.filename)
+
+  def tearDown(self):
+    self.sample_log.close()
+    self.temp_dir.cleanup()
+
+  def reopen(self):
+    self.sample_log.close()
+    self.sample_log = sample_log_class.SAMPLE_LOG(self.filename)
+    return self.sample_log
+
+  def fill(self):
+    self.sample_log.append("test", "AAPL", 1609857000, 128.10, 128.20, 0.10)
+    self.sample_log.append("test", "AAPL", 1609857120, 128.10, 128.15, 0.05)
+    self.sample_log.append("other", "MSFT", 1609857000, 210.00, 210.30, 0.30)
+    self.sample_log.flush()
+
+  # Each name is written once, then every sample is a single record
+  def test_append(self):
+    self.fill()
+    self.assertEqual(self.sample_log.records, 7)
+    self.assertEqual(os.path.getsize(self.filename), 7 * self.sample_log.record_size)
+
+    sample_log = self.reopen()
+    self.assertEqual(sample_log.records, 7)
+    self.assertEqual(sample_log.data["test"]["AAPL"], {1609857000: (128.10, 128.20, 0.10), 1609857120: (128.10, 128.15, 0.05)})
+    self.assertEqual(sample_log.data["other"]["MSFT"][1609857000], (210.00, 210.30, 0.30))
+
+    # Appending after a reopen reuses the name ids
+    sample_log.append("test", "AAPL", 1609857240, 128.10, 128.30, 0.20)
+    self.assertEqual(sample_log.records, 8)
+    self.assertEqual(len(self.reopen().data["test"]["AAPL"]), 3)
+
+  def test_to_dict(self):
+    self.fill()
+    cur_time = datetime.datetime.fromtimestamp(1609857120).strftime("%H:%M:%S")
+    data = self.sample_log.to_dict()
+    self.assertEqual(sorted(data.keys()), ["other", "test"])
+    self.assertEqual(data["test"]["AAPL"][cur_time], {"Open_Price": 128.10, "Close_Price": 128.15, "Net_Price": 0.05})
+
+  # A half written record is cut off and the log keeps appending from the last good one
+  def test_torn_tail(self):
+    self.fill()
+    self.sample_log.close()
+    with open(self.filename, "ab") as h:
+      h.write(b"\x01" * 20)
+
+    logging.disable(logging.CRITICAL)
+    try:
+      sample_log = self.reopen()
+    finally:
+      logging.disable(logging.NOTSET)
+    self.assertEqual(sample_log.records, 7)
+    self.assertEqual(os.path.getsize(self.filename), 7 * sample_log.record_size)
+    sample_log.append("test", "AAPL", 1609857240, 128.10, 128.30, 0.20)
+    sample_log.flush()
+    self.assertEqual(self.reopen().records, 8)
+
+  # A record failing its crc drops it and everything after it
+  def test_bad_crc(self):
+    self.fill()
+    self.sample_log.close()
+    bad_byte = (5 * self.sample_log.record_size) + 10
+    with open(self.filename, "r+b") as h:
+      h.seek(bad_byte)
+      value = h.read(1)
+      h.seek(bad_byte)
+      h.write(bytes([value[0] ^ 0xff]))
+
+    logging.disable(logging.CRITICAL)
+    try:
+      sample_log = self.reopen()
+    finally:
+      logging.disable(logging.NOTSET)
+    self.assertEqual(sample_log.records, 5)
+    self.assertEqual(os.path.getsize(self.filename), 5 * sample_log.record_size)
+    self.assertNotIn("other", sample_log.data)
+
+  def test_clear(self):
+    self.fill()
+    self.sample_log.clear()
+    self.assertEqual(os.path.getsize(self.filename), 0)
+    self.sample_log.append("test", "AAPL", 1609857000, 128.10, 128.20, 0.10)
+    self.sample_log.flush()
+    self.assertEqual(self.reopen().to_dict().keys(), {"test"})
+
+  # Repeated samples are written once and old ones can be dropped
+  def test_compact(self):
+    self.fill()
+    self.sample_log.append("test", "AAPL", 1609857000, 128.10, 128.25, 0.15)
+    self.sample_log.compact(keep_after=1609857100)
+    self.assertEqual(self.sample_log.records, 3)
+
+    sample_log = self.reopen()
+    self.assertEqual(sample_log.data, {"test": {"AAPL": {1609857120: (128.10, 128.15, 0.05)}}})
+    self.assertEqual(os.listdir(self.temp_dir.name), ["samples.log"])
+
+  def test_long_names(self):
+    self.assertEqual(self.sample_log.long_names(["short", "x" * 32, "y" * 33]), ["y" * 33])
+    with self.assertRaises(ValueError):
+      self.sample_log.append("y" * 33, "AAPL", 1609857000, 1.0, 2.0, 1.0)
+    self.assertEqual(self.sample_log.records, 0)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,89 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import datetime
+import unittest
+
+# Custom Modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ledger_class
+import trade_stats_class
+
+class TEST_TRADE_STATS(unittest.TestCase):
+  def setUp(self):
+    self.cur_date = datetime.datetime(2026, 10, 16, 20, 0, tzinfo=datetime.timezone.utc)
+    self.stats = trade_stats_class.TRADE_STATS(["0", "7"], cur_date=self.cur_date)
+
+  def trade(self, day, open_time, close_time, buy_amount, sell_amount, fees=0):
+    return {"symbol": "AAPL", "open_time": "%s %s" % (day, open_time), "close_time": "%s %s" % (day, close_time), "buy_amount": buy_amount, "sell_amount": sell_amount, "fees": fees, "status": "filled"}
+
+  def test_windows(self):
+    self.stats.add(self.trade("2026-10-16", "14:30:00", "14:35:00", 128.10, 128.20, 0.5))
+    self.stats.add(self.trade("2026-10-12", "15:30:00", "15:31:00", 128.10, 128.15))
+    self.stats.add(self.trade("2026-10-01", "15:30:00", "15:31:00", 128.10, 128.15))
+    data = self.stats.results()
+    self.assertEqual(self.stats.max_days(), 7)
+
+    today = data[0]["AAPL"]
+    self.assertEqual((today["success_counter"], today["profit"], today["fees"], today["avg_trans_per_sec"]), (1, 0.1, 0.5, 300))
+    self.assertEqual(data[0]["Summary"]["Total_Profit"], 0.1)
+    self.assertEqual(data[0]["By_Hour"], {"10:00": {"count": 1, "profit": 0.1}})
+    self.assertEqual(data[0]["By_Weekday"], {"Friday": {"count": 1, "profit": 0.1}})
+
+    week = data[7]["AAPL"]
+    self.assertEqual((week["success_counter"], week["profit"], week["avg_trans_per_sec"]), (2, 0.15, 180))
+    self.assertEqual(data[7]["By_Weekday"]["Monday"], {"count": 1, "profit": 0.05})
+
+  # Unfilled orders count against the success rate, held positions are old orders of later windows
+  def test_counters(self):
+    self.stats.add(self.trade("2026-10-16", "14:30:00", "14:35:00", 128.10, 128.20))
+    self.stats.add({"symbol": "AAPL", "status": "Canceled", "open_time": "2026-10-16 15:00:00"})
+    self.stats.add({"symbol": "AAPL", "status": None, "open_time": "2026-10-16 15:10:00"})
+    self.stats.add({"symbol": "AAPL", "status": "held", "open_time": "2026-10-14 14:00:00"})
+    data = self.stats.results()
+
+    today = data[0]["AAPL"]
+    self.assertEqual(today["total_counter"], 4)
+    self.assertEqual(today["Canceled_counter"], 1)
+    self.assertEqual(today["old_order_counter"], 1)
+    self.assertEqual(today["failure_count"], 3)
+    self.assertEqual(today["success_percentage"], 25.0)
+
+    week = data[7]["AAPL"]
+    self.assertEqual(week["total_counter"], 3)
+    self.assertNotIn("old_order_counter", week)
+
+  def test_account(self):
+    self.stats.add_account({"Summary": {"Available_Funds": 100.0}, "Current_Positions": {"AAPL": 1}})
+    data = self.stats.results()
+    for days_back in [0, 7]:
+      self.assertEqual(data[days_back]["Summary"], {"Total_Profit": 0, "Available_Funds": 100.0})
+      self.assertEqual(data[days_back]["Current_Positions"], {"AAPL": 1})
+
+  # The ledger totals give the same report as adding its trades one by one
+  def test_ledger(self):
+    trades = [
+      self.trade("2026-10-16", "14:30:00", "14:35:00", 128.10, 128.20, 0.5),
+      self.trade("2026-10-16", "19:59:00", "20:00:00", 128.10, 128.12),
+      self.trade("2026-10-12", "15:30:00", "15:31:00", 128.10, 128.15),
+      self.trade("2026-10-10", "00:10:00", "00:30:00", 210.00, 210.30),
+      self.trade("2026-10-01", "15:30:00", "15:31:00", 128.10, 128.15),
+    ]
+    trades[3]["symbol"] = "MSFT"
+    ledger = ledger_class.LEDGER(":memory:")
+    ledger.insert([["fake", str(pos)] + [each[key] if key != "qty" else 1 for key in ledger.columns[1:]] for pos, each in enumerate(trades)])
+
+    expected = trade_stats_class.TRADE_STATS(["0", "7"], cur_date=self.cur_date).add_all(trades).results()
+    self.stats.add_ledger(ledger, "fake")
+    self.assertEqual(self.stats.results(), expected)
+
+    # Only the trades closed before until come from the ledger
+    data = trade_stats_class.TRADE_STATS(["0", "7"], cur_date=self.cur_date).add_ledger(ledger, "fake", until="2026-10-16").results()
+    self.assertNotIn("AAPL", data[0])
+    self.assertEqual(data[7]["AAPL"]["success_counter"], 1)
+    ledger.close()
+
+if __name__ == "__main__":
+  unittest.main()
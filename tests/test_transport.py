@@ -0,0 +1,124 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import time
+import socket
+import unittest
+import threading
+import email.utils
+import requests
+from werkzeug.serving import make_server
+from werkzeug.wrappers import Request, Response
+
+# Custom Modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import transport_class
+
+#
+# Server stand in, answers each path with the next status in its queue, then 200
+#
+class FAKE_SERVER:
+  def __init__(self):
+    self.queue = {}
+    self.calls = []
+    self.lock = threading.Lock()
+
+  def app(self, environ, start_response):
+    request = Request(environ)
+    with self.lock:
+      self.calls.append((request.method, request.path, time.monotonic()))
+      status, headers = 200, {}
+      if self.queue.get(request.path):
+        status, headers = self.queue[request.path].pop(0)
+    return Response("%s" % status, status=status, headers=headers)(environ, start_response)
+
+class TEST_TRANSPORT(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.fake = FAKE_SERVER()
+    cls.server = make_server("127.0.0.1", 0, cls.fake.app, threaded=True)
+    cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+    cls.thread.start()
+    cls.base_url = "http://127.0.0.1:%s" % cls.server.port
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.server.shutdown()
+    cls.thread.join()
+
+  def setUp(self):
+    self.fake.queue = {}
+    self.fake.calls = []
+    self.transport = transport_class.TRANSPORT({"http": {"retries": 2, "backoff": 0}})
+
+  # A GET is retried on busy servers until it gets through
+  def test_retry(self):
+    self.fake.queue["/quotes"] = [(500, {}), (502, {})]
+    with self.assertLogs(level="WARNING"):
+      res = self.transport.get(self.base_url + "/quotes")
+    self.assertEqual(res.status_code, 200)
+    self.assertEqual(len(self.fake.calls), 3)
+
+  # The last failed attempt is returned as is
+  def test_retries_used_up(self):
+    self.fake.queue["/quotes"] = [(500, {}), (500, {}), (500, {}), (500, {})]
+    with self.assertLogs(level="WARNING"):
+      res = self.transport.get(self.base_url + "/quotes")
+    self.assertEqual(res.status_code, 500)
+    self.assertEqual(len(self.fake.calls), 3)
+
+  # An order is never sent twice
+  def test_post_not_retried(self):
+    self.fake.queue["/orders"] = [(503, {"Retry-After": "0"})]
+    res = self.transport.post(self.base_url + "/orders", data={"symbol": "AAPL"})
+    self.assertEqual(res.status_code, 503)
+    self.assertEqual([each[0] for each in self.fake.calls], ["POST"])
+
+  # A 429 waits as long as Retry-After asks instead of the backoff
+  def test_retry_after_wait(self):
+    self.fake.queue["/quotes"] = [(429, {"Retry-After": "0.3"})]
+    with self.assertLogs(level="WARNING"):
+      res = self.transport.get(self.base_url + "/quotes")
+    self.assertEqual(res.status_code, 200)
+    self.assertGreaterEqual(self.fake.calls[1][2] - self.fake.calls[0][2], 0.3)
+
+  def test_retry_after(self):
+    self.transport.retry_after_max = 30
+    def headers(value):
+      res = requests.Response()
+      if value is not None:
+        res.headers["Retry-After"] = value
+      return self.transport.retry_after(res)
+
+    self.assertEqual(headers("2"), 2)
+    self.assertEqual(headers("600"), 30)
+    self.assertEqual(headers("-5"), 0)
+    self.assertIsNone(headers(None))
+    self.assertIsNone(headers("soon"))
+    self.assertAlmostEqual(headers(email.utils.formatdate(time.time() + 10, usegmt=True)), 10, delta=1.5)
+    self.assertEqual(headers(email.utils.formatdate(time.time() - 10, usegmt=True)), 0)
+
+  # The query string holds API keys, it never reaches the logs
+  def test_redaction(self):
+    self.assertEqual(self.transport.redact("Max retries exceeded with url: /v1/quotes?apikey=secret (Caused by x)"), "Max retries exceeded with url: /v1/quotes?<redacted> (Caused by x)")
+    self.assertEqual(self.transport.log_url("http://host/quotes?apikey=secret"), "http://host/quotes")
+
+    self.fake.queue["/quotes"] = [(500, {})]
+    with self.assertLogs(level="WARNING") as logs:
+      self.transport.get(self.base_url + "/quotes?apikey=secret")
+    self.assertNotIn("secret", "\n".join(logs.output))
+
+    # Nothing listens on a port just closed, every connection error is logged and the last one raised
+    with socket.socket() as h:
+      h.bind(("127.0.0.1", 0))
+      port = h.getsockname()[1]
+    with self.assertLogs(level="WARNING") as logs:
+      with self.assertRaises(requests.exceptions.ConnectionError):
+        self.transport.get("http://127.0.0.1:%s/quotes?apikey=secret" % port)
+    self.assertEqual(len(logs.output), 2)
+    self.assertNotIn("secret", "\n".join(logs.output))
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,167 @@
+#!/bin/env python3
+
+# Modules
+import os
+import sys
+import pytz
+import datetime
+from pprint import pprint
+
+# Custom Modules
+#sys.path.append(os.path.expanduser('~') + "/lazytrader")
+sys.path.append(os.path.expanduser('~') + "/lazytrader-unreleased")
+
+#
+# Report numbers for several day windows from one list of closed trades
+#
+# The trades for the widest window are read once. Every trade is added to
+# each window it falls in, together with its close hour and weekday in the
+# market timezone, so N windows cost one download and one pass.
+#
+# Orders that did not fill carry a "status" and only add to the order
+# counters of the windows they were opened in. A position still "held"
+# from before a window counts as an old order of that window.
+#
+# Trades already in the local ledger are not read back one by one, the
+# ledger totals every window with SQL (see add_ledger).
+#
+class TRADE_STATS:
+  # Variables
+  timezone = "America/New_York"
+
+  def __init__(self, days_back_list, cur_date=None):
+    self.use_tz = pytz.timezone(self.timezone)
+    if not cur_date:
+      cur_date = datetime.datetime.now(pytz.utc)
+    self.windows = []
+    for days_back in sorted(set(int(each) for each in days_back_list)):
+      start_date = cur_date.date() - datetime.timedelta(days=days_back)
+      self.windows.append((days_back, start_date.strftime("%Y-%m-%d 00:00:00")))
+    self.data = {}
+    for days_back, since in self.windows:
+      self.data[days_back] = {"Summary": {"Total_Profit": 0}, "By_Hour": {}, "By_Weekday": {}}
+
+  # Widest window, the one to fetch
+  def max_days(self):
+    return self.windows[-1][0]
+
+  # Symbol counters of a window, created on first use
+  def symbol(self, data, symbol):
+    if symbol not in data:
+      data[symbol] = {"success_counter": 0, "total_counter": 0, "profit": 0, "fees": 0, "total_trans_sec": 0}
+    return data[symbol]
+
+  def add_counter(self, group, key, profit, count=1):
+    if key not in group:
+      group[key] = {"count": 0, "profit": 0}
+    group[key]["count"] += count
+    group[key]["profit"] += profit
+
+  # Add one closed trade (ledger layout, see ledger_class.py) or order result
+  def add(self, trade):
+    status = trade.get("status", "filled")
+    if not status or status.lower() != "filled":
+      self.add_result(trade)
+      return
+
+    close_time = datetime.datetime.strptime(trade["close_time"], "%Y-%m-%d %H:%M:%S")
+    open_time = datetime.datetime.strptime(trade["open_time"], "%Y-%m-%d %H:%M:%S")
+    local_time = pytz.utc.localize(close_time).astimezone(self.use_tz)
+    hour = local_time.strftime("%H:00")
+    weekday = local_time.strftime("%A")
+    profit = trade["sell_amount"] - trade["buy_amount"]
+    trans_sec = (close_time - open_time).total_seconds()
+
+    for days_back, since in self.windows:
+      if trade["close_time"] < since:
+        continue
+      data = self.data[days_back]
+      cur_symbol = self.symbol(data, trade["symbol"])
+      cur_symbol["success_counter"] += 1
+      cur_symbol["total_counter"] += 1
+      cur_symbol["profit"] += profit
+      cur_symbol["fees"] += trade["fees"]
+      cur_symbol["total_trans_sec"] += trans_sec
+      data["Summary"]["Total_Profit"] += profit
+      self.add_counter(data["By_Hour"], hour, profit)
+      self.add_counter(data["By_Weekday"], weekday, profit)
+
+  # Add an order that did not fill, counted as <status>_counter
+  def add_result(self, trade):
+    status = trade.get("status")
+    for days_back, since in self.windows:
+      if status == "held":
+        if trade["open_time"] >= since:
+          continue
+        key = "old_order_counter"
+      elif trade["open_time"] < since:
+        continue
+      elif status:
+        key = "%s_counter" % status
+      else:
+        key = None
+
+      cur_symbol = self.symbol(self.data[days_back], trade["symbol"])
+      cur_symbol["total_counter"] += 1
+      if key:
+        cur_symbol[key] = cur_symbol.get(key, 0) + 1
+
+  # Add the trades a ledger holds for every window, closed before until when given
+  def add_ledger(self, ledger, broker_name, until=None):
+    for days_back, since in self.windows:
+      data = self.data[days_back]
+      for symbol, totals in ledger.symbol_totals(broker_name, since, until).items():
+        cur_symbol = self.symbol(data, symbol)
+        cur_symbol["success_counter"] += totals["success_counter"]
+        cur_symbol["total_counter"] += totals["success_counter"]
+        cur_symbol["profit"] += totals["profit"]
+        cur_symbol["fees"] += totals["fees"]
+        cur_symbol["total_trans_sec"] += totals["total_trans_sec"]
+        data["Summary"]["Total_Profit"] += totals["profit"]
+      for (hour, weekday), totals in ledger.hour_totals(broker_name, since, until).items():
+        self.add_counter(data["By_Hour"], hour, totals["profit"], totals["count"])
+        self.add_counter(data["By_Weekday"], weekday, totals["profit"], totals["count"])
+    return self
+
+  # Account balances and positions, the same for every window
+  def add_account(self, account):
+    for days_back, data in self.data.items():
+      data["Summary"].update(account.get("Summary", {}))
+      if "Current_Positions" in account:
+        data["Current_Positions"] = account["Current_Positions"]
+
+  def add_all(self, trades):
+    for trade in trades:
+      self.add(trade)
+    return self
+
+  # {days_back: {symbol: {...}, "Summary": {...}, "By_Hour": {...}, "By_Weekday": {...}}}
+  def results(self):
+    for days_back, data in self.data.items():
+      for key, each in data.items():
+        if "success_counter" in each:
+          total_trans_sec = each.pop("total_trans_sec")
+          each["avg_trans_per_sec"] = 0
+          if each["success_counter"]:
+            each["avg_trans_per_sec"] = round(total_trans_sec / each["success_counter"], 2)
+          each["failure_count"] = each["total_counter"] - each["success_counter"]
+          each["success_percentage"] = round(float((each["success_counter"] / each["total_counter"]) * 100), 2)
+          each["profit"] = round(each["profit"], 2)
+          each["fees"] = round(each["fees"], 2)
+      for group in (data["By_Hour"], data["By_Weekday"]):
+        for each in group.values():
+          each["profit"] = round(each["profit"], 2)
+      data["By_Hour"] = dict(sorted(data["By_Hour"].items()))
+      data["Summary"]["Total_Profit"] = round(data["Summary"]["Total_Profit"], 2)
+    return self.data
+
+if __name__ == "__main__":
+  cur_date = datetime.datetime.now(pytz.utc)
+  today = cur_date.strftime("%Y-%m-%d")
+  last_week = (cur_date - datetime.timedelta(days=6)).strftime("%Y-%m-%d")
+  stats = TRADE_STATS([0, 7, 30], cur_date=cur_date)
+  stats.add({"symbol": "AAPL", "open_time": today + " 14:30:00", "close_time": today + " 14:35:00", "buy_amount": 128.10, "sell_amount": 128.20, "fees": 0})
+  stats.add({"symbol": "AAPL", "open_time": last_week + " 15:30:00", "close_time": last_week + " 15:31:00", "buy_amount": 128.10, "sell_amount": 128.15, "fees": 0})
+  stats.add({"symbol": "AAPL", "status": "Canceled", "open_time": today + " 15:00:00"})
+  stats.add({"symbol": "AAPL", "status": "held", "open_time": last_week + " 14:00:00"})
+  pprint(stats.results())
@@ -14,6 +14,7 @@ from pprint import pprint
 # Custom Modules
 sys.path.append(os.path.expanduser('~') + "/lazytrader")
 import common_class
+import event_loop_class
 
 if __name__ == "__main__":
   # Variables
@@ -41,6 +42,7 @@ if __name__ == "__main__":
   parser.add_argument('-d', '--debug', action='store_true', help="Debug Logging")
   parser.add_argument('-f', '--file', help="File to output data")
   parser.add_argument('-u', '--user_config', help="User JSON Config File")
+  parser.add_argument('-a', '--asyncio', action='store_true', help="Event driven trading loop")
 
   # Parse the argument
   args = parser.parse_args()
@@ -90,6 +92,12 @@ if __name__ == "__main__":
   stocks = file_data[broker.broker]["stocks"]
   symbol_list = list(stocks.keys())
 
+  # Event driven loop, reacts to quotes and order deadlines instead of sleeping
+  if args.asyncio:
+    event_loop = event_loop_class.EVENT_LOOP(broker, file_data)
+    event_loop.run()
+    sys.exit()
+
   #
   # Main Loop
   #
@@ -100,7 +108,15 @@ if __name__ == "__main__":
       if not broker.market_open(delay_market_open):
         market_counter = 0
         current_spend = 0
-        time.sleep(sleep_timer)
+
+        # Sleep until the session starts when the broker knows the calendar
+        wait_time = sleep_timer
+        try:
+          wait_time = max(1, broker.seconds_until_open(delay_market_open))
+        except (AttributeError, TypeError):
+          pass
+        logging.debug("Market is closed, waiting %s seconds" % wait_time)
+        time.sleep(wait_time)
         continue
     except:
       logging.error("Connection to server failed")
@@ -110,11 +126,16 @@ if __name__ == "__main__":
     if market_counter == 0:
       logging.info("Market is open")
 
-    # Place Buy Order
-    broker.place_orders()
-
-    # Cancel Old Orders
-    broker.cancel_orders()
+    try:
+      # One "now" for every order in this cycle
+      with broker.clock.cycle():
+        # Place Buy Order
+        broker.place_orders()
+
+        # Cancel Old Orders
+        broker.cancel_orders()
+    except Exception as e:
+      logging.error("Order cycle failed: %s" % e)
 
     # Wait until the next cycle
     market_counter += 1
@@ -6,19 +6,28 @@ import os
 import sys
 import time
 import uuid
-import pytz
 import json
 import logging
-import requests
 import datetime
+import requests
+import fcntl
+import threading
+import contextlib
+import concurrent.futures
 from pprint import pprint
 
 # Custom Modules
 #sys.path.append(os.path.expanduser('~') + "/lazytrader")
 sys.path.append(os.path.expanduser('~') + "/lazytrader-unreleased")
 
+import clock_class
 import common_class
 import finhub_class
+import quote_bus_class
+import transport_class
+import price_gap_class
+import bar_fetcher_class
+import bar_store_class
 
 class TRADESTATION_CLASS:
   # Variables
@@ -29,10 +38,18 @@ class TRADESTATION_CLASS:
   inital_load_flag = False
   unique_token = uuid.uuid4()
 
+  # Token Cache Variables
+  token_deadline = 0
+  refresh_ahead = 300
+  refresh_retry = 30
+  refresh_thread = None
+
   # Request Variables
   headers = {"content-type": "application/x-www-form-urlencoded"}
   loopback = "http://localhost"
   base_url = "https://api.tradestation.com/v3"
+  sandbox_base_url = "https://sim-api.tradestation.com/v3"
+  auth_url = "https://signin.tradestation.com"
   access_token = None
 
   # Config Variables
@@ -42,14 +59,29 @@ class TRADESTATION_CLASS:
   account_type = None
   spend_per_day = None
   tradestation_auth_file = os.path.expanduser('~') + "/tradestation_auth"
-  filename_quote = os.path.expanduser('~') + "/lazytrader-unreleased/tradestation_quote"
+  auth_mode = 0o600
+  filename_quote = os.path.expanduser('~') + "/lazytrader-unreleased/tradestation_quote_bus"
+
+  # Quote Variables
+  quote_chunk_size = 100
+  quote_workers = 4
+
+  # Bar Variables
+  bar_window_days = 30
+  bar_store_dir = "~/lazytrader-unreleased/bars"
 
   # Trade Variables
   orders = None
+  snapshot = None
+  snapshot_max_age = 5
+  max_order_age = 35999
   quote = {}
   current_spend = 0
   status_list = ["OPN", "Open", "ACK"]
 
+  # Ledger Variables, historicalorders rejects a since more than 90 days back
+  ledger_max_days = 89
+
   def __init__(self, file_data=None):
     if file_data:
       self.file_data = file_data
@@ -65,14 +97,37 @@ class TRADESTATION_CLASS:
     self.stocks = self.file_data[self.broker]["stocks"]
     self.stock_list = list(self.stocks.keys())
 
+    # Pooled connections with timeouts for every broker request
+    self.transport = transport_class.TRANSPORT(self.file_data)
+    self.clock = clock_class.CLOCK()
+
+    # Historical bars in broker sized windows, fetched concurrently
+    bar_settings = self.file_data[self.broker].get("bars", {})
+    self.bar_fetcher = bar_fetcher_class.BAR_FETCHER(self.get_bar_window, window_days=bar_settings.get("window_days", self.bar_window_days), workers=bar_settings.get("workers"), min_interval=bar_settings.get("min_interval"))
+
+    # Finished days of bars are kept on disk, only new days are downloaded
+    bar_dir = os.path.expanduser(bar_settings.get("store_dir", self.bar_store_dir))
+    self.bar_store = bar_store_class.BAR_STORE(os.path.join(bar_dir, self.broker), self.bar_fetcher)
+
+    # Guards the cached token between the trader and the background refresh
+    self.auth_lock = threading.RLock()
+
     # Set Base URL
     if self.file_data[self.broker]["sandbox"] == True:
       self.base_url = self.sandbox_base_url
+    if self.file_data[self.broker].get("base_url"):
+      # Point at another server, like mock_broker.py
+      self.base_url = self.file_data[self.broker]["base_url"].rstrip("/")
+    if self.file_data[self.broker].get("auth_url"):
+      self.auth_url = self.file_data[self.broker]["auth_url"].rstrip("/")
     logging.debug("Broker Base URL: %s" % self.base_url)
 
     # Set the headers
     self.headers["Authorization"] = "Bearer %s" % self.access_token
 
+    # Shared memory quotes written by tradestation_stream.py
+    self.quote_bus = quote_bus_class.QUOTE_BUS(self.filename_quote)
+
     # Get the amount to spend
     self.spend_per_day = self.get_spending_amount()
     logging.info("The total amount to spend today: %s" % self.spend_per_day)
@@ -84,6 +139,15 @@ class TRADESTATION_CLASS:
 
   # Handle all aspects for authenticating with broker 
   def handle_auth(self, count=0):
+    # Cached token is still valid, the background thread keeps it that way
+    if self.token_deadline > time.monotonic():
+      return self.access_token
+
+    with self.auth_lock:
+      return self.load_auth(count=count)
+
+  # Load the tokens from the auth file, logging in or refreshing when needed
+  def load_auth(self, count=0):
     auth_keys = []
 
     if count >= self.max_login:
@@ -99,7 +163,7 @@ class TRADESTATION_CLASS:
 
     cur_date = self.get_date()
     try:
-      auth_data = self.common.read_json(file=self.tradestation_auth_file)
+      auth_data = self.common.read_json(file=self.tradestation_auth_file, cached=True)
       auth_keys = list(auth_data.keys())
     except FileNotFoundError:
       pass
@@ -108,30 +172,77 @@ class TRADESTATION_CLASS:
     if "auth_code" not in auth_keys:
       self.authorize_user()
       count += 1
-      return self.handle_auth(count=count)
+      return self.load_auth(count=count)
 
     # Verify we have the remaining auth information
     for each_key in self.auth_key_list:    
       if each_key not in auth_keys:
         self.get_tokens(auth_code=auth_data["auth_code"])
         count += 1
-        return self.handle_auth(count=count)
+        return self.load_auth(count=count)
 
     # Check if we are over the expired date
-    use_exp_date = auth_data["expires_date"].strip().replace(" ", "T")
-    exp_date = self.get_date(specific_date=use_exp_date)
-    if exp_date > cur_date:
-      # Set the headers
-      self.headers["Authorization"] = "Bearer %s" % auth_data["access_token"]
-      return auth_data["access_token"]
+    remaining = self.token_remaining(auth_data, cur_date)
+    if remaining > 0:
+      return self.set_token(auth_data, remaining)
     else:
       self.refresh_the_tokens()
       count += 1
-      return self.handle_auth(count=count)
+      return self.load_auth(count=count)
+
+  # Seconds until the access token in the auth data expires
+  def token_remaining(self, auth_data, cur_date=None):
+    if not cur_date:
+      cur_date = self.get_date()
+    use_exp_date = auth_data["expires_date"].strip().replace(" ", "T")
+    exp_date = self.get_date(specific_date=use_exp_date)
+    return (exp_date - cur_date).total_seconds()
+
+  # Keep the token in memory with a monotonic deadline
+  def set_token(self, auth_data, remaining):
+    self.access_token = auth_data["access_token"]
+    self.headers["Authorization"] = "Bearer %s" % self.access_token
+    self.token_deadline = time.monotonic() + remaining
+    logging.debug("Access token valid for %s seconds" % int(remaining))
+
+    if not self.refresh_thread or not self.refresh_thread.is_alive():
+      self.refresh_thread = threading.Thread(target=self.token_refresher, name="tradestation_auth", daemon=True)
+      self.refresh_thread.start()
+    return self.access_token
+
+  # Background thread, refresh the tokens before they expire
+  def token_refresher(self):
+    while True:
+      wait = self.token_deadline - self.refresh_ahead - time.monotonic()
+      if wait > 0:
+        time.sleep(wait)
+        continue
+
+      with self.auth_lock:
+        refreshed = self.background_refresh()
+      if not refreshed:
+        time.sleep(self.refresh_retry)
+
+  def background_refresh(self):
+    try:
+      # Another process may have already refreshed the shared auth file
+      auth_data = self.common.read_json(file=self.tradestation_auth_file, cached=True)
+      remaining = self.token_remaining(auth_data)
+      if remaining <= self.refresh_ahead:
+        auth_data = self.refresh_the_tokens(exit_on_failure=False)
+        if not auth_data:
+          return False
+        remaining = self.token_remaining(auth_data)
+    except Exception as e:
+      logging.error("Background token refresh failed: %s" % e)
+      return False
+
+    self.set_token(auth_data, remaining)
+    return True
 
   # Prompt the user to login and get the auth code
   def authorize_user(self):
-    url = "https://signin.tradestation.com/authorize"
+    url = self.auth_url + "/authorize"
     url += "?response_type=code"
     url += "&client_id=%s" % self.client_id
     url += "&redirect_uri=%s" % self.loopback
@@ -143,16 +254,35 @@ class TRADESTATION_CLASS:
     auth_code = input("Authorization Code: ")
     if len(auth_code) > 0 and re.search("[0-9a-zA-Z]+", auth_code):
       data = {"auth_code": auth_code}
-      self.common.write_json(data, file=self.tradestation_auth_file)
+      self.common.write_json(data, file=self.tradestation_auth_file, atomic=True, mode=self.auth_mode)
       logging.info("Got Auth Code")
     else:
       print("Auth Code Validation Failed")
       sys.exit()
 
+  # Hold the auth file lock, the trader and the stream share the tokens
+  @contextlib.contextmanager
+  def auth_file_lock(self):
+    fd = os.open(self.tradestation_auth_file + ".lock", os.O_RDWR | os.O_CREAT, self.auth_mode)
+    try:
+      fcntl.flock(fd, fcntl.LOCK_EX)
+      yield
+    finally:
+      os.close(fd)
+
   # Connect to the broker to get auth tokens 
   def get_tokens(self, auth_code=None):
+    with self.auth_file_lock():
+      # Another process may have redeemed the code already
+      auth_data = self.common.read_json(file=self.tradestation_auth_file)
+      if all(key in auth_data for key in self.auth_key_list):
+        logging.info("Auth Tokens already in place")
+        return
+      self.redeem_auth_code(auth_code)
+
+  def redeem_auth_code(self, auth_code=None):
     # Variables
-    url = "https://signin.tradestation.com/oauth/token"
+    url = self.auth_url + "/oauth/token"
     body = {
       "grant_type": "authorization_code",
       "client_id": self.client_id,
@@ -162,7 +292,7 @@ class TRADESTATION_CLASS:
     }
 
     # Get the auth token from broker
-    res = requests.post(url, data=body, headers=self.headers)
+    res = self.transport.post(url, data=body, headers=self.headers)
     if res.status_code != 200:
       logging.error("Failed to get tokens from %s broker" % self.broker)
       logging.error(res.text)
@@ -185,16 +315,25 @@ class TRADESTATION_CLASS:
     exp_date = self.get_date(specific_date=cur_date, raw_flag=False, hour_format=True, timezone_format=True)
     auth_data["expires_date"] = exp_date
 
-    self.common.write_json(auth_data, file=self.tradestation_auth_file)
+    self.common.write_json(auth_data, file=self.tradestation_auth_file, atomic=True, mode=self.auth_mode)
     logging.info("Got Auth Tokens")
 
   # Connect to the broker to refresh the auth tokens
-  def refresh_the_tokens(self):
+  #   Read, refresh and write happen under the file lock, so a refresh token is only redeemed once
+  def refresh_the_tokens(self, exit_on_failure=True):
+    with self.auth_file_lock():
+      auth_data = self.common.read_json(file=self.tradestation_auth_file)
+      if "expires_date" in auth_data and self.token_remaining(auth_data) > self.refresh_ahead:
+        logging.info("Auth Tokens were refreshed by another process")
+        return auth_data
+      return self.redeem_refresh_token(exit_on_failure)
+
+  def redeem_refresh_token(self, exit_on_failure=True):
     # Read the broker auth file
     auth_data = self.common.read_json(file=self.tradestation_auth_file)
 
     # Variables
-    url = "https://signin.tradestation.com/oauth/token"
+    url = self.auth_url + "/oauth/token"
     body = {
       "grant_type": "refresh_token",
       "client_id": self.client_id,
@@ -203,10 +342,12 @@ class TRADESTATION_CLASS:
     }
 
     # Send request to the broker
-    res = requests.post(url, data=body, headers=self.headers)
+    res = self.transport.post(url, data=body, headers=self.headers)
     if res.status_code != 200:
       logging.error("Refresh failed to get tokens from %s broker" % self.broker)
       logging.error(res.text)
+      if not exit_on_failure:
+        return None
       sys.exit()
 
     # Results from the broker
@@ -225,8 +366,9 @@ class TRADESTATION_CLASS:
     exp_date = self.get_date(specific_date=cur_date, raw_flag=False, hour_format=True, timezone_format=True)
     auth_data["expires_date"] = exp_date
 
-    self.common.write_json(auth_data, file=self.tradestation_auth_file)
+    self.common.write_json(auth_data, file=self.tradestation_auth_file, atomic=True, mode=self.auth_mode)
     logging.info("Refeshed Auth Tokens")
+    return auth_data
 
   # Need to revoke tokens to force a full login again
   def revoke_tokens(self, login_again=True):
@@ -234,7 +376,7 @@ class TRADESTATION_CLASS:
     auth_data = self.common.read_json(file=self.tradestation_auth_file)
 
     # Variables
-    url = "https://signin.tradestation.com/oauth/revoke"
+    url = self.auth_url + "/oauth/revoke"
     body = {
       "client_id": self.client_id,
       "client_secret": self.client_secret,
@@ -242,20 +384,22 @@ class TRADESTATION_CLASS:
     }
 
     # Send request to broker
-    res = requests.post(url, data=body, headers={content-type: application/json})
+    res = self.transport.post(url, data=body, headers={"content-type": "application/json"})
     if res.status_code != 200:
       logging.error("Failed to revoke auth tokens for %s broker" % self.broker)
       logging.error(res.text)
 
-    # Write a blank JSON record
-    self.common.write_json({}, file=self.tradestation_auth_file)
+    # Write a blank JSON record and drop the cached token
+    self.common.write_json({}, file=self.tradestation_auth_file, atomic=True, mode=self.auth_mode)
+    self.token_deadline = 0
 
     # Start the login process again from stratch
     if login_again:
       self.handle_auth()
 
   # Logic to place an order
-  def place_orders(self):
+  #   symbols limits the check to a few symbols, like the ones with a new quote
+  def place_orders(self, symbols=None):
     logging.info("Begin Place Order Check")
     # Ensure we have working access token
     self.access_token = self.handle_auth()
@@ -263,7 +407,12 @@ class TRADESTATION_CLASS:
     # Get the current quote
     quote = self.get_quote()
 
-    for symbol in self.stock_list:
+    # Positions and orders for every symbol, fetched once per cycle
+    if not self.get_account_snapshot():
+      logging.error("Unable to get the account snapshot, skipping this cycle")
+      return
+
+    for symbol in symbols or self.stock_list:
       results = {}
       res = self.get_open_orders_by_symbol(symbol)
       if symbol in list(res.keys()):
@@ -283,7 +432,7 @@ class TRADESTATION_CLASS:
       url = self.base_url + "/orderexecution/orders"
       logging.debug(url)
       logging.debug(payload)
-      res = requests.post(url, json=payload, headers=self.headers)
+      res = self.transport.post(url, json=payload, headers=self.headers)
       status_code = res.status_code
       if status_code == 200:
         results = res.json()
@@ -296,12 +445,52 @@ class TRADESTATION_CLASS:
 
   # Get the current quote for the symbol(s)
   def get_quote(self, symbol=None):
+    # Quotes are read straight from the shared memory slots
+    if not self.quote_bus.open():
+      logging.error("Quote bus %s is not available, is the stream running?" % self.filename_quote)
+      self.quote = {}
+      return self.quote
+
+    self.quote = self.quote_bus
+    return self.quote
+
+  # Get one chunk of market quotes, {} on failure
+  def get_quote_chunk(self, symbols):
+    url = self.base_url + "/marketdata/quotes/%s" % ",".join(symbols)
+    logging.debug("Send Broker %s" % url)
+    try:
+      res = self.transport.get(url, headers=self.headers)
+    except requests.exceptions.RequestException as e:
+      logging.error("Quotes for %s symbols failed: %s" % (len(symbols), e))
+      return {}
+    if res.status_code != 200:
+      logging.error("Got the status code of %s" % res.status_code)
+      logging.error(res.text)
+      return {}
+
+    data = {}
+    for each in res.json().get("Quotes", []):
+      data[each["Symbol"]] = each
+    return data
+
+  # Get REST quotes for any number of symbols, {symbol: quote}
+  #   Symbols are deduped and sent in chunks of quote_chunk_size, the chunks in parallel
+  def get_market_quotes(self, symbols):
+    # Variables
+    data = {}
+    symbols = sorted(set(symbol.upper() for symbol in symbols))
+    if not symbols:
+      return data
+
     # Ensure we have working access token
     self.access_token = self.handle_auth()
 
-    # Get quote from file
-    self.quote = self.common.read_json(file=self.filename_quote)
-    return self.quote
+    chunks = [symbols[pos:pos + self.quote_chunk_size] for pos in range(0, len(symbols), self.quote_chunk_size)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.quote_workers, len(chunks))) as executor:
+      for quotes in executor.map(self.get_quote_chunk, chunks):
+        data.update(quotes)
+    logging.debug("Quotes for %s of %s symbols in %s requests" % (len(data), len(symbols), len(chunks)))
+    return data
 
   def conditional_order_payload(self, symbol, buy_price, sell_price, qty):
     buy_price = round(float(buy_price),2)
@@ -348,7 +537,7 @@ class TRADESTATION_CLASS:
     self.access_token = self.handle_auth()
 
     url = self.base_url + "/brokerage/accounts/%s/orders" % self.account_id
-    res = requests.get(url, headers=self.headers)
+    res = self.transport.get(url, headers=self.headers)
     status_code = res.status_code
     if status_code == 200:
       results = res.json()
@@ -360,25 +549,34 @@ class TRADESTATION_CLASS:
       self.orders = results["Orders"]
     return self.orders
 
-  # Get the orders that are currently open
-  def get_open_orders_by_symbol(self, symbol, orders=None):
+  # Get the positions and orders once and index them by symbol
+  def get_account_snapshot(self, refresh=True):
+    # Reuse the snapshot taken earlier in this cycle, or a few seconds ago outside of one
+    if not refresh and self.snapshot:
+      cur_cycle = self.clock.current_cycle()
+      if cur_cycle is not None and self.snapshot["cycle"] == cur_cycle:
+        return self.snapshot
+      if cur_cycle is None and time.monotonic() - self.snapshot["taken"] < self.snapshot_max_age:
+        return self.snapshot
+
     # Variables
-    data = {}
+    snapshot = {"open_by_symbol": {}, "orders": [], "opened": {}, "cycle": self.clock.current_cycle(), "taken": time.monotonic()}
     cur_time = self.get_date()
+    self.snapshot = None
 
     # Ensure we have working access token
     self.access_token = self.handle_auth()
 
     url = self.base_url + "/brokerage/accounts/%s/positions" % self.account_id
-    res = requests.get(url, headers=self.headers)
+    res = self.transport.get(url, headers=self.headers)
     status_code = res.status_code
     if status_code == 200:
       results = res.json()
     else:
-      logging.error("Getting Open Positions for %s" % symbol)
+      logging.error("Getting Open Positions")
       logging.error("Got the status code of %s" % status_code)
       logging.error(res.text)
-      return data
+      return None
 
     logging.debug("Get Open Positions")
     logging.debug(results)
@@ -387,37 +585,51 @@ class TRADESTATION_CLASS:
       # Verify position is from today
       pos_time = self.get_date(specific_date=each["Timestamp"])
       total_sec = (cur_time - pos_time).total_seconds()
-      if total_sec > 35999:
+      if total_sec > self.max_order_age:
         continue
-
-      if symbol == each["Symbol"]:
-        data[symbol] = each["Bid"]
+      snapshot["open_by_symbol"][each["Symbol"]] = each["Bid"]
 
     url = self.base_url + "/brokerage/accounts/%s/orders" % self.account_id
-    res = requests.get(url, headers=self.headers)
+    res = self.transport.get(url, headers=self.headers)
     status_code = res.status_code
     if status_code == 200:
       results = res.json()
     else:
-      logging.error("Getting Open Positions for %s" % symbol)
+      logging.error("Getting Open Orders")
       logging.error("Got the status code of %s" % status_code)
       logging.error(res.text)
-      return data
+      return None
 
     for each in results["Orders"]:
+      # Parse each timestamp only once per cycle
       open_time = self.get_date(specific_date=each["OpenedDateTime"])
+      snapshot["opened"][each["OrderID"]] = open_time
+      snapshot["orders"].append(each)
+
       total_sec = (cur_time - open_time).total_seconds()
-      if total_sec > 35999:
+      if total_sec > self.max_order_age:
         continue
 
-      cur_status = each["Status"]
       cur_symbol = each["Legs"][0]["Symbol"]
-      if cur_symbol not in data:
-        if symbol == cur_symbol:
-          if cur_status in self.status_list:
-            buy_price = each["LimitPrice"]
-            data[cur_symbol] = buy_price 
+      if cur_symbol not in snapshot["open_by_symbol"]:
+        if each["Status"] in self.status_list:
+          snapshot["open_by_symbol"][cur_symbol] = each["LimitPrice"]
+
+    self.snapshot = snapshot
+    self.orders = snapshot["orders"]
+    return self.snapshot
 
+  # Get the orders that are currently open
+  def get_open_orders_by_symbol(self, symbol, orders=None):
+    # Variables
+    data = {}
+
+    snapshot = self.get_account_snapshot(refresh=False)
+    if not snapshot:
+      return data
+
+    if symbol in snapshot["open_by_symbol"]:
+      data[symbol] = snapshot["open_by_symbol"][symbol]
     return data
 
   # Cancel Open orders
@@ -432,11 +644,16 @@ class TRADESTATION_CLASS:
     self.access_token = self.handle_auth()
  
     # Get the orders from the broker
+    opened = {}
     if orders:
       logging.info("User Provided Orders, overwritting geting order from broker")
       use_orders = orders
     else:
-      use_orders = self.get_orders()
+      snapshot = self.get_account_snapshot(refresh=False)
+      if not snapshot:
+        return
+      use_orders = snapshot["orders"]
+      opened = snapshot["opened"]
 
     for each in use_orders:
       if each["Status"] in self.status_list:
@@ -444,7 +661,10 @@ class TRADESTATION_CLASS:
         if each["Legs"][0]["BuyOrSell"] == "Buy":
           logging.info("Found a Buy Order")
           logging.info("Reviewing order: %s, %s, %s, %s" % (each["OrderID"], each["Status"], each["Legs"][0]["BuyOrSell"], each["OpenedDateTime"]))
-          order_opened = self.get_date(specific_date=each["OpenedDateTime"])
+          try:
+            order_opened = opened[each["OrderID"]]
+          except KeyError:
+            order_opened = self.get_date(specific_date=each["OpenedDateTime"])
           seconds_since_open = (cur_date - order_opened).total_seconds()
           max_seconds_before_cancel = self.cancel_order_in_minutes * 60
           logging.info("Checking Times: %s -- %s" % (seconds_since_open, max_seconds_before_cancel))
@@ -453,7 +673,7 @@ class TRADESTATION_CLASS:
 
     for each in cancel_order_list:
       url = self.base_url + "/orderexecution/orders/%s" % each 
-      res = requests.delete(url, headers=self.headers)
+      res = self.transport.delete(url, headers=self.headers)
       status_code = res.status_code
       if status_code == 200:
         results = res.json()
@@ -464,22 +684,30 @@ class TRADESTATION_CLASS:
         logging.error(res.text)
 
   def market_open(self, delay=0):
-    return self.finhub.market_open()
+    return self.finhub.market_open(delay)
+
+  # Seconds until trading may start, 0 when the market is open
+  def seconds_until_open(self, delay=0):
+    return self.finhub.seconds_until_open(delay)
+
+  # Seconds until the market closes, None when it is closed
+  def seconds_until_close(self):
+    return self.finhub.seconds_until_close()
 
   # Get the open orders
   def check_open_orders(self, symbol=None):
     # Variables
     data = {}
 
-    # Ensure we have working access token
-    self.access_token = self.handle_auth()
-
-    if not self.orders:
-      self.get_orders()
+    snapshot = self.get_account_snapshot(refresh=False)
+    if not snapshot:
+      return data
 
-    for each in self.orders:
-      if each["Legs"]["OpenOrClose"] in self.status_list:
-        if  each["Legs"]["BuyOrSell"] == "Buy":
+    for each in snapshot["orders"]:
+      if each["Status"] in self.status_list:
+        if each["Legs"][0]["BuyOrSell"] == "Buy":
+          if symbol and each["Legs"][0]["Symbol"] != symbol:
+            continue
           data[each["OrderID"]] = each
     return data
 
@@ -493,7 +721,7 @@ class TRADESTATION_CLASS:
     self.access_token = self.handle_auth()
 
     url = self.base_url + "/brokerage/accounts/%s/balances" % self.account_id
-    res = requests.get(url, headers=self.headers)
+    res = self.transport.get(url, headers=self.headers)
     status_code = res.status_code
     if status_code == 200:
       results = res.json()
@@ -510,174 +738,241 @@ class TRADESTATION_CLASS:
             spending_amount = round(float(self.file_data[self.broker]["spend_per_day"]), 2)
     return spending_amount
 
-  def get_stock_price_gap(self, symbol, days_back = 120):
-    # Variables
-    data = {}
-
+  # Get one window of 1 minute bars as (epoch, open, high, low, close, volume) rows
+  def get_bar_window(self, symbol, start_date, end_date):
     # Ensure we have working access token
     self.access_token = self.handle_auth()
 
     url = self.base_url + "/marketdata/barcharts/%s" % symbol
     url += "?unit=Minute"
-    #url += "&barsback=5000"
     url += "&sessiontemplate=Default"
-    url += "&firstdate=%s" % self.get_date(days_back=days_back, raw_flag=False)
-    url += "&lastdate=%s" % self.get_date(raw_flag=False)
-    res = requests.get(url, headers=self.headers)
+    url += "&firstdate=%s" % start_date.strftime("%Y-%m-%dT00:00:00Z")
+    url += "&lastdate=%s" % end_date.strftime("%Y-%m-%dT23:59:59Z")
+    res = self.transport.get(url, headers=self.headers)
     status_code = res.status_code
-    if status_code == 200:
-      results = res.json()
-      logging.debug(results)
-    else:
+    if status_code != 200:
       logging.error("URL Used: %s" % url)
-      logging.error("Placing Order for %s for %s")
-      logging.error("Got the status code of %s" % status_code)
-      logging.error(res.text)
-      sys.exit("%s - Maybe Try Reducing the Number of Days" % res.text)
+      raise ValueError("Got the status code of %s - %s" % (status_code, res.text))
 
+    results = res.json()
+    return [(self.clock.epoch(each["TimeStamp"]), each["Open"], each["High"], each["Low"], each["Close"], each["TotalVolume"]) for each in results.get("Bars", [])]
 
-    for each in results["Bars"]:
-      cur_open = float(each["Open"])
-      cur_close = float(each["Close"])
-      cur_change = round(float(cur_close - cur_open), 2)
-      cur_change = abs(cur_change)
-      try:
-        data[cur_change] += 1
-      except KeyError:
-        data[cur_change] = 1
-    return data
+  # Get the 1 minute bars for a symbol as numpy arrays
+  def get_bars(self, symbol, days_back = 120):
+    end_date = self.get_date().date()
+    start_date = end_date - datetime.timedelta(days=int(days_back))
+    return self.bar_store.get(symbol, start_date, end_date)
+
+  # Get the price gap histogram
+  def get_price_gap(self, symbol, days_back = 120):
+    bars = self.get_bars(symbol, days_back=days_back)
+    return price_gap_class.PRICE_GAP(bars["open"], bars["close"])
+
+  # Get the price grap array
+  def get_stock_price_gap(self, symbol, days_back = 120):
+    return self.get_price_gap(symbol, days_back=days_back).to_dict()
 
 
-  def get_transactions(self, days_back=0, nextToken=None, data={}):
+  # Stream the orders one page at a time, following NextToken
+  #   historicalorders only goes back ledger_max_days, a failed page raises with raise_on_failure
+  def iter_orders(self, days_back=0, raise_on_failure=False):
     # Variables
-    group_array = {}  
+    next_token = None
+    page = 0
 
-    # Ensure we have working access token
-    self.access_token = self.handle_auth()
+    while True:
+      # Ensure we have working access token
+      self.access_token = self.handle_auth()
 
-    if days_back > 0: 
-      url = self.base_url + "/brokerage/accounts/%s/historicalorders" % self.account_id
-      url += "?since=%s" % self.get_date(days_back=days_back, raw_flag=False)
-    else:
-      url = self.base_url + "/brokerage/accounts/%s/orders" % self.account_id
-    if nextToken:
-      url += "&nextToken=%s" % nextToken
-    logging.debug("Send Broker %s" % url)
-    res = requests.get(url, headers=self.headers)
-    status_code = res.status_code
-    if status_code == 200:
-      results = res.json()
-    else:
-      logging.error("Failure getting historical orders")
-      logging.error("Got the status code of %s" % status_code)
-      logging.error(res.text)
+      if days_back > 0:
+        url = self.base_url + "/brokerage/accounts/%s/historicalorders" % self.account_id
+        url += "?since=%s" % self.get_date(days_back=days_back, raw_flag=False)
+      else:
+        url = self.base_url + "/brokerage/accounts/%s/orders" % self.account_id
+      if next_token:
+        url += "%snextToken=%s" % ("&" if "?" in url else "?", next_token)
+      logging.debug("Send Broker %s" % url)
+      res = self.transport.get(url, headers=self.headers)
+      status_code = res.status_code
+      if status_code != 200:
+        logging.error("Failure getting historical orders")
+        logging.error("Got the status code of %s" % status_code)
+        logging.error(res.text)
+        if raise_on_failure:
+          raise ValueError("Broker Error: %s getting orders page %s" % (status_code, page + 1))
+        return
 
-    logging.debug(json.dumps(results, indent=2))
+      results = res.json()
+      page += 1
+      logging.debug("Order page %s: %s orders" % (page, len(results.get("Orders", []))))
+      for each in results.get("Orders", []):
+        yield each
+
+      next_token = results.get("NextToken")
+      if not next_token:
+        return
+
+  # Join each buy order with the sell order that closes it, in a single pass
+  #   Only unmatched orders are held, a pair is yielded as soon as both legs are seen
+  def iter_order_groups(self, days_back=0, raise_on_failure=False):
+    # Variables
+    buys = {}
+    sells = {}
 
-    # Buy Loop 
-    logging.info("Gather Buy Orders")
-    for each in results["Orders"]:
-      fees = 0
+    for each in self.iter_orders(days_back=days_back, raise_on_failure=raise_on_failure):
       order_id = each["OrderID"]
       logging.info("Reviewing Order: %s" % order_id)
       try:
-        order_action = each["Legs"][0]["BuyOrSell"]
+        order_action = each["Legs"][0]["BuyOrSell"].lower()
       except KeyError:
         logging.error("Non-Standard Order Found, Need human review")
         logging.error(json.dumps(each, indent=2))
         continue
 
-      # Only handle the specific action
-      if order_action.lower() == "buy":
-        if order_id not in group_array:
-          group_array[order_id] = {}
-
+      if order_action == "buy":
+        group = {}
         try:
-          group_array[order_id]["buy_price"] = float(each["Legs"][0]["ExecutionPrice"])
+          group["buy_price"] = float(each["Legs"][0]["ExecutionPrice"])
         except KeyError:
-          group_array[order_id]["buy_price"] = float(each["LimitPrice"])
-
-        group_array[order_id]["buy_qty"] = int(each["Legs"][0]["ExecQuantity"])
-        group_array[order_id]["buy_status"] = each["StatusDescription"]
-        group_array[order_id]["symbol"] = each["Legs"][0]["Symbol"]
-        group_array[order_id]["open_time"] = each["OpenedDateTime"]
-        fees += float(each["CommissionFee"])
-        fees += float(each["UnbundledRouteFee"])
-        group_array[order_id]["buy_fees"] = fees
-
-    # Sell Loop
-    logging.info("Gather Sell Orders")
-    for each in results["Orders"]:
-      try:
-        buy_id = each["ConditionalOrders"][0]["OrderID"]
-      except KeyError:
-        logging.error("Missing Conditional Orders Section")
-        logging.error(json.dumps(each, indent=2))
-        continue
+          group["buy_price"] = float(each["LimitPrice"])
+        group["buy_qty"] = int(each["Legs"][0]["ExecQuantity"])
+        group["buy_status"] = each["StatusDescription"]
+        group["symbol"] = each["Legs"][0]["Symbol"]
+        group["open_time"] = each["OpenedDateTime"]
+        group["buy_fees"] = float(each["CommissionFee"]) + float(each["UnbundledRouteFee"])
+
+        if order_id in sells:
+          group.update(sells.pop(order_id))
+          yield (order_id, group)
+        else:
+          buys[order_id] = group
 
-      try:
-        order_action = each["Legs"][0]["BuyOrSell"]
-      except KeyError:
-        continue
+      elif order_action == "sell":
+        try:
+          buy_id = each["ConditionalOrders"][0]["OrderID"]
+        except KeyError:
+          logging.error("Missing Conditional Orders Section")
+          logging.error(json.dumps(each, indent=2))
+          continue
 
-      # Only handle the specific action
-      if order_action.lower() == "sell":
+        group = {}
         try:
-          group_array[buy_id]["sell_price"] = float(each["Legs"][0]["ExecutionPrice"])
+          group["sell_price"] = float(each["Legs"][0]["ExecutionPrice"])
         except (TypeError, KeyError):
-          group_array[buy_id]["sell_price"] = float(each["LimitPrice"])
+          group["sell_price"] = float(each["LimitPrice"])
+        group["sell_qty"] = int(each["Legs"][0]["ExecQuantity"])
+        group["sell_status"] = each["StatusDescription"]
+        if "ClosedDateTime" in each:
+          group["close_time"] = each["ClosedDateTime"]
+
+        if buy_id in buys:
+          buys[buy_id].update(group)
+          yield (buy_id, buys.pop(buy_id))
+        else:
+          sells[buy_id] = group
+
+    # Buys that never got a sell are still reported
+    for order_id, group in buys.items():
+      yield (order_id, group)
+    for buy_id in sells:
+      logging.error("Have a sell order without a buy order, Buy Order ID: %s" % buy_id)
+
+  # Filled round trips in the ledger layout (see ledger_class.py)
+  def iter_closed_trades(self, days_back=0, raise_on_failure=False):
+    for order_id, each_group in self.iter_order_groups(days_back=days_back, raise_on_failure=raise_on_failure):
+      if each_group.get("sell_status", "").lower() != "filled" or "close_time" not in each_group:
+        continue
+      yield self.closed_trade(order_id, each_group)
 
-        try:
-          group_array[buy_id]["sell_qty"] = int(each["Legs"][0]["ExecQuantity"])
-          group_array[buy_id]["sell_status"] = each["StatusDescription"]
-          group_array[buy_id]["close_time"] = each["ClosedDateTime"]
-        except KeyError:
-          logging.error("Have a sell order without a buy order")
-          logging.error(json.dumps(each, indent=2))
+  # Every order for the reports, today's orders always and the history when asked
+  #   Filled round trips come in the ledger layout, the rest as symbol, status and open_time
+  def iter_trade_results(self, days_back=0, history=True):
+    # Variables
+    seen = set()
+    days_back_list = [0]
+    if history and int(days_back) > 0:
+      days_back_list.insert(0, int(days_back))
+
+    for use_days in days_back_list:
+      for order_id, each_group in self.iter_order_groups(days_back=use_days):
+        if order_id in seen:
+          continue
+        seen.add(order_id)
+        if each_group.get("sell_status", "").lower() == "filled" and "close_time" in each_group:
+          yield self.closed_trade(order_id, each_group)
+          continue
+        yield {
+          "symbol": each_group["symbol"],
+          "status": each_group.get("sell_status"),
+          "open_time": self.get_date(specific_date=each_group["open_time"]).strftime("%Y-%m-%d %H:%M:%S"),
+        }
+
+  # One joined order group in the ledger layout
+  def closed_trade(self, order_id, each_group):
+    return {
+      "trade_id": order_id,
+      "symbol": each_group["symbol"],
+      "open_time": self.get_date(specific_date=each_group["open_time"]).strftime("%Y-%m-%d %H:%M:%S"),
+      "close_time": self.get_date(specific_date=each_group["close_time"]).strftime("%Y-%m-%d %H:%M:%S"),
+      "qty": each_group["sell_qty"],
+      "buy_amount": each_group["buy_price"] * each_group["buy_qty"],
+      "sell_amount": each_group["sell_price"] * each_group["sell_qty"],
+      "fees": each_group["buy_fees"],
+      "status": "filled",
+    }
+
+  # Get the account balance, None on failure
+  def get_balance(self):
+    # Ensure we have working access token
+    self.access_token = self.handle_auth()
 
-    # Get Account Balance
     url = self.base_url + "/brokerage/accounts/%s/balances" % self.account_id
     logging.debug("Send Broker %s" % url)
-    res = requests.get(url, headers=self.headers)
+    res = self.transport.get(url, headers=self.headers)
     status_code = res.status_code
-    if status_code == 200:
-      results = res.json()
-    else:
+    if status_code != 200:
       logging.error("Getting Account Balance")
       logging.error("Got the status code of %s" % status_code)
       logging.error(res.text)
+      return None
+    return res.json()["Balances"][0]
 
-    data["Summary"] = {}
-    data["Summary"]["Available_Funds"] = round(float(results["Balances"][0]["CashBalance"]), 2)
-    data["Summary"]["In_Market"] = round(float(results["Balances"][0]["MarketValue"]), 2)
-    data["Summary"]["Total Account Balance"] = round(float(results["Balances"][0]["Equity"]),2)
+  # Account balances and current positions for the reports
+  def get_account_summary(self):
+    # Variables
+    data = {"Summary": {}}
+
+    # Get Account Balance
+    balance = self.get_balance()
+    if balance:
+      data["Summary"]["Available_Funds"] = round(float(balance["CashBalance"]), 2)
+      data["Summary"]["In_Market"] = round(float(balance["MarketValue"]), 2)
+      data["Summary"]["Total Account Balance"] = round(float(balance["Equity"]),2)
 
     # Get Current Positions
     url = self.base_url + "/brokerage/accounts/%s/positions" % self.account_id
     logging.debug("Send Broker %s" % url)
-    res = requests.get(url, headers=self.headers)
+    res = self.transport.get(url, headers=self.headers)
     status_code = res.status_code
     if status_code == 200:
       results = res.json()
+      logging.debug(json.dumps(results, indent=2))
+      for each in results.get("Positions", []):
+        data.setdefault("Current_Positions", {})[each["Symbol"]] = each["Quantity"]
     else:
       logging.error("Getting Open Positions")
       logging.error("Got the status code of %s" % status_code)
       logging.error(res.text)
+    return data
 
-    logging.debug(json.dumps(results, indent=2))
-    if "Positions" in results:
-      for each in results["Positions"]:
-        try:
-          data["Current_Positions"][each["Symbol"]] = each["Quantity"]
-        except KeyError:
-          data["Current_Positions"] = {}
-          data["Current_Positions"][each["Symbol"]] = each["Quantity"]
+  def get_transactions(self, days_back=0):
+    # Variables
+    data = self.get_account_summary()
 
-    logging.debug(json.dumps(group_array, indent=2))
-    logging.info("Calculating results")    
+    logging.info("Calculating results")
 
-    # Loop through parsed broker data
-    for order_id, each_group in group_array.items():
+    # Loop through the joined orders as they stream in
+    for order_id, each_group in self.iter_order_groups(days_back=days_back):
       # Ensure the symbol is in the array
       cur_symbol = each_group["symbol"]
       if cur_symbol not in data:
@@ -706,7 +1001,7 @@ class TRADESTATION_CLASS:
         else:
           logging.error("MisMatched Quality of Buy to Sell:")
           logging.error("Order ID: %s" % order_id)
-          logging.error(json.dumps(each, indent=2))
+          logging.error(json.dumps(each_group, indent=2))
       else:
         try:
           data[cur_symbol]["%s_counter" % each_group["sell_status"]] += 1
@@ -736,31 +1031,16 @@ class TRADESTATION_CLASS:
       # Debugging
       logging.info("Reviewing Order: %s, Symbol: %s, Status: %s, Buy Price: %s, Sell Price: %s, Qty: %s, Profit: %s" % (order_id, cur_symbol, each_group["sell_status"], each_group["buy_price"], each_group["sell_price"], each_group["buy_qty"], data[cur_symbol]["profit"]))
 
-    # Get Account Balance
-    url = self.base_url + "/brokerage/accounts/%s/balances" % self.account_id
-    logging.debug("Send Broker %s" % url)
-    res = requests.get(url, headers=self.headers)
-    status_code = res.status_code
-    if status_code == 200:
-      results = res.json()
-    else:
-      logging.error("Getting Account Balance")
-      logging.error("Got the status code of %s" % status_code)
-      logging.error(res.text)    
-
     # Add the total profit
+    data["Summary"]["Total_Profit"] = 0
     for sym, each in data.items():
       if "profit" in each:
-        try:
-          data["Summary"]["Total_Profit"] += each["profit"]
-        except KeyError:
-          data["Summary"]["Total_Profit"] = each["profit"]
+        data["Summary"]["Total_Profit"] += each["profit"]
     data["Summary"]["Total_Profit"] = round(float(data["Summary"]["Total_Profit"]), 2)
 
     logging.debug(json.dumps(data, indent=2))
     return data
 
-
   # Get the date
     # timezone="America/New_York"
   def get_date(self, specific_date=None, mins_back=0, days_back=0, raw_flag=True, timezone="UTC", hour_format=False, timezone_format=False):
@@ -775,19 +1055,11 @@ class TRADESTATION_CLASS:
     if timezone_format:
       use_format += " %z"
 
-    # Get current date
-    use_tz = pytz.timezone(timezone)
+    # Get current date, parsed timestamps and "now" come from the shared clock
     if specific_date:
-      try:
-        if re.search("Z", specific_date):
-          specific_date = re.sub("Z", "", specific_date)
-        cur_date = datetime.datetime.fromisoformat(specific_date)
-      except TypeError:
-        if type(specific_date) == datetime.datetime:
-          cur_date = specific_date
+      cur_date = self.clock.parse(specific_date)
     else:
-      cur_date = datetime.datetime.now(use_tz).strftime('%Y-%m-%dT%H:%M:%S')
-      cur_date = datetime.datetime.fromisoformat(cur_date)
+      cur_date = self.clock.now(timezone)
     backup_date = cur_date
 
     if mins_back > 0:
@@ -3,16 +3,15 @@
 # Modules
 import os
 import sys
-import json
 import logging
-import requests
-from pprint import pprint
 
 # Custom Modules
 #sys.path.append(os.path.expanduser('~') + "/lazytrader")
 sys.path.append(os.path.expanduser('~') + "/lazytrader-unreleased")
 
 import common_class
+import quote_bus_class
+import quote_stream_class
 import tradestation_class
 
 if __name__ == "__main__":
@@ -24,13 +23,9 @@ if __name__ == "__main__":
   broker = "tradestation"
   tradestation_auth_file = os.path.expanduser('~') + "/tradestation_auth"
   user_config = os.path.expanduser('~') + "/user_config.json"
-  url = "https://api.tradestation.com/v3/marketdata/stream/quotes"
-  headers = {}
 
   # Quote Variables
-  quote = {}
-  keywords_wanted = ["Bid", "Ask", "Last"]
-  filename = os.path.expanduser('~') + "/lazytrader-unreleased/tradestation_quote"
+  filename = os.path.expanduser('~') + "/lazytrader-unreleased/tradestation_quote_bus"
 
   # Initalize Logging
   logging.basicConfig(level=log_level, format=log_format)
@@ -42,41 +37,13 @@ if __name__ == "__main__":
 
   # Get all the symbols to stream
   stock_list = list(file_data[broker]["stocks"].keys())
-  url += "/%s" % ",".join(stock_list)
 
-  while True:
-    print("Restarting the Stream Loop: %s" % tradestation.get_date(raw_flag=False, hour_format=True))
+  # Reserve a quote slot for every symbol
+  quote_bus = quote_bus_class.QUOTE_BUS(filename, writer=True)
+  quote_bus.open()
+  for symbol in stock_list:
+    quote_bus.register(symbol)
 
-    # Ensure we have working access token
-    access_token = tradestation.handle_auth()
-
-    # Create the header
-    headers = {"Authorization": "Bearer %s" % access_token}
-
-    # Ask broker for stream
-    response = requests.request("GET", url, headers=headers, stream=True)
-
-    # Parse stream for each line
-    for line in response.iter_lines():
-      if line:
-        logging.debug(line)
-        line = json.loads(line)
-        if "Error" in list(line.keys()):
-          pprint(line)
-        try: 
-          cur_symbol = line["Symbol"]
-        except KeyError:
-          continue
-
-        if cur_symbol not in quote:
-          quote[cur_symbol] = {}
-
-        # Get only the information we want
-        for each in keywords_wanted:
-          try:
-            quote[cur_symbol][each] = line[each]
-          except KeyError:
-            pass
-      logging.info("Writing JSON Quote to file %s" % filename)
-      logging.info(quote)
-      common.write_json(quote, file=filename)
+  # Stream the symbols over several connections, each reconnects on its own
+  quote_stream = quote_stream_class.QUOTE_STREAM(tradestation, quote_bus, stock_list, file_data)
+  quote_stream.run()
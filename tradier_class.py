@@ -1,13 +1,10 @@
 #!/bin/env python3
 
 # Modules
-import re
 import os
 import sys
 import uuid
-import pytz
 import logging
-import requests
 import datetime
 from pprint import pprint
 
@@ -15,6 +12,14 @@ from pprint import pprint
 #sys.path.append(os.path.expanduser('~') + "/lazytrader")
 sys.path.append(os.path.expanduser('~') + "/lazytrader-unreleased")
 
+import clock_class
+import common_class
+import transport_class
+import price_gap_class
+import bar_fetcher_class
+import bar_store_class
+import market_session_class
+
 class TRADIER_CLASS:
   # Variables
   file_data = None
@@ -28,13 +33,22 @@ class TRADIER_CLASS:
   base_url = "https://api.tradier.com"
   sandbox_base_url = "https://sandbox.tradier.com"
 
+  # Calendar Variables
+  calendar_file = os.path.expanduser('~') + "/lazytrader-unreleased/tradier_calendar_%04d-%02d.json"
+
   # Config Variables
   access_token = None
   account_id = None
   account_type = None
   spend_per_day = None
 
+  # Bar Variables
+  bar_window_days = 5
+  bar_history_days = 20
+  bar_store_dir = "~/lazytrader-unreleased/bars"
+
   # Trade Variables
+  gainloss_limit = 1000
   orders = None
   current_spend = 0
 
@@ -50,9 +64,29 @@ class TRADIER_CLASS:
     self.stocks = self.file_data[self.broker]["stocks"]
     self.stock_list = list(self.stocks.keys())
 
+    # Pooled connections with timeouts for every broker request
+    self.transport = transport_class.TRANSPORT(self.file_data)
+    self.common = common_class.COMMON()
+    self.clock = clock_class.CLOCK()
+
+    # Historical bars in broker sized windows, fetched concurrently
+    bar_settings = self.file_data[self.broker].get("bars", {})
+    self.bar_fetcher = bar_fetcher_class.BAR_FETCHER(self.get_bar_window, window_days=bar_settings.get("window_days", self.bar_window_days), workers=bar_settings.get("workers"), min_interval=bar_settings.get("min_interval"))
+
+    # Finished days of bars are kept on disk, only new days are downloaded
+    bar_dir = os.path.expanduser(bar_settings.get("store_dir", self.bar_store_dir))
+    self.bar_store = bar_store_class.BAR_STORE(os.path.join(bar_dir, self.broker), self.bar_fetcher)
+    self.bar_history_days = int(bar_settings.get("history_days", self.bar_history_days))
+
+    # Market calendar, loaded once per month
+    self.session = market_session_class.MARKET_SESSION()
+
     # Set Base URL
     if self.file_data[self.broker]["sandbox"] == True:
       self.base_url = self.sandbox_base_url
+    if self.file_data[self.broker].get("base_url"):
+      # Point at another server, like mock_broker.py
+      self.base_url = self.file_data[self.broker]["base_url"].rstrip("/")
     logging.debug("Broker Base URL: %s" % self.base_url)
 
     # Set the headers
@@ -65,17 +99,19 @@ class TRADIER_CLASS:
     logging.info("Transaction waiting longer then %s minutes will be canceled" % self.cancel_order_in_minutes)
 
   # Place Buy Order
-  def place_orders(self):
+  #   symbols limits the check to a few symbols, like the ones with a new quote
+  def place_orders(self, symbols=None):
     # Variables
     buy_price = 0
+    symbols = symbols or self.stock_list
 
     # Get Transaction Orders
     self.orders = self.get_orders()
 
     # Get Current Quotes
-    quote = self.get_quote(self.stock_list)
+    quote = self.get_quote(symbols)
 
-    for symbol in self.stock_list:
+    for symbol in symbols:
       # Get Open Order for a Symbol
       res = self.get_open_orders_by_symbol(symbol, self.orders)
 
@@ -144,7 +180,7 @@ class TRADIER_CLASS:
     if type(symbol) is list:
       symbol = ",".join(symbol)
     payload["symbols"] = symbol
-    results = requests.get(url, params=payload, headers=self.headers).json()
+    results = self.transport.get(url, params=payload, headers=self.headers).json()
 
     for key, each in results["quotes"].items():
       if type(each) == list:
@@ -179,7 +215,7 @@ class TRADIER_CLASS:
     logging.debug("Sending URL: %s" % url)
     logging.debug("Sending Headers: %s" % self.headers)
     logging.debug("Sending Payload: %s" % payload)
-    results = requests.post(url, data=payload, headers=self.headers).json()
+    results = self.transport.post(url, data=payload, headers=self.headers).json()
     logging.debug("Return Results: %s" % results)
     return results
 
@@ -203,7 +239,7 @@ class TRADIER_CLASS:
     #cur_date = datetime.datetime.fromisoformat(cur_date)
 
     # Get the data from the broker
-    results = requests.get(url, headers=self.headers).json()
+    results = self.transport.get(url, headers=self.headers).json()
 
     if results["orders"] == 'null':
       return data
@@ -222,18 +258,15 @@ class TRADIER_CLASS:
       buy_amount = float(each["leg"][0]["price"]) * float(each["leg"][0]["quantity"])
       #trans_date = each["leg"][0]["create_date"]
       trans_date = each["leg"][0]["transaction_date"]
-      trans_date = re.sub("\.\w+$", "", trans_date)
       use_date = self.get_data(specific_date=trans_date)
-      sell_date = each["leg"][1]["transaction_date"]
-      sell_date = re.sub("\.\w+$", "", sell_date)
-      sell_date = self.get_data(specific_date=sell_date)
+      sell_date = self.get_data(specific_date=each["leg"][1]["transaction_date"])
 
       # Build the active order array
       try:
-        data[cur_symbol].append({"id": cur_id, "buy_status": buy_status, "sell_status": sell_status, "date": trans_date, "buy_amount": buy_amount, "sell_amount": sell_amount, "sell_date": sell_date, "buy_date": use_date})
+        data[cur_symbol].append({"id": cur_id, "buy_status": buy_status, "sell_status": sell_status, "date": trans_date, "buy_amount": buy_amount, "sell_amount": sell_amount, "sell_date": sell_date, "buy_date": use_date, "qty": float(each["leg"][1]["quantity"])})
       except KeyError:
         data[cur_symbol] = []
-        data[cur_symbol].append({"id": cur_id, "buy_status": buy_status, "sell_status": sell_status, "date": trans_date, "buy_amount": buy_amount, "sell_amount": sell_amount, "sell_date": sell_date, "buy_date": use_date})
+        data[cur_symbol].append({"id": cur_id, "buy_status": buy_status, "sell_status": sell_status, "date": trans_date, "buy_amount": buy_amount, "sell_amount": sell_amount, "sell_date": sell_date, "buy_date": use_date, "qty": float(each["leg"][1]["quantity"])})
     return data
 
   # Get the open order by symbol
@@ -329,70 +362,95 @@ class TRADIER_CLASS:
           order_id = each["id"]
           cancel_amount += each["buy_amount"]
           url = "%s/v1/accounts/%s/orders/%s" % (self.base_url, self.account_id, order_id)
-          requests.delete(url, headers=self.headers)
+          self.transport.delete(url, headers=self.headers)
 
     return cancel_amount
 
-  # Check if the market is open
-  def market_open(self, delay=0):
-    # Variables
-    is_open = False
-    market_status = False
+  # Load a month of the market calendar, from disk when we already have it
+  def load_calendar(self, year, month):
+    if self.session.has_month(year, month):
+      return True
 
-    # Get current date
-    cur_date = self.get_data(timezone="America/New_York")
-    #use_tz = pytz.timezone('America/New_York')
-    #cur_date = datetime.datetime.now(use_tz).strftime('%Y-%m-%dT%H:%M:%S')
-    #cur_date = datetime.datetime.fromisoformat(cur_date)
-    use_date = cur_date.strftime("%Y-%m-%d")
+    calendar_file = self.calendar_file % (year, month)
+    try:
+      results = self.common.read_json(file=calendar_file)
+    except FileNotFoundError:
+      results = {}
+
+    # Get the calendar from the broker
+    if "calendar" not in results:
+      logging.debug("Getting the %s-%s calendar from the broker" % (year, month))
+      url = "%s/v1/markets/calendar" % self.base_url
+      payload = {"month": "%02d" % month, "year": year}
+      results = self.transport.get(url, params=payload, headers=self.headers).json()
+      if "calendar" not in results:
+        logging.error("Unable to get the market calendar from the broker")
+        return False
+      self.common.write_json(results, file=calendar_file, atomic=True)
 
-    # Get the market status from broker
-    logging.debug("Getting the calendar from the broker")
-    url = "%s/v1/markets/calendar" % self.base_url
-    results = requests.get(url, headers=self.headers).json()
+    # Standard the output
+    days = results["calendar"]["days"]["day"]
+    if type(days) is not list:
+      days = [days]
 
     # Parse the broker market start time
-    logging.debug("Parsing the calender from broker")
-    for each in results["calendar"]["days"]["day"]:
-      if each["date"] == use_date:
-        logging.debug("Checking if the market is open")
-        logging.debug(each)
-        if each["status"] == "open":
-          is_open = True
-        start_date = self.get_data(specific_date="%s %s" % (each["date"], each["open"]["start"]))
-        start_date = datetime.datetime.fromisoformat("%s %s" % (each["date"], each["open"]["start"]))
-        end_date = self.get_data(specific_date="%s %s" % (each["date"], each["open"]["end"]))
-        #end_date = datetime.datetime.fromisoformat("%s %s" % (each["date"], each["open"]["end"]))
-        logging.debug("Market Open from Broker: is_open %s - start_date %s - end_date %s" % (is_open, start_date, end_date))
-        
-    logging.debug("Current Date: %s" % cur_date)
-    # Determine if the market is open
-    logging.debug("Checking if market is open")
-    if cur_date >= start_date and cur_date <= end_date and is_open:
-      market_status = True
-    if (cur_date - start_date).total_seconds() <= delay:
-      market_status = False    
+    for each in days:
+      if each["status"] == "open":
+        self.session.add_day(each["date"], each["open"]["start"], each["open"]["end"])
+      else:
+        self.session.add_day(each["date"])
+    self.session.add_month(year, month)
+    return True
+
+  # Check if the market is open
+  def market_open(self, delay=0):
+    cur_date = self.session.now()
+    self.load_calendar(cur_date.year, cur_date.month)
+
+    market_status = self.session.is_open(delay, cur_date)
     logging.debug("Returning Market Open Status: %s" % market_status) 
     return market_status
 
+  # Seconds until trading may start, 0 when the market is open
+  def seconds_until_open(self, delay=0):
+    cur_date = self.session.now()
+    self.load_calendar(cur_date.year, cur_date.month)
+
+    wait_time = self.session.seconds_until_open(delay, cur_date)
+    if wait_time is None:
+      year, month = self.session.next_month(cur_date)
+      self.load_calendar(year, month)
+      wait_time = self.session.seconds_until_open(delay, cur_date)
+    return wait_time
+
+  # Seconds until the market closes, None when it is closed
+  def seconds_until_close(self):
+    cur_date = self.session.now()
+    self.load_calendar(cur_date.year, cur_date.month)
+    return self.session.seconds_until_close(cur_date)
+
   # Get a list of open positions
   def check_open_orders(self, symbol=None):
     positions = []
 
-    # Get current date
-    cur_date = self.get_data(timezone="America/New_York")
+    # Get current date, naive UTC like the parsed date_acquired
+    cur_date = self.get_data()
     #use_tz = pytz.timezone('America/New_York')
     #cur_date = datetime.datetime.now(use_tz).strftime('%Y-%m-%dT%H:%M:%S')
     #cur_date = datetime.datetime.fromisoformat(cur_date)
 
     # Get the current open positions from broker
     url = "%s/v1/accounts/%s/positions" % (self.base_url, self.account_id)
-    results = requests.get(url, headers=self.headers).json()
+    results = self.transport.get(url, headers=self.headers).json()
 
     # Check for any open positions
     if results["positions"] == "null":
       return positions
 
+    # Force a single entry into a list
+    if type(results["positions"]["position"]) is not list:
+      results["positions"]["position"] = [results["positions"]["position"]]
+
     # Parse the position data and build
     if symbol:
       for each in results["positions"]["position"]:
@@ -401,7 +459,6 @@ class TRADIER_CLASS:
     else:
       for each in results["positions"]["position"]:
         pos_date = self.get_data(specific_date=each["date_acquired"])
-        pos_date = datetime.datetime.fromisoformat(each["date_acquired"])
         if (cur_date - pos_date).total_seconds() < 28800:
           positions.append(each["symbol"])
     return positions
@@ -411,7 +468,7 @@ class TRADIER_CLASS:
     #pprint(self.account_type.lower())
     if self.account_type.lower() == "cash":
       url = "%s/v1/accounts/%s/balances" % (self.base_url, self.account_id)
-      results = requests.get(url, headers=self.headers).json()
+      results = self.transport.get(url, headers=self.headers).json()
       #pprint(results)
       try:
         return round((float(results["balances"]["cash"]["cash_available"]) / 2), 2)
@@ -419,46 +476,188 @@ class TRADIER_CLASS:
         return round((float(results["balances"]["total_cash"]) / 2), 2)
     return self.spend_per_day
 
-  # Get the price grap array
-  def get_stock_price_gap(self, symbol, days_back = 120):
-    # Variables
-    data = {}
-    days_back = int(days_back)
-    old_price = 0
+  # First day Tradier still has 1 minute timesales for
+  def bar_history_start(self):
+    return self.get_data().date() - datetime.timedelta(days=self.bar_history_days)
+
+  # Get one window of 1 minute bars as (epoch, open, high, low, close, volume) rows
+  def get_bar_window(self, symbol, start_date, end_date):
+    # Older days are not kept by Tradier, do not ask for them
+    start_date = max(start_date, self.bar_history_start())
+    if start_date > end_date:
+      logging.debug("No 1 minute bars kept by Tradier from %s to %s" % (start_date, end_date))
+      return []
 
     url = "%s/v1/markets/timesales" % (self.base_url)
     payload = {}
     payload["symbol"] = symbol
     payload["interval"] = "1min"
-    payload["end"] = self.get_data(raw_flag=False, hour_format=True)[:-3]
-    payload["start"] = self.get_data(days_back=days_back, raw_flag=False, hour_format=True)[:-3]
+    payload["start"] = "%s 00:00" % start_date.strftime("%Y-%m-%d")
+    payload["end"] = "%s 23:59" % end_date.strftime("%Y-%m-%d")
 
     logging.debug("URL: %s" % url)
     logging.debug("Payload %s" % payload)
-    logging.debug("Headers: %s" % self.headers)
 
-    try:
-      #results = requests.get(url, data=payload, headers=self.headers)
-      results = requests.get(url, params=payload, headers=self.headers)
-      results = results.json()
-    except Exception as e:
-      logging.error("Broker Error: %s - %s" % (results.status_code, results.text))
-
-    if "series" not in results:
-      logging.error("No Historicial Data Available")
-      return data
+    res = self.transport.get(url, params=payload, headers=self.headers)
+    if res.status_code != 200:
+      raise ValueError("Broker Error: %s - %s" % (res.status_code, res.text))
+    results = res.json()
+
+    if not results.get("series"):
+      logging.debug("No Historicial Data Available from %s to %s" % (start_date, end_date))
+      return []
+
+    # Force a single entry into a list
+    bars = results["series"]["data"]
+    if type(bars) is not list:
+      bars = [bars]
+    return [(each["timestamp"], each["open"], each["high"], each["low"], each["close"], each["volume"]) for each in bars]
+
+  # Get the 1 minute bars for a symbol as numpy arrays
+  def get_bars(self, symbol, days_back = 120):
+    end_date = self.get_data().date()
+    start_date = end_date - datetime.timedelta(days=int(days_back))
+
+    # Days older than the Tradier history only come from bars stored before
+    if int(days_back) > self.bar_history_days:
+      logging.warning("Tradier keeps about %s days of 1 minute bars, %s days before %s are only available when already stored" % (self.bar_history_days, symbol, self.bar_history_start()))
+    return self.bar_store.get(symbol, start_date, end_date)
+
+  # Get the price gap histogram
+  def get_price_gap(self, symbol, days_back = 120):
+    bars = self.get_bars(symbol, days_back=days_back)
+    return price_gap_class.PRICE_GAP(bars["open"], bars["close"])
+
+  # Get the price grap array
+  def get_stock_price_gap(self, symbol, days_back = 120):
+    return self.get_price_gap(symbol, days_back=days_back).to_dict()
+
+  # Closed positions in the ledger layout (see ledger_class.py)
+  #   gainloss has no trade id, so one is built from the position and a counter for exact repeats
+  def iter_closed_trades(self, days_back=0, raise_on_failure=False):
+    # Variables
+    seen = {}
+    page = 1
+    start_date = self.get_data() - datetime.timedelta(days=int(days_back))
+
+    url = "%s/v1/accounts/%s/gainloss" % (self.base_url, self.account_id)
+    while True:
+      payload = {"start": start_date.strftime("%Y-%m-%d"), "limit": self.gainloss_limit, "page": page}
+      res = self.transport.get(url, params=payload, headers=self.headers)
+      if res.status_code != 200:
+        logging.error("Failure getting gain/loss")
+        logging.error("Got the status code of %s" % res.status_code)
+        logging.error(res.text)
+        if raise_on_failure:
+          raise ValueError("Broker Error: %s getting gain/loss page %s" % (res.status_code, page))
+        return
+      results = res.json()
+      if type(results.get("gainloss")) is not dict:
+        return
+
+      # Standard the output
+      gainloss = results["gainloss"]["closed_position"]
+      if type(gainloss) is not list:
+        gainloss = [gainloss]
 
-    for each in results["series"]["data"]:
-       price_open = round(float(each["open"]), 2)
-       price_close = round(float(each["close"]), 2)
-       price_gap = round(float(price_close - price_open), 2)
-       price_gap = abs(price_gap)  
-       try:
-         data[price_gap] += 1
-       except KeyError:
-         data[price_gap] = 1
+      for each in gainloss:
+        trade_key = "%s|%s|%s|%s|%s" % (each["symbol"], each["open_date"], each["close_date"], each["quantity"], each["cost"])
+        seen[trade_key] = seen.get(trade_key, 0) + 1
+        yield {
+          "trade_id": "%s|%s" % (trade_key, seen[trade_key]),
+          "symbol": each["symbol"],
+          "open_time": self.get_data(specific_date=each["open_date"]).strftime("%Y-%m-%d %H:%M:%S"),
+          "close_time": self.get_data(specific_date=each["close_date"]).strftime("%Y-%m-%d %H:%M:%S"),
+          "qty": float(each["quantity"]),
+          "buy_amount": float(each["cost"]),
+          "sell_amount": float(each["proceeds"]),
+          "fees": 0,
+        }
+
+      if len(gainloss) < self.gainloss_limit:
+        return
+      page += 1
+
+  # Get the open positions, always a list
+  def get_positions(self):
+    url = "%s/v1/accounts/%s/positions" % (self.base_url, self.account_id)
+    res = self.transport.get(url, headers=self.headers)
+    if res.status_code != 200:
+      logging.error("Failure getting positions")
+      logging.error("Got the status code of %s" % res.status_code)
+      logging.error(res.text)
+      return []
+    results = res.json()
+    if type(results.get("positions")) is not dict:
+      return []
+
+    # Force a single entry into a list
+    positions = results["positions"]["position"]
+    if type(positions) is not list:
+      positions = [positions]
+    return positions
+
+  # Account balances and current positions for the reports
+  def get_account_summary(self):
+    # Variables
+    data = {"Summary": {}}
+
+    # Get Account Balance
+    url = "%s/v1/accounts/%s/balances" % (self.base_url, self.account_id)
+    res = self.transport.get(url, headers=self.headers)
+    if res.status_code == 200:
+      balances = res.json()["balances"]
+      data["Summary"]["Available_Funds"] = round(float(balances["total_cash"]), 2)
+      data["Summary"]["In_Market"] = round(float(balances["market_value"]), 2)
+      data["Summary"]["Total Account Balance"] = round(float(balances["total_equity"]), 2)
+    else:
+      logging.error("Getting Account Balance")
+      logging.error("Got the status code of %s" % res.status_code)
+      logging.error(res.text)
+
+    # Get Current Positions
+    for each in self.get_positions():
+      data.setdefault("Current_Positions", {})[each["symbol"]] = each["quantity"]
     return data
 
+  # Every order for the reports, today's orders always and the history when asked
+  #   gainloss only has settled positions, so today's round trips come from the orders
+  #   Filled round trips come in the ledger layout, the rest as symbol, status and open_time
+  #   and the positions still held as status "held"
+  def iter_trade_results(self, days_back=0, history=True):
+    today = self.get_data().strftime("%Y-%m-%d")
+    if history and int(days_back) > 0:
+      for trade in self.iter_closed_trades(days_back=days_back):
+        if trade["close_time"] < today:
+          trade["status"] = "filled"
+          yield trade
+
+    # Get current orders
+    for cur_symbol, entries in self.get_orders().items():
+      for entry in entries:
+        open_time = entry["buy_date"].strftime("%Y-%m-%d %H:%M:%S")
+        if entry["sell_status"] != "filled":
+          yield {"symbol": cur_symbol, "status": entry["sell_status"], "open_time": open_time}
+          continue
+        close_time = entry["sell_date"].strftime("%Y-%m-%d %H:%M:%S")
+        if close_time < today:
+          continue
+        yield {
+          "trade_id": "%s" % entry["id"],
+          "symbol": cur_symbol,
+          "open_time": open_time,
+          "close_time": close_time,
+          "qty": entry["qty"],
+          "buy_amount": entry["buy_amount"],
+          "sell_amount": entry["sell_amount"],
+          "fees": 0,
+          "status": "filled",
+        }
+
+    # Get Open Positions
+    for each in self.get_positions():
+      yield {"symbol": each["symbol"], "status": "held", "open_time": self.get_data(specific_date=each["date_acquired"]).strftime("%Y-%m-%d %H:%M:%S")}
+
   # Get the transactions of the account
   def get_transactions(self, days_back=0):
     # Variables
@@ -477,7 +676,7 @@ class TRADIER_CLASS:
     if days_back > 0:
       # Get Settled Closed Orders
       url = "%s/v1/accounts/%s/gainloss" % (self.base_url, self.account_id)
-      results = requests.get(url, headers=self.headers).json()
+      results = self.transport.get(url, headers=self.headers).json()
       if "gainloss" not in results:
         logging.info("No Stat Activity Avaiable")
         return data
@@ -494,10 +693,8 @@ class TRADIER_CLASS:
         if cur_symbol not in data:
           data[cur_symbol] = {}
 
-        open_date = each["open_date"][:-5]
-        open_date = self.get_data(specific_date=open_date)
-        close_date = each["close_date"][:-5]
-        close_date = self.get_data(specific_date=close_date)
+        open_date = self.get_data(specific_date=each["open_date"])
+        close_date = self.get_data(specific_date=each["close_date"])
         trans_time = (close_date - open_date).total_seconds()
         num_days = abs((start_date - close_date).days)
 
@@ -537,7 +734,7 @@ class TRADIER_CLASS:
 
     # Get Open Positions     
     url = "%s/v1/accounts/%s/positions" % (self.base_url, self.account_id)
-    results = requests.get(url, headers=self.headers).json()
+    results = self.transport.get(url, headers=self.headers).json()
     if results["positions"] == "null":
       return data
 
@@ -550,8 +747,7 @@ class TRADIER_CLASS:
     
     for each in positions:
       cur_symbol = each["symbol"]
-      acquired = each["date_acquired"][:-5]
-      acquired = self.get_data(specific_date=acquired)
+      acquired = self.get_data(specific_date=each["date_acquired"])
       num_days = abs((start_date - acquired).days)
       if num_days > days_back:
         try:
@@ -588,13 +784,11 @@ class TRADIER_CLASS:
     if timezone_format:
       use_format += " %z"
 
-    # Get current date
-    use_tz = pytz.timezone(timezone)
+    # Get current date, parsed timestamps and "now" come from the shared clock
     if specific_date:
-      cur_date = datetime.datetime.fromisoformat(specific_date)
+      cur_date = self.clock.parse(specific_date)
     else:
-      cur_date = datetime.datetime.now(use_tz).strftime('%Y-%m-%dT%H:%M:%S')
-      cur_date = datetime.datetime.fromisoformat(cur_date)
+      cur_date = self.clock.now(timezone)
     backup_date = cur_date
 
     if mins_back > 0:
@@ -0,0 +1,136 @@
+#!/bin/env python3
+
+# Modules
+import re
+import os
+import sys
+import time
+import random
+import logging
+import requests
+import email.utils
+from pprint import pprint
+from requests.adapters import HTTPAdapter
+
+# Custom Modules
+#sys.path.append(os.path.expanduser('~') + "/lazytrader")
+sys.path.append(os.path.expanduser('~') + "/lazytrader-unreleased")
+
+#
+# Shared HTTP transport for the broker classes
+#
+# Keeps persistent pooled connections per endpoint, puts a connect/read
+# timeout on every request and retries idempotent requests with jittered
+# backoff, or for as long as a 429/503 Retry-After header asks. Settings come
+# from the optional "http" section of user_config.json. Logged urls have
+# their query string cut off, it can hold API keys.
+#
+class TRANSPORT:
+  # Variables
+  connect_timeout = 3.05
+  read_timeout = 30
+  retries = 3
+  backoff = 0.5
+  backoff_max = 10
+  pool_connections = 4
+  pool_maxsize = 10
+  retry_status = [429, 500, 502, 503, 504]
+  retry_after_status = [429, 503]
+  retry_after_max = 60
+  idempotent = ["GET", "HEAD", "OPTIONS"]
+
+  def __init__(self, file_data=None):
+    # Variables
+    settings = {}
+    pools = {}
+
+    if file_data:
+      settings = file_data.get("http", {})
+
+    # Set Variables
+    self.connect_timeout = float(settings.get("connect_timeout", self.connect_timeout))
+    self.read_timeout = float(settings.get("read_timeout", self.read_timeout))
+    self.retries = int(settings.get("retries", self.retries))
+    self.backoff = float(settings.get("backoff", self.backoff))
+    self.backoff_max = float(settings.get("backoff_max", self.backoff_max))
+    self.retry_after_max = float(settings.get("retry_after_max", self.retry_after_max))
+    self.pool_maxsize = int(settings.get("pool_maxsize", self.pool_maxsize))
+    pools = settings.get("pools", pools)
+
+    # Persistent session, the default pools plus a pool per configured endpoint
+    self.session = requests.Session()
+    self.mount("https://", self.pool_maxsize)
+    self.mount("http://", self.pool_maxsize)
+    for prefix, size in pools.items():
+      logging.debug("HTTP pool for %s with %s connections" % (prefix, size))
+      self.mount(prefix, size)
+
+  # Attach a connection pool to every url starting with prefix
+  def mount(self, prefix, size):
+    adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=int(size))
+    self.session.mount(prefix, adapter)
+
+  # Random wait between 0 and the exponential backoff for the attempt
+  def backoff_time(self, attempt):
+    return random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+
+  # Url without the query string, safe to log
+  def log_url(self, url):
+    return url.split("?", 1)[0]
+
+  # Error text with any query strings cut out
+  def redact(self, text):
+    return re.sub(r"\?[^\s'\"()]*", "?<redacted>", "%s" % text)
+
+  # Seconds asked for by a Retry-After header (seconds or a date), None when missing
+  def retry_after(self, res):
+    value = res.headers.get("Retry-After")
+    if not value:
+      return None
+    try:
+      wait = float(value)
+    except ValueError:
+      try:
+        wait = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+      except (TypeError, ValueError):
+        return None
+    return min(self.retry_after_max, max(0, wait))
+
+  # Send a request, retrying idempotent methods on connection errors and busy servers
+  def request(self, method, url, **kwargs):
+    kwargs.setdefault("timeout", (self.connect_timeout, self.read_timeout))
+    method = method.upper()
+
+    attempts = 1
+    if method in self.idempotent:
+      attempts += self.retries
+
+    log_url = self.log_url(url)
+    for attempt in range(attempts):
+      wait = None
+      last_attempt = (attempt + 1) >= attempts
+      try:
+        res = self.session.request(method, url, **kwargs)
+      except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+        if last_attempt:
+          raise
+        logging.warning("%s %s failed (%s), retry %s of %s" % (method, log_url, self.redact(e), attempt + 1, self.retries))
+      else:
+        if last_attempt or res.status_code not in self.retry_status:
+          return res
+        if res.status_code in self.retry_after_status:
+          wait = self.retry_after(res)
+        logging.warning("%s %s returned %s, retry %s of %s" % (method, log_url, res.status_code, attempt + 1, self.retries))
+        res.close()
+      if wait is None:
+        wait = self.backoff_time(attempt)
+      time.sleep(wait)
+
+  def get(self, url, **kwargs):
+    return self.request("GET", url, **kwargs)
+
+  def post(self, url, **kwargs):
+    return self.request("POST", url, **kwargs)
+
+  def delete(self, url, **kwargs):
+    return self.request("DELETE", url, **kwargs)